@@ -1,9 +1,6 @@
-from euv_spectra_app.extensions import app
-from euv_spectra_app.main.routes import main
-from euv_spectra_app.api.routes import api
+from euv_spectra_app import create_app
 
-app.register_blueprint(main)
-app.register_blueprint(api)
+app = create_app()
 
 if __name__ == "__main__":
-    app.run(port=5002, host='0.0.0.0')
\ No newline at end of file
+    app.run(port=5002, host='0.0.0.0')
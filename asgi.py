@@ -0,0 +1,5 @@
+# async serving mode, used with: uvicorn asgi:app --port 5002
+# or with gunicorn workers: gunicorn -k uvicorn.workers.UvicornWorker -b 0.0.0.0:5002 asgi:app
+from euv_spectra_app import create_asgi_app
+
+app = create_asgi_app()
@@ -0,0 +1 @@
+# offline benchmarks of the matching, processing, and plotting hot paths (see README.md)
@@ -0,0 +1,5 @@
+# run with: python -m benchmarks (from the repo root, see benchmarks/README.md)
+import sys
+from benchmarks.run import main
+
+sys.exit(main())
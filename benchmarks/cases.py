@@ -0,0 +1,200 @@
+# THE BENCHMARKED HOT PATHS (IMPORTED AFTER standin.prepare_environment, IT IMPORTS THE APP)
+import json
+import itertools
+from euv_spectra_app import create_app
+from euv_spectra_app.extensions import cache, result_cache
+from euv_spectra_app.models import PegasusGrid
+from euv_spectra_app.helpers import to_json, from_json, create_plotly_graph
+from euv_spectra_app.helpers_dbqueries import get_matching_subtype, get_matching_photosphere, search_db
+from euv_spectra_app.helpers_grid import grid_version
+from euv_spectra_app.helpers_matching import stellar_object_from_params
+from euv_spectra_app.helpers_session import SESSION_KEY, encode_stellar_object, link_fluxes
+from euv_spectra_app.helpers_spectra import spectra
+from euv_spectra_app.startup import lazy_import
+
+plotly_utils = lazy_import('plotly.utils')
+
+# Targets run through the results page, as submitted on the manual form (GALEX fluxes in
+# microjanskies). Each takes a different path through the model search.
+SCENARIOS = {
+    # an M0 star with two models of the stand-in M0 grid within its flux errors
+    'within_limits': {'star_name': 'Within Limits', 'teff': 3850, 'logg': 4.78, 'mass': 0.53, 'dist': 6.33, 'rad': 0.58,
+                      'fuv': 130, 'fuv_err': 30, 'nuv': 450, 'nuv_err': 60},
+    # GJ 338 B, no model within its flux errors, so it falls back to the chi squared searches
+    'chi_squared_fallback': {'star_name': 'GJ 338 B', 'teff': 4014, 'logg': 4.68, 'mass': 0.64, 'dist': 6.33256, 'rad': 0.58,
+                             'fuv': 55.75778, 'fuv_err': 8.697778, 'nuv': 1002.1626, 'nuv_err': 14.8769665},
+    # fluxes without errors, the closest model is returned
+    'detection_only': {'star_name': 'Detection Only', 'teff': 3850, 'logg': 4.78, 'mass': 0.53, 'dist': 6.33, 'rad': 0.58,
+                       'fuv': 130, 'nuv': 450},
+}
+SEARCH_FLAGS = ('normal', 'saturated', 'upper_limit', 'detection_only')
+# models in the plots of create_plotly_graph (it has colors for up to 9)
+PLOT_MODEL_COUNTS = (3, 9)
+
+
+class Benchmark():
+    """A timed call.
+
+    Args:
+        name: The name the timings are reported under, stable across commits so runs can be compared.
+        func: The timed function, called with the state of the round.
+        setup: A function returning the state of a round (None by default), called before each
+            round and not timed.
+    """
+    def __init__(self, name, func, setup=None):
+        self.name = name
+        self.func = func
+        self.setup = setup
+
+
+def scenario_object(params):
+    """Builds the stellar object of a scenario like the manual form does (subtype, linked and checked fluxes)."""
+    stellar_object = stellar_object_from_params(params)
+    stellar_object.stellar_subtype = get_matching_subtype(stellar_object.teff, stellar_object.logg, stellar_object.mass)['model']
+    fluxes = link_fluxes(stellar_object).fluxes
+    fluxes.check_null_fluxes()
+    fluxes.check_saturated_fluxes()
+    fluxes.check_upper_limit_fluxes()
+    return stellar_object
+
+
+def search_flux(fluxes, flux, flag):
+    """Returns a search_db flux query of a processed flux, with the given flag (only normal fluxes keep their error)."""
+    return {'value': getattr(fluxes, f'processed_{flux}'),
+            'error': getattr(fluxes, f'processed_{flux}_err') if flag == 'normal' else None,
+            'flag': flag}
+
+
+def plot_data(models, fluxes, filepaths):
+    """Returns the plot data of the results page (see helpers_matching.match_models) for some grid models."""
+    data = {
+        'galex_fuv': {'name': 'GALEX Processed FUV', 'wavelength': 1542, 'flux_density': fluxes.processed_fuv,
+                      'flux_density_err': fluxes.processed_fuv_err},
+        'galex_nuv': {'name': 'GALEX Processed NUV', 'wavelength': 2315, 'flux_density': fluxes.processed_nuv,
+                      'flux_density_err': fluxes.processed_nuv_err},
+    }
+    for index, (model, filepath) in enumerate(zip(models, filepaths)):
+        data[f'model_{index}'] = {'index': index, 'nuv': model['nuv'], 'fuv': model['fuv'], 'euv': model['euv'], 'filepath': filepath}
+    return data
+
+
+def query_benchmarks(stellar_object):
+    """Benchmarks of the grid queries, unmemoized (the query itself) and memoized (a shared cache hit)."""
+    teff, logg, mass = stellar_object.teff, stellar_object.logg, stellar_object.mass
+    benchmarks = [
+        Benchmark('dbqueries.get_matching_subtype', lambda state: get_matching_subtype.__wrapped__(teff, logg, mass)),
+        Benchmark('dbqueries.get_matching_subtype[memoized]', lambda state: get_matching_subtype(teff, logg, mass)),
+        Benchmark('dbqueries.get_matching_photosphere', lambda state: get_matching_photosphere.__wrapped__(teff, logg, mass)),
+        Benchmark('dbqueries.get_matching_photosphere[memoized]', lambda state: get_matching_photosphere(teff, logg, mass)),
+    ]
+    fluxes = stellar_object.fluxes
+    for fuv_flag, nuv_flag in itertools.product(SEARCH_FLAGS, SEARCH_FLAGS):
+        fuv = search_flux(fluxes, 'fuv', fuv_flag)
+        nuv = search_flux(fluxes, 'nuv', nuv_flag)
+        benchmarks.append(Benchmark(f'dbqueries.search_db[fuv={fuv_flag},nuv={nuv_flag}]',
+                                    lambda state, fuv=fuv, nuv=nuv: list(search_db.__wrapped__(stellar_object.model_collection, fuv, nuv))))
+    return benchmarks
+
+
+def processing_benchmarks(stellar_object):
+    """Benchmarks of the GALEX flux processing and the (session and results cache) serialization of a stellar object."""
+    stellar_json = json.dumps(to_json(stellar_object))
+    return [
+        Benchmark('models.GalexFluxes.convert_scale_photosphere_subtract_fluxes',
+                  lambda state: stellar_object.fluxes.convert_scale_photosphere_subtract_fluxes()),
+        Benchmark('helpers.to_json', lambda state: to_json(stellar_object)),
+        Benchmark('helpers.from_json', lambda state: from_json(stellar_json)),
+    ]
+
+
+def plot_benchmarks(stellar_object):
+    """Benchmarks of building the results page plot and serializing it, like match_models does.
+
+    The models are searched in the setup of the first round, so a failing search is reported
+    as the error of these benchmarks instead of stopping the collection of the others.
+    """
+    models = []
+
+    def round_data(count):
+        if not models:
+            models.extend(search_db.__wrapped__(stellar_object.model_collection,
+                                                search_flux(stellar_object.fluxes, 'fuv', 'detection_only'),
+                                                search_flux(stellar_object.fluxes, 'nuv', 'detection_only')))
+        filepaths = [spectra.get_path(model['fits_filename']) for model in models[:count]]
+        # create_plotly_graph adds flags to the plot data, each round gets fresh data
+        return plot_data(models[:count], stellar_object.fluxes, filepaths)
+
+    benchmarks = []
+    for count in PLOT_MODEL_COUNTS:
+        benchmarks.append(Benchmark(f'helpers.create_plotly_graph[models={count}]', create_plotly_graph,
+                                    setup=lambda count=count: round_data(count)))
+        benchmarks.append(Benchmark(f'helpers.create_plotly_graph+json[models={count}]',
+                                    lambda state: json.dumps(create_plotly_graph(state), cls=plotly_utils.PlotlyJSONEncoder),
+                                    setup=lambda count=count: round_data(count)))
+    return benchmarks
+
+
+def view_benchmarks(app, scenarios):
+    """Benchmarks of the results page views through the Flask test client.
+
+    return_results is timed cold (the results cache and the memoized queries are cleared
+    before each round, so the full model search, plot, and caching run) and cached (the
+    results are looked up by their hash). The decoded spectra stay cached in the worker,
+    as they would in a running worker.
+    """
+    client = app.test_client()
+    benchmarks = []
+
+    def store(stellar_object):
+        with client.session_transaction() as session:
+            session[SESSION_KEY] = encode_stellar_object(stellar_object)
+
+    def clear_caches(stellar_object):
+        result_cache.delete_many({})
+        cache.clear()
+        store(stellar_object)
+
+    def return_results(state):
+        response = client.get('/results')
+        if response.status_code != 302 or '/results/' not in response.location:
+            raise RuntimeError(f'return_results answered {response.status_code} {response.location}')
+        return response.location
+
+    def get(url):
+        response = client.get(url)
+        if response.status_code != 200:
+            raise RuntimeError(f'{url} answered {response.status_code}')
+
+    def permalink(stellar_object):
+        # the results are cached by the first call, the rounds after it look them up
+        store(stellar_object)
+        return return_results(None)
+
+    for name, stellar_object in scenarios.items():
+        benchmarks.append(Benchmark(f'views.return_results[{name},cold]', return_results,
+                                    setup=lambda stellar_object=stellar_object: clear_caches(stellar_object)))
+        benchmarks.append(Benchmark(f'views.return_results[{name},cached]', return_results,
+                                    setup=lambda stellar_object=stellar_object: store(stellar_object)))
+        benchmarks.append(Benchmark(f'views.result_permalink[{name}]', get,
+                                    setup=lambda stellar_object=stellar_object: permalink(stellar_object)))
+        benchmarks.append(Benchmark(f'views.result_figure[{name}]', lambda state: get(f'{state}/figure.json'),
+                                    setup=lambda stellar_object=stellar_object: permalink(stellar_object)))
+    return benchmarks
+
+
+def collect_benchmarks():
+    """Creates the app and returns every benchmark, in the order they are run.
+
+    Expects the stand-in database and spectra to be loaded (see standin).
+    """
+    app = create_app()
+    # the grid was loaded after the app was imported
+    grid_version.refresh(force=True)
+    spectra.refresh(force=True)
+    scenarios = {name: scenario_object(params) for name, params in SCENARIOS.items()}
+    for stellar_object in scenarios.values():
+        stellar_object.fluxes.convert_scale_photosphere_subtract_fluxes()
+        PegasusGrid(stellar_object).query_pegasus_subtype()
+    stellar_object = scenarios['within_limits']
+    return (query_benchmarks(stellar_object) + processing_benchmarks(stellar_object)
+            + plot_benchmarks(stellar_object) + view_benchmarks(app, scenarios))
@@ -0,0 +1,198 @@
+# BENCHMARK RUNNER: TIMES THE HOT PATHS AND WRITES THE TIMINGS AS JSON, OR COMPARES TWO RUNS
+import os
+import sys
+import json
+import time
+import argparse
+import platform
+import tempfile
+import contextlib
+import statistics
+import subprocess
+from datetime import datetime, timezone
+from benchmarks.standin import REPO_ROOT, prepare_environment, load_database, write_spectra
+
+# bump when the layout of the results file changes
+RESULTS_SCHEMA_VERSION = 1
+RESULTS_FOLDER = os.path.join(REPO_ROOT, 'benchmarks', 'results')
+
+
+def git_revision():
+    """Returns the commit of the repo and if the working tree has uncommitted changes (None, None outside of git)."""
+    try:
+        commit = subprocess.run(['git', 'rev-parse', 'HEAD'], cwd=REPO_ROOT, capture_output=True, text=True, check=True).stdout.strip()
+        status = subprocess.run(['git', 'status', '--porcelain', '--untracked-files=no'], cwd=REPO_ROOT, capture_output=True, text=True, check=True).stdout
+    except (OSError, subprocess.CalledProcessError):
+        return None, None
+    return commit, bool(status.strip())
+
+
+def summarize(timings):
+    """Returns the statistics of the timings of a benchmark's rounds (seconds)."""
+    return {
+        'rounds': len(timings),
+        'min': min(timings),
+        'max': max(timings),
+        'mean': statistics.mean(timings),
+        'median': statistics.median(timings),
+        'stdev': statistics.stdev(timings) if len(timings) > 1 else 0.0,
+    }
+
+
+def time_benchmark(benchmark, rounds, warmup):
+    """Times the rounds of a benchmark after its warm-up rounds (which fill the worker's caches and are not timed).
+
+    The app prints as it works, its output is discarded while the benchmark runs.
+    """
+    timings = []
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        for round_number in range(warmup + rounds):
+            state = benchmark.setup() if benchmark.setup is not None else None
+            started = time.perf_counter()
+            benchmark.func(state)
+            elapsed = time.perf_counter() - started
+            if round_number >= warmup:
+                timings.append(elapsed)
+    return summarize(timings)
+
+
+def run_benchmarks(args, workspace):
+    """Loads the stand-in database and spectra into the workspace, then runs the benchmarks.
+
+    Returns:
+        The results: the run's settings and, for each benchmark, its timing statistics or the
+        error it raised.
+    """
+    prepare_environment(workspace, args.mongodb_uri, args.database)
+    from euv_spectra_app.extensions import db
+    print(f'Loading the stand-in database into {args.mongodb_uri} ({args.database})')
+    for name, count in load_database(db).items():
+        print(f'  {count:5d} {name}')
+    print(f'Writing synthetic spectra ({args.points} points) to {workspace}')
+    print(f'  {write_spectra(db, workspace, args.points):5d} FITS files')
+    from benchmarks.cases import collect_benchmarks
+    try:
+        with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+            benchmarks = collect_benchmarks()
+    except Exception as e:
+        # the results file still records the failure, so a broken setup shows up when runs are compared
+        print(f'Collecting the benchmarks failed: {type(e).__name__}: {e}')
+        benchmarks = []
+        collect_error = f'{type(e).__name__}: {e}'
+    else:
+        collect_error = None
+    commit, dirty = git_revision()
+    results = {
+        'schema_version': RESULTS_SCHEMA_VERSION,
+        'commit': commit,
+        'dirty': dirty,
+        'created_at': datetime.now(timezone.utc).isoformat(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'settings': {'rounds': args.rounds, 'warmup': args.warmup, 'points': args.points,
+                     'database': 'mongomock' if args.mongodb_uri.startswith('mongomock://') else 'mongodb'},
+        'benchmarks': {},
+    }
+    if collect_error is not None:
+        results['error'] = collect_error
+    for benchmark in benchmarks:
+        if args.filter and args.filter not in benchmark.name:
+            continue
+        try:
+            stats = time_benchmark(benchmark, args.rounds, args.warmup)
+        except Exception as e:
+            # reported with the results, so one broken path does not hide the timings of the others
+            results['benchmarks'][benchmark.name] = {'error': f'{type(e).__name__}: {e}'}
+            print(f'{benchmark.name:<72} ERROR {type(e).__name__}: {e}')
+            continue
+        results['benchmarks'][benchmark.name] = stats
+        print(f'{benchmark.name:<72} median {stats["median"] * 1000:10.3f} ms  min {stats["min"] * 1000:10.3f} ms')
+    return results
+
+
+def format_median(stats):
+    """Returns the median of a benchmark's results in milliseconds, or - if it has none (missing or failed)."""
+    if stats is None or 'error' in stats:
+        return '-'
+    return f'{stats["median"] * 1000:.3f}'
+
+
+def compare(base_path, new_path, threshold):
+    """Prints the change of each benchmark's median between two results files.
+
+    Args:
+        base_path: The results of the baseline (e.g. the parent commit).
+        new_path: The results to compare with it.
+        threshold: The relative change (e.g. 0.1 for 10%) past which a benchmark is marked as
+            slower or faster.
+
+    Returns:
+        The names of the benchmarks that got slower past the threshold.
+    """
+    with open(base_path) as file:
+        base = json.load(file)
+    with open(new_path) as file:
+        new = json.load(file)
+    print(f'{"benchmark":<72} {"base ms":>10} {"new ms":>10} {"change":>8}')
+    slower = []
+    for name, stats in new['benchmarks'].items():
+        base_stats = base['benchmarks'].get(name)
+        if base_stats is None or 'error' in base_stats or 'error' in stats:
+            print(f'{name:<72} {format_median(base_stats):>10} {format_median(stats):>10}')
+            continue
+        change = stats['median'] / base_stats['median'] - 1
+        marker = ''
+        if change > threshold:
+            marker = 'slower'
+            slower.append(name)
+        elif change < -threshold:
+            marker = 'faster'
+        print(f'{name:<72} {base_stats["median"] * 1000:10.3f} {stats["median"] * 1000:10.3f} {change:+8.1%} {marker}')
+    for name in base['benchmarks']:
+        if name not in new['benchmarks']:
+            print(f'{name:<72} (not in {os.path.basename(new_path)})')
+    return slower
+
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(prog='python -m benchmarks', description='Times the matching, processing, and plotting hot paths against a stand-in database, with no network.')
+    parser.add_argument('--rounds', type=int, default=20, help='Timed rounds of each benchmark.')
+    parser.add_argument('--warmup', type=int, default=2, help='Untimed rounds before the timed rounds.')
+    parser.add_argument('--points', type=int, default=10000, help='Points of each synthetic model spectrum.')
+    parser.add_argument('--filter', help='Only run the benchmarks whose name contains this.')
+    parser.add_argument('--mongodb-uri', default='mongomock://', help='mongomock:// (in memory, the default) or the mongodb:// URI of a local server.')
+    parser.add_argument('--database', default='euv_spectra_benchmark', help='Database the stand-in grid is loaded into. It is emptied first.')
+    parser.add_argument('--workspace', help='Folder for the synthetic spectra and cache (a temporary folder by default).')
+    parser.add_argument('--output', help='Results file (benchmarks/results/<commit>.json by default).')
+    parser.add_argument('--compare', nargs=2, metavar=('BASE', 'NEW'), help='Compare two results files instead of running.')
+    parser.add_argument('--threshold', type=float, default=0.1, help='Relative change of a median reported as slower or faster (with --compare).')
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(sys.argv[1:] if argv is None else argv)
+    if args.compare:
+        slower = compare(*args.compare, args.threshold)
+        return 1 if slower else 0
+    if not args.mongodb_uri.startswith('mongomock://') and 'benchmark' not in args.database:
+        # the database is emptied before the grid is loaded
+        print(f'Refusing to load the stand-in grid into {args.database}, use a database with "benchmark" in its name.')
+        return 2
+    output = args.output
+    if output is None:
+        commit, dirty = git_revision()
+        output = os.path.join(RESULTS_FOLDER, f'{(commit or "unknown")[:12]}{"-dirty" if dirty else ""}.json')
+    output = os.path.abspath(output)
+    with contextlib.ExitStack() as stack:
+        workspace = args.workspace or stack.enter_context(tempfile.TemporaryDirectory(prefix='euv_spectra_benchmark_'))
+        workspace = os.path.abspath(workspace)
+        try:
+            results = run_benchmarks(args, workspace)
+        finally:
+            # out of the workspace before it is removed
+            os.chdir(REPO_ROOT)
+    os.makedirs(os.path.dirname(output), exist_ok=True)
+    with open(output, 'w') as file:
+        json.dump(results, file, indent=2)
+    print(f'Wrote {output}')
+    return 0
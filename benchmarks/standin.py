@@ -0,0 +1,181 @@
+# STAND-IN DATABASE AND MODEL SPECTRA FOR THE BENCHMARKS (NO NETWORK NEEDED)
+import os
+import re
+import csv
+import sys
+import zlib
+from unittest import mock
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+TABLES_FOLDER = os.path.join(REPO_ROOT, 'euv_spectra_app', 'static', 'tables')
+
+# the tables the stand-in PEGASUS grid is loaded from
+SUBTYPE_TABLE = 'model_parameter_grid.csv'
+PHOTOSPHERE_TABLE = 'photosphere_fluxes_update.csv'
+# grid collection -> table of its models (the subtypes the grid is available for: M0, M3, M4, M6)
+GRID_TABLES = {
+    'm0_grid': 'M0_fluxes_update.csv',
+    'm3_grid': 'M3_fluxes_update.csv',
+    'm4_grid': 'correct_M4_photospheresubtracted.csv',
+    'm6_grid': 'correct_M6_photospheresubtracted.csv',
+}
+# the model parameters in the FITS filenames, e.g. PEGASUS.M0.Teff=3850.logg=4.78.TRgrad=7.5.cmtop=5.5.cmin=3.fits
+FILENAME_PARAMETERS = re.compile(r'Teff=(?P<teff>\d+(?:\.\d+)?)\.logg=(?P<logg>\d+(?:\.\d+)?)(?:\.mass=(?P<mass>\d+(?:\.\d+)?))?')
+
+
+def prepare_environment(workspace, mongodb_uri, database):
+    """Points the app at the stand-in database and the workspace. Must run before euv_spectra_app is imported.
+
+    The config is read from the environment when it is imported, so the variables set here
+    win over a .env file. The working directory is changed to the workspace, since the
+    results page looks for the model FITS files under euv_spectra_app/fits_files relative to it.
+
+    Args:
+        workspace: Folder for the synthetic FITS files and the memoization cache.
+        mongodb_uri: A mongodb:// URI of a local server, or mongomock:// for an in-memory database.
+        database: Name of the database the grid is loaded into.
+    """
+    if REPO_ROOT not in sys.path:
+        sys.path.insert(0, REPO_ROOT)
+    if mongodb_uri.startswith('mongomock://'):
+        import mongomock
+        # extensions creates its client with pymongo.MongoClient when it is imported
+        mock.patch('pymongo.MongoClient', mongomock.MongoClient).start()
+        add_round_operator()
+        mongodb_uri = 'mongodb://localhost'
+    os.environ.update({
+        'MONGODB_URI': mongodb_uri,
+        'MONGODB_DATABASE': database,
+        'SECRET_KEY': 'benchmark',
+        'CACHE_DIR': os.path.join(workspace, 'cache'),
+        'FITS_FOLDER_PATH': get_fits_folder(workspace),
+        'MONITORING_DASHBOARD_ENABLED': 'false',
+        'WARMUP_ENABLED': 'false',
+        'SCHEDULER_ENABLED': 'false',
+        'STARTUP_REPORT': 'false',
+    })
+    os.chdir(workspace)
+
+
+def add_round_operator():
+    """Teaches mongomock the $round aggregation operator, which the chi squared searches use and it lacks.
+
+    Rounds like MongoDB does: [number, place] with place 0 by default, half to even, and null
+    for a null or missing number.
+    """
+    from mongomock import aggregate
+    if '$round' in aggregate.arithmetic_operators:
+        return
+    aggregate.arithmetic_operators.add('$round')
+    handle_arithmetic_operator = aggregate._Parser._handle_arithmetic_operator
+
+    def handle_round(parser, operator, values):
+        if operator != '$round':
+            return handle_arithmetic_operator(parser, operator, values)
+        if not isinstance(values, (tuple, list)):
+            values = [values]
+        if not 1 <= len(values) <= 2:
+            raise aggregate.OperationFailure('$round takes 1 or 2 parameters')
+        try:
+            number, place = parser.parse_many(list(values) + [0] * (2 - len(values)))
+        except KeyError:
+            return None
+        if number is None or place is None:
+            return None
+        return round(number, int(place))
+    aggregate._Parser._handle_arithmetic_operator = handle_round
+
+
+def get_fits_folder(workspace):
+    """Returns the folder of the synthetic FITS files in a workspace (laid out like the repo's fits_files)."""
+    return os.path.join(workspace, 'euv_spectra_app', 'fits_files')
+
+
+def read_table(name):
+    """Returns the rows of one of the static/tables CSVs as dicts."""
+    with open(os.path.join(TABLES_FOLDER, name), newline='') as file:
+        return list(csv.DictReader(file))
+
+
+def filename_parameters(filename):
+    """Returns the teff, logg, and (photosphere models only) mass in a model filename as floats."""
+    match = FILENAME_PARAMETERS.search(filename)
+    return {name: float(value) for name, value in match.groupdict().items() if value is not None}
+
+
+def load_database(database):
+    """Loads the stand-in PEGASUS grid from the static/tables CSVs, replacing what the database holds.
+
+    Loads model_parameter_grid (one document per subtype), photosphere_models, and a grid
+    collection per subtype table in GRID_TABLES, with the fields the grid queries use.
+
+    Returns:
+        A dict of collection name to the number of documents loaded.
+    """
+    subtypes = [{'model': row['Spectral_Type'], 'teff': float(row['Teff']), 'logg': float(row['logg']), 'mass': float(row['M'])}
+                for row in read_table(SUBTYPE_TABLE)]
+    subtype_masses = {subtype['model']: subtype['mass'] for subtype in subtypes}
+    collections = {
+        'model_parameter_grid': subtypes,
+        'photosphere_models': [{'fits_filename': row['Filename'], **filename_parameters(row['Filename']),
+                                'fuv': float(row['FUV']), 'nuv': float(row['NUV']), 'euv': float(row['EUV'])}
+                               for row in read_table(PHOTOSPHERE_TABLE)],
+    }
+    for collection, table in GRID_TABLES.items():
+        # the grid models share the mass of their subtype
+        mass = subtype_masses[collection[:2].upper()]
+        collections[collection] = [{'fits_filename': row['Filename'], **filename_parameters(row['Filename']), 'mass': mass,
+                                    'euv': float(row['EUV']), 'fuv': float(row['FUV']), 'nuv': float(row['NUV'])}
+                                   for row in read_table(table)]
+    for name in database.list_collection_names():
+        database.drop_collection(name)
+    for name, documents in collections.items():
+        database.get_collection(name).insert_many(documents)
+    return {name: len(documents) for name, documents in collections.items()}
+
+
+def synthetic_spectrum(teff, points, seed):
+    """Returns the wavelength (Å) and flux arrays of a synthetic spectrum.
+
+    A blackbody at the model temperature over a noisy floor, so the values span the orders of
+    magnitude of a model spectrum. Only the shape and size of the data matter for the benchmarks.
+    """
+    import numpy as np
+    rng = np.random.default_rng(seed)
+    wavelength = np.geomspace(10, 30000, points)
+    wavelength_cm = wavelength * 1e-8
+    with np.errstate(over='ignore'):
+        blackbody = 1.191e-5 / wavelength_cm ** 5 / np.expm1(1.4388 / (wavelength_cm * teff)) * 1e-8
+    flux = blackbody + rng.lognormal(0, 1, points) * 1e-3
+    return wavelength, flux
+
+
+def write_fits(path, wavelength, flux):
+    """Writes a spectrum like the PEGASUS model FITS files: one row of WAVELENGTH and FLUX arrays in the first extension."""
+    import numpy as np
+    from astropy.io import fits
+    points = len(wavelength)
+    columns = [fits.Column(name='WAVELENGTH', format=f'{points}D', array=wavelength[np.newaxis]),
+               fits.Column(name='FLUX', format=f'{points}D', array=flux[np.newaxis])]
+    fits.HDUList([fits.PrimaryHDU(), fits.BinTableHDU.from_columns(columns)]).writeto(path, overwrite=True)
+
+
+def write_spectra(database, workspace, points):
+    """Writes a synthetic FITS file for every model of the stand-in grid, and the test files the results page falls back to.
+
+    Returns:
+        The number of files written.
+    """
+    from euv_spectra_app.helpers_matching import TEST_FILEPATH_NAMES
+    fits_folder = get_fits_folder(workspace)
+    files = [(os.path.join('test', filename), 3850) for filename in TEST_FILEPATH_NAMES]
+    for collection in GRID_TABLES:
+        subtype = collection[:2].upper()
+        for model in database.get_collection(collection).find({}, {'fits_filename': 1, 'teff': 1}):
+            files.append((os.path.join(subtype, model['fits_filename']), model['teff']))
+    for filename, teff in files:
+        path = os.path.join(fits_folder, filename)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # seeded by the filename, so every run writes the same spectra
+        write_fits(path, *synthetic_spectrum(teff, points, zlib.crc32(filename.encode())))
+    return len(files)
@@ -1,14 +1,109 @@
-# initializing main and database
-from flask import Flask
-from euv_spectra_app.config import Config
-from flask_session import Session
-import os
+# app factory. Nothing heavy is imported here, importing the package (e.g. for extensions) stays cheap.
+from euv_spectra_app.startup import startup_step, print_startup_report
 
-app = Flask(__name__)
-app.config.from_object(Config)
-app.secret_key = os.urandom(24)
 
-Session(app)
+def preload_shared_state():
+    """Loads the read-only lookup tables and heavy modules once, e.g. in the gunicorn master.
 
-from euv_spectra_app.main.routes import main
-app.register_blueprint(main)
\ No newline at end of file
+    Forked workers share everything loaded here copy-on-write instead of each loading it.
+    The warm-up (WARMUP_ENABLED) runs here too, so the workers fork warm and ready instead of
+    each warming up on its own. A temporary Mongo client is used and closed, so no connection
+    is inherited by the workers.
+    """
+    from os import environ
+    from pymongo import MongoClient
+    from euv_spectra_app.startup import load_lazy_modules
+    from euv_spectra_app.helpers_galex_epochs import galex_epochs
+    from euv_spectra_app.helpers_galex_store import galex_index
+    from euv_spectra_app.helpers_grid import grid_version
+    from euv_spectra_app.helpers_warmup import run_warmup
+    from euv_spectra_app.config import Config
+    load_lazy_modules()
+    with MongoClient(environ.get('MONGODB_URI')) as client:
+        preload_db = client.get_database(environ.get('MONGODB_DATABASE'))
+        with startup_step('preload GALEX epoch table'):
+            galex_epochs.refresh(force=True, collection=preload_db.mast_galex_times)
+        with startup_step('preload GALEX source index'):
+            galex_index.refresh(database=preload_db)
+        with startup_step('preload grid version'):
+            grid_version.refresh(force=True, database=preload_db)
+        if Config.WARMUP_ENABLED:
+            with startup_step('warm up'):
+                run_warmup(preload_db)
+
+
+def bind_dashboard(app):
+    """Binds the Flask monitoring dashboard if it is enabled."""
+    if app.config['MONITORING_DASHBOARD_ENABLED']:
+        import flask_monitoringdashboard as dashboard
+        dashboard.config.init_from(file='/config.py')
+        dashboard.bind(app)
+
+
+def init_worker(app):
+    """Starts the per-worker parts of the app after a gunicorn fork (see gunicorn.conf.py)."""
+    from euv_spectra_app.config import Config
+    from euv_spectra_app.tasks import start_scheduler
+    from euv_spectra_app.helpers_warmup import start_warmup
+    bind_dashboard(app)
+    if Config.SCHEDULER_ENABLED:
+        start_scheduler()
+    start_warmup()
+
+
+def create_app(preload=False):
+    """Sets up and returns the Flask app.
+
+    Args:
+        preload: If the app is being loaded in the gunicorn master (gunicorn --preload). The
+            shared lookup tables are loaded and the warm-up runs now so workers share them, and
+            the dashboard and scheduler are left for init_worker to start in each worker after the fork.
+
+    Returns:
+        The Flask app.
+    """
+    with startup_step('import extensions'):
+        from euv_spectra_app.extensions import app
+    with startup_step('import routes'):
+        from euv_spectra_app.main.routes import main
+        from euv_spectra_app.api.routes import api
+        from euv_spectra_app.health.routes import health
+        from euv_spectra_app.tasks import register_tasks
+        from euv_spectra_app.helpers_session_store import MongoSessionInterface
+        from euv_spectra_app.helpers_warmup import start_warmup
+        from euv_spectra_app.helpers_compression import compress_response
+    if 'main' not in app.blueprints:
+        app.session_interface = MongoSessionInterface()
+        app.after_request(compress_response)
+        app.register_blueprint(main)
+        app.register_blueprint(api)
+        app.register_blueprint(health)
+        register_tasks(app, start_jobs=not preload)
+        if not preload:
+            with startup_step('bind monitoring dashboard'):
+                bind_dashboard(app)
+            start_warmup()
+    if preload:
+        preload_shared_state()
+    if app.config['STARTUP_REPORT']:
+        print_startup_report()
+    return app
+
+
+def create_asgi_app():
+    """Sets up and returns the ASGI app of the async serving mode (see asgi.py).
+
+    The catalog search routes of the API are answered on the event loop with the async
+    HTTP client and Mongo driver (api/async_routes.py), every other request by the Flask app
+    on a pool of ASGI_WSGI_WORKERS threads, so slow Flask routes do not wait on each other.
+
+    Returns:
+        The ASGI app.
+    """
+    from a2wsgi import WSGIMiddleware
+    from euv_spectra_app.config import Config
+    from euv_spectra_app.helpers_asgi import AsgiRouter
+    from euv_spectra_app.helpers_async import async_resources
+    from euv_spectra_app.api.async_routes import async_api
+    app = create_app()
+    return AsgiRouter([async_api], WSGIMiddleware(app, workers=Config.ASGI_WSGI_WORKERS), on_startup=[async_resources.start], on_shutdown=[async_resources.close])
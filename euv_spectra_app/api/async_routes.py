@@ -0,0 +1,98 @@
+# ASYNC VERSIONS OF THE CATALOG SEARCH ROUTES (FOR THE ASGI SERVING MODE, SEE asgi.py)
+import json
+import math
+import asyncio
+from urllib.parse import urlencode
+from euv_spectra_app.helpers_asgi import AsyncRoutes, AsyncRequest, json_response
+from euv_spectra_app.helpers import to_json
+from euv_spectra_app.helpers_async import async_resources, search_stellar_object
+from euv_spectra_app.helpers_batch import to_parameters_response, parameters_cache_policy
+
+async_api = AsyncRoutes(url_prefix='/api')
+
+'''
+ROUTES:
+
+Answered on the event loop when the app is served through asgi.py, every other /api route
+is answered by the Flask app (api/routes.py). The answers have the same JSON as the sync routes.
+
+1. Search for parameters by name (returns JSON)
+2. Search for parameters by position/coords (returns JSON)
+'''
+
+
+@async_api.route('/get_parameters_by_name', methods=['GET', 'POST'])
+async def get_stellar_parameters_by_name(request):
+    """Searches all dbs by name to return stellar parameters (async version of api.get_stellar_parameters_by_name).
+
+    Example HTML path: /api/get_parameters_by_name?name=GJ%20338%20B
+
+    Args:
+        name: Name of a stellar object
+    """
+    star_name = request.args.get('name')
+    if star_name is None:
+        return json_response(request, {})
+    stellar_data = to_parameters_response(to_json(await search_stellar_object(star_name=star_name)))
+    return json_response(request, stellar_data, policy=parameters_cache_policy(stellar_data))
+
+
+@async_api.route('/get_parameters_by_position', methods=['GET', 'POST'])
+async def get_stellar_parameters_by_position(request):
+    """Searches all dbs by position to return stellar parameters (async version of api.get_stellar_parameters_by_position).
+
+    Example HTML path: /api/get_parameters_by_position?position=09h14m22.00s+52d41m00.68s
+
+    Args:
+        position: ICRS coordinates of a stellar object.
+    """
+    position = request.args.get('position')
+    if position is None:
+        return json_response(request, {})
+    stellar_data = to_parameters_response(to_json(await search_stellar_object(position=position)))
+    return json_response(request, stellar_data, policy=parameters_cache_policy(stellar_data))
+
+
+"""——————————————————————————————PARITY WITH THE SYNC ROUTES——————————————————————————————"""
+
+def json_differences(sync_value, async_value, path=''):
+    """Returns the (path, sync value, async value) of every difference between two JSON values (floats within 1e-9)."""
+    if isinstance(sync_value, dict) and isinstance(async_value, dict):
+        differences = []
+        for key in sorted(set(sync_value) | set(async_value)):
+            differences += json_differences(sync_value.get(key), async_value.get(key), f'{path}.{key}' if path else key)
+        return differences
+    if isinstance(sync_value, list) and isinstance(async_value, list) and len(sync_value) == len(async_value):
+        return [difference for index, (sync_item, async_item) in enumerate(zip(sync_value, async_value))
+                for difference in json_differences(sync_item, async_item, f'{path}[{index}]')]
+    if isinstance(sync_value, float) and isinstance(async_value, float) and math.isclose(sync_value, async_value, rel_tol=1e-9):
+        return []
+    return [] if sync_value == async_value else [(path, sync_value, async_value)]
+
+
+async def compare_with_sync_routes(app, searches):
+    """Runs searches through the sync Flask routes and these routes, and returns how their JSON differs.
+
+    Args:
+        app: The Flask app.
+        searches: (route, search term) pairs, e.g. ('get_parameters_by_name', 'GJ 338 B').
+
+    Returns:
+        A dict of (route, search term) to the list of differences (see json_differences).
+    """
+    argument = {'get_parameters_by_name': 'name', 'get_parameters_by_position': 'position'}
+    client = app.test_client()
+    await async_resources.start()
+    try:
+        results = {}
+        for route, term in searches:
+            query = {argument[route]: term}
+            # the sync route first, the async one then reads the catalog answers it cached
+            sync_response = await asyncio.to_thread(client.get, f'/api/{route}', query_string=query)
+            scope = {'method': 'GET', 'path': f'/api/{route}', 'query_string': urlencode(query).encode(), 'headers': []}
+            request = AsyncRequest(scope)
+            _, _, body = await async_api.match(scope)(request)
+            results[(route, term)] = json_differences(json.loads(sync_response.get_data()), json.loads(body))
+        return results
+    finally:
+        await async_resources.close()
@@ -1,10 +1,17 @@
-from flask import Blueprint, request, render_template, current_app
+from flask import Blueprint, request, render_template, current_app, make_response, url_for
 import json
-import os
-from astropy.io import fits
-from euv_spectra_app.extensions import *
-from euv_spectra_app.helpers_astroquery import StellarTarget, GalexFlux
-from euv_spectra_app.helpers import to_json
+import re
+from euv_spectra_app.helpers_astroquery import GalexFlux
+from euv_spectra_app.helpers_galex_epochs import galex_epochs
+from euv_spectra_app.helpers_batch import start_batch_resolution, resolve_target, to_parameters_response, parameters_cache_policy
+from euv_spectra_app.helpers_jobs import get_job, get_job_results, follow_job_results
+from euv_spectra_app.helpers_grid import get_grid_version
+from euv_spectra_app.helpers_http_cache import http_cache, params_only, apply_cache_headers
+from euv_spectra_app.helpers_spectra import spectra
+from euv_spectra_app.helpers_stream import wants_ndjson, ndjson_response
+from euv_spectra_app.helpers_compression import precompressed_response
+from euv_spectra_app.helpers_matching import stellar_object_from_params, match_for_api
+from euv_spectra_app.helpers_fluxes import mag_to_ujy, ujy_to_flux_density, surface_scale, propagate_error, read_columns, get_column, count_rows, to_column, TooManyRowsError
 from euv_spectra_app.helpers_dbqueries import get_matching_subtype, get_matching_photosphere, get_models_with_chi_squared, get_models_within_limits, get_models_with_weighted_fuv, get_flux_ratios
 
 api = Blueprint("api", __name__, url_prefix="/api")
@@ -15,12 +22,14 @@ ROUTES:
 GETTING STELLAR PARAMETERS
 1. Search for parameters by name (returns JSON)
 2. Search for parameters by position/coords (returns JSON)
+2a. Resolve parameters for a batch of names or positions (returns the job id to poll)
+2b. Poll the progress and results of a batch job (returns JSON)
 
 PREPARING GALEX FLUXES
-3. Convert GALEX ujy to flux (returns JSON)
-4. Scale fluxes to stellar surface (returns JSON)
+3. Convert GALEX ujy to flux (returns JSON, POST arrays for many rows)
+4. Scale fluxes to stellar surface (returns JSON, POST arrays for many rows)
 5. Find matching photosphere model (returns b64 fits file)
-6. Subtract photospheric flux (returns JSON)
+6. Subtract photospheric flux (returns JSON, POST arrays for many rows)
 7. Run all calculations for converted, scaled, and photospheric subtracted GALEX flux (returns JSON)
 
 SEARCHING GRID
@@ -30,6 +39,7 @@ SEARCHING GRID
 10. Find matching models by chi squared value (returns b64 fits files)
 11. Find matching models by weighted FUV flux (returns b64 fits files)
 12. Find matching models by flux ratio (returns b64 fits files)
+13. Run the whole model search of the results page in one call (returns JSON)
 
 maybe:
 - search simbad 
@@ -51,30 +61,57 @@ def load_api():
 
 
 @api.route('/get_galex_obs_time', methods=['GET', 'POST'])
+@http_cache('catalog', version=galex_epochs.get_version)
 def get_galex_obs_time():
     """
     Example HTML path: /api/get_galex_obs_time?star_name=GJ338B
+
+    Args:
+        star_name: Name of a stellar object (spacing and capitalization do not matter)
+        all: If true, returns the epochs of all GALEX visits instead of one
+        near: Optional epoch (MJD), returns the GALEX visit closest to it instead of the earliest one
     """
     star_name = request.args.get('star_name')
     if star_name is not None:
-        galex_time = db.mast_galex_times.find_one({'target': star_name})
-        if galex_time:
-            return_data = galex_time['t_min']
-            return json.dumps(return_data)
-    return json.dumps(f'No GALEX observations found for {star_name}. Please check your spelling, spacing, and/or capitalization and try again.')
+        if request.args.get('all', '').lower() == 'true':
+            epochs = galex_epochs.get_epochs(star_name)
+            if epochs is not None:
+                return json.dumps(epochs.tolist())
+        else:
+            near = request.args.get('near', type=float)
+            galex_time = galex_epochs.get_epoch(star_name, near=near)
+            if galex_time is not None:
+                return json.dumps(galex_time)
+    return json.dumps(f'No GALEX observations found for {star_name}. Please check your spelling and try again.')
+
+
+def parameters_response(data):
+    """Returns the answer of a parameter search, marked no-store if the search had errors (see parameters_cache_policy)."""
+    stellar_data = to_parameters_response(data)
+    response = make_response(json.dumps(stellar_data))
+    if parameters_cache_policy(stellar_data) == 'error':
+        # http_cache leaves responses that set their own caching alone
+        apply_cache_headers(response, 'error')
+    return response
 
 
 @api.route('/get_parameters_by_name', methods=['GET', 'POST'])
+@http_cache('catalog')
 def get_stellar_parameters_by_name():
     """Searches all dbs by name to return stellar parameters.
 
+    Runs the search of the search form (through the catalog cache, local mirrors, and
+    circuit breakers), so the answer is the same as the async route's (api/async_routes.py).
+    Identical searches running at the same time, on any worker, share one execution.
+
     Example HTML path: /api/get_parameters_by_name?name=GJ%20338%20B
 
     Args: 
         name: Name of a stellar object
     
     Returns:
-        stellar_data: JSON data of all returned stellar parameters
+        stellar_data: JSON data of all returned stellar parameters, with the error messages
+        of the search under modal_error_msg if there were any
         example: 
         {
             "star_name": "GJ 338 B", 
@@ -109,26 +146,26 @@ def get_stellar_parameters_by_name():
         }
     """
     star_name = request.args.get('name')
-    stellar_target = StellarTarget()
     if star_name == None:
         return json.dumps({})
-    stellar_target.star_name = star_name
-    stellar_target.search_dbs()
-    stellar_data = json.dumps(to_json(stellar_target))
-    return stellar_data
+    return parameters_response(resolve_target(star_name=star_name))
 
 
 @api.route('/get_parameters_by_position', methods=['GET', 'POST'])
+@http_cache('catalog')
 def get_stellar_parameters_by_position():
     """Searches all dbs by position to return stellar parameters.
 
+    Runs the search of the search form, like get_stellar_parameters_by_name.
+
     Example HTML path: /api/get_parameters_by_position?position=09h14m22.00s+52d41m00.68s
     
     Args: 
         position: ICRS coordinates of a stellar object.
     
     Returns:
-        stellar_data_json: JSON data of all returned stellar parameters
+        stellar_data_json: JSON data of all returned stellar parameters, with the error
+        messages of the search under modal_error_msg if there were any
         example: 
         {
             "star_name": null, 
@@ -158,21 +195,145 @@ def get_stellar_parameters_by_position():
         }
     """
     position = request.args.get('position')
-    stellar_target = StellarTarget()
     if position == None:
         return json.dumps({})
-    stellar_target.position = position
-    stellar_target.search_dbs()
-    stellar_data = json.dumps(to_json(stellar_target))
-    return stellar_data
+    return parameters_response(resolve_target(position=position))
+
+
+@api.route('/resolve_batch', methods=['POST'])
+def resolve_batch():
+    """Resolves stellar parameters for many targets at once.
+
+    Example request: POST /api/resolve_batch with JSON body {"names": ["GJ 338 B", "TRAPPIST-1"]}
+    or {"positions": ["09h14m22.00s +52d41m00.68s"]}
 
+    The targets are resolved in the background on a bounded worker pool. The request answers
+    right away with the job id, so a long batch never holds a worker past its timeout. Poll
+    /api/jobs/<job_id> for the progress and results (results=true), or stream the finished
+    results with Accept: application/x-ndjson.
 
-@api.route('/convert_microjanskies_to_flux')
+    Returns:
+        JSON data of the job, with a 202 status and the job URL in the Location header
+        example:
+            {"job_id": "...", "total": 2, "status_url": "/api/jobs/..."}
+    """
+    data = request.get_json(silent=True) or {}
+    names = data.get('names') or []
+    positions = data.get('positions') or []
+    if not isinstance(names, list) or not isinstance(positions, list):
+        return json.dumps('names and positions must be lists. Please check your request and try again.'), 400
+    targets = [{'star_name': str(name)} for name in names] + [{'position': str(position)} for position in positions]
+    if not targets:
+        return json.dumps('Please include a list of names or positions to resolve.'), 400
+    if len(targets) > current_app.config['BATCH_RESOLVE_MAX_TARGETS']:
+        return json.dumps(f'Too many targets, at most {current_app.config["BATCH_RESOLVE_MAX_TARGETS"]} can be resolved in one batch.'), 400
+    job_id = start_batch_resolution(targets)
+    status_url = url_for('api.get_job_status', job_id=job_id)
+    response = make_response(json.dumps({'job_id': job_id, 'total': len(targets), 'status_url': status_url}), 202)
+    response.headers['Location'] = status_url
+    response.headers['X-Job-Id'] = job_id
+    return response
+
+
+@api.route('/jobs/<job_id>')
+def get_job_status(job_id):
+    """Returns the progress of a background job.
+
+    Example HTML path: /api/jobs/<job_id>?results=true&offset=0&limit=100
+
+    Args:
+        results: If true, includes a page of the finished results (in the order they finished)
+        offset: The number of results to skip
+        limit: The maximum number of results to return (at most 1000)
+
+    With Accept: application/x-ndjson and results=true, the job progress is streamed as the
+    first line, followed by every result from offset on (no limit), one per line as each
+    target finishes. The stream ends when the job is done or failed.
+
+    Returns:
+        JSON data of the job progress
+        example:
+            {"job_id": "...", "type": "resolve", "status": "running", "total": 3000,
+             "completed": 1200, "failed": 14, "progress": 0.4, ...}
+        status is queued, running, done, or failed (the worker running the job stopped, the
+        reason is under error).
+    """
+    job = get_job(job_id)
+    if job is None:
+        return json.dumps(f'No job found with id {job_id}.'), 404
+    if request.args.get('results', '').lower() == 'true' and wants_ndjson():
+        offset = max(request.args.get('offset', 0, type=int), 0)
+
+        def generate():
+            yield job
+            yield from follow_job_results(job_id, offset)
+        return ndjson_response(generate())
+    if request.args.get('results', '').lower() == 'true':
+        offset = max(request.args.get('offset', 0, type=int), 0)
+        limit = min(max(request.args.get('limit', 100, type=int), 1), 1000)
+        job['results'] = get_job_results(job_id, offset, limit)
+    return json.dumps(job)
+
+
+def array_response(convert):
+    """Runs the array mode of a conversion route on the columns of the request body.
+
+    Args:
+        convert: A function of the columns, the query arguments, and the number of rows, that
+            returns a dict of result name to numpy array.
+
+    Returns:
+        A JSON string of the result columns (NaN as null) and the number of rows, or a message
+        and a 400 status if the body is invalid (413 if it is too large).
+    """
+    try:
+        columns = read_columns(request)
+        rows = count_rows(columns)
+        results = convert(columns, request.args, rows)
+    except TooManyRowsError as e:
+        return json.dumps(str(e)), 413
+    except ValueError as e:
+        return json.dumps(str(e)), 400
+    return_data = {name: to_column(values) for name, values in results.items()}
+    return_data['rows'] = rows
+    return json.dumps(return_data)
+
+
+def convert_microjanskies_to_flux_arrays(columns, args, rows):
+    """Array mode of convert_microjanskies_to_flux."""
+    results = {}
+    for flux in ['fuv', 'nuv']:
+        values = get_column(columns, args, flux, rows)
+        if values is None:
+            continue
+        errors = get_column(columns, args, f'{flux}_err', rows)
+        if args.get(f'{flux}_unit', 'ujy') == 'mag':
+            # AB magnitudes, converted to microjanskies first
+            if errors is not None:
+                errors = propagate_error(lambda mags: mag_to_ujy(mags, flux), values, errors)
+            values = mag_to_ujy(values, flux)
+            results[f'{flux}_ujy'] = values
+            if errors is not None:
+                results[f'{flux}_ujy_err'] = errors
+        results[f'converted_{flux}'] = ujy_to_flux_density(values, flux)
+        if errors is not None:
+            results[f'converted_{flux}_err'] = propagate_error(lambda ujy: ujy_to_flux_density(ujy, flux), values, errors)
+    return results
+
+
+@api.route('/convert_microjanskies_to_flux', methods=['GET', 'POST'])
+@http_cache('calculation', version=params_only)
 def convert_microjanskies_to_flux():
     """Converts GALEX flux from ujy to flux density.
 
     Example HTML path: /api/convert_microjanskies_to_flux?fuv=55.76&fuv_err=8.7&nuv=1002.16&nuv_err=14.88
 
+    Array mode: POST the fluxes of many rows, as a JSON object of columns
+    ({"fuv": [...], "fuv_err": [...], "nuv": [...], "nuv_err": [...]}), a JSON array of row
+    objects, or CSV with a header row. The results are returned as columns in the same order.
+    Add fuv_unit=mag or nuv_unit=mag to the URL if the values are AB magnitudes, they are
+    then converted to microjanskies first (returned as fuv_ujy, fuv_ujy_err, ...).
+
     Args: 
         fuv: GALEX FUV in microjanskies,
         nuv: GALEX NUV in microjanskies,
@@ -189,6 +350,8 @@ def convert_microjanskies_to_flux():
                 "converted_fuv_err": 1.0972429274274818e-16
             }
     """
+    if request.method == 'POST':
+        return array_response(convert_microjanskies_to_flux_arrays)
     FUV_WV = 1542.3
     NUV_WV = 2274.4
 
@@ -220,12 +383,31 @@ def convert_microjanskies_to_flux():
     return json.dumps(return_data)
 
 
-@api.route('/scale_galex_flux')
+def scale_galex_flux_arrays(columns, args, rows):
+    """Array mode of scale_galex_flux_to_stellar_surface."""
+    dist = get_column(columns, args, 'dist', rows)
+    rad = get_column(columns, args, 'rad', rows)
+    if dist is None or rad is None:
+        raise ValueError('Values needed for dist and rad in order to calculate scale. Please include these values and try again.')
+    scale = surface_scale(dist, rad)
+    results = {'scale': scale}
+    for flux in ['fuv', 'nuv', 'fuv_err', 'nuv_err']:
+        values = get_column(columns, args, flux, rows)
+        if values is not None:
+            results[f'scaled_{flux}'] = values * scale
+    return results
+
+
+@api.route('/scale_galex_flux', methods=['GET', 'POST'])
+@http_cache('calculation', version=params_only)
 def scale_galex_flux_to_stellar_surface():
     """Scales GALEX flux to the stellar surface.
 
     Example HTML path: /api/scale_galex_flux?fuv=55.76&fuv_err=8.7&nuv=1002.16&nuv_err=14.88&dist=6.33256&rad=0.58
 
+    Array mode: POST the fluxes, distances, and radii of many rows as columns (see
+    convert_microjanskies_to_flux). A dist or rad given in the URL instead is used for every row.
+
     Args:
         fuv: GALEX FUV flux density (units of ergs/s/cm2/Å)
         nuv: GALEX NUV flux density (units of ergs/s/cm2/Å)
@@ -245,6 +427,8 @@ def scale_galex_flux_to_stellar_surface():
                 "scaled_nuv_err": 3.5473862582902267e+18
             }
     """
+    if request.method == 'POST':
+        return array_response(scale_galex_flux_arrays)
     dist = request.args.get('dist')
     rad = request.args.get('rad')
 
@@ -273,6 +457,7 @@ def scale_galex_flux_to_stellar_surface():
 
 
 @api.route('/get_matching_photosphere_model')
+@http_cache('grid', version=get_grid_version)
 def get_matching_photosphere_model():
     """Returns a matching PHOENIX photosphere model.
 
@@ -313,12 +498,33 @@ def get_matching_photosphere_model():
         return json.dumps('Teff, logg, or mass has a non-numerical value. Please check your inputs and try again.')
 
 
-@api.route('/subtract_photospheric_flux')
+def subtract_photospheric_flux_arrays(columns, args, rows):
+    """Array mode of subtract_photospheric_flux."""
+    results = {}
+    for flux in ['fuv', 'nuv']:
+        values = get_column(columns, args, flux, rows)
+        photo_flux = get_column(columns, args, f'photo_{flux}', rows)
+        if values is None or photo_flux is None:
+            continue
+        results[f'photosphere_subtracted_{flux}'] = values - photo_flux
+        errors = get_column(columns, args, f'{flux}_err', rows)
+        if errors is not None:
+            # subtracting a constant does not change the error
+            results[f'photosphere_subtracted_{flux}_err'] = errors.copy()
+    return results
+
+
+@api.route('/subtract_photospheric_flux', methods=['GET', 'POST'])
+@http_cache('grid', version=get_grid_version)
 def subtract_photospheric_flux():
     """Subtracts photospheric flux contribution from GALEX fluxes.
 
     Example HTML path: /api/subtract_photospheric_flux?fuv=55.76&fuv_err=8.7&nuv=1002.16&nuv_err=14.88&photo_fuv=0.0034849216444831&photo_nuv=166.280545204594
 
+    Array mode: POST the fluxes and photospheric fluxes of many rows as columns (see
+    convert_microjanskies_to_flux). A photo_fuv or photo_nuv given in the URL instead is used
+    for every row.
+
     Args:
         fuv: GALEX FUV flux density (units of ergs/s/cm2/Å)
         nuv: GALEX NUV flux density (units of ergs/s/cm2/Å)
@@ -338,6 +544,8 @@ def subtract_photospheric_flux():
             }
     
     """
+    if request.method == 'POST':
+        return array_response(subtract_photospheric_flux_arrays)
     fluxes = ['fuv', 'nuv']
     return_data = {}
 
@@ -363,6 +571,7 @@ def subtract_photospheric_flux():
 
 
 @api.route('/convert_scale_photosphere_subtract_galex_fluxes')
+@http_cache('grid', version=get_grid_version)
 def convert_scale_photosphere_subtract_galex_fluxes():
     """Runs all calculations on GALEX fluxes to prepare them for searching the PEGASUS grid.
 
@@ -454,6 +663,7 @@ def convert_scale_photosphere_subtract_galex_fluxes():
 
 
 @api.route('/get_matching_subtype')
+@http_cache('grid', version=get_grid_version)
 def find_matching_phoenix_subtype():
     """Returns a matching subtype based on the PHOENIX stellar subtype parameters.
 
@@ -492,7 +702,78 @@ def find_matching_phoenix_subtype():
         return json.dumps('Teff, logg, or mass contain non-numerical data. Please check your inputs and try again.')
 
 
+# Helper functions for the fields, limit, and offset arguments of the grid model routes
+FIELD_NAME = re.compile(r'^[A-Za-z_][A-Za-z0-9_]*$')
+
+
+def get_page_args():
+    """Returns the fields, offset, and limit arguments of a grid model route.
+
+    fields is a comma separated list of the model fields to return (e.g.
+    fields=fits_filename,chi_squared), limit the number of models to return (at most
+    GRID_PAGE_MAX_LIMIT, all of them if not given), and offset the number of models to skip.
+
+    Raises:
+        ValueError with a message for the client if an argument is invalid.
+    """
+    fields = request.args.get('fields')
+    if fields:
+        fields = tuple(sorted({field.strip() for field in fields.split(',') if field.strip()}))
+        for field in fields:
+            if not FIELD_NAME.match(field):
+                raise ValueError(f'{field} is not a valid field name. Please check your fields argument and try again.')
+    try:
+        offset = max(int(request.args.get('offset', 0)), 0)
+        limit = request.args.get('limit')
+        if limit is not None:
+            limit = min(max(int(limit), 1), current_app.config['GRID_PAGE_MAX_LIMIT'])
+    except ValueError:
+        raise ValueError('Values of limit and offset must be integers. Please check your arguments and try again.')
+    return fields or None, offset, limit
+
+
+def models_response(query, query_args, fields, exclude, offset, limit):
+    """Runs a grid model query and returns its page of models.
+
+    The models are keyed model_<rank> (model_0 is the best match). If the page is full, a Link
+    header points to the next page (rel="next"). With spectra=true each model includes its
+    spectrum (None if its FITS file is not available yet).
+
+    With Accept: application/x-ndjson the models are streamed one per line (with their rank as
+    index) straight from the database cursor, without the memoization, so the worker only
+    holds one model (and spectrum) at a time however large the page is.
+
+    Args:
+        query: The grid query helper (from helpers_dbqueries).
+        query_args: The fluxes and collection to pass to the query.
+        fields, exclude, offset, limit: The page and projection (see page_stages).
+    """
+    include_spectra = request.args.get('spectra', '').lower() == 'true'
+    if include_spectra and fields and 'fits_filename' not in fields:
+        fields = tuple(sorted(fields + ('fits_filename',)))
+
+    def with_spectrum(model):
+        if include_spectra:
+            model['spectrum'] = spectra.get_spectrum_data(model['fits_filename'])
+        return model
+
+    if wants_ndjson():
+        models = query.__wrapped__(*query_args, fields=fields, exclude=exclude, skip=offset, limit=limit)
+        return ndjson_response({'index': offset + count, **with_spectrum(model)} for count, model in enumerate(models))
+    models = query(*query_args, fields=fields, exclude=exclude, skip=offset, limit=limit)
+    return_data = {}
+    for count, model in enumerate(models):
+        return_data[f'model_{offset + count}'] = with_spectrum(model)
+    response = make_response(json.dumps(return_data, default=str))
+    if limit is not None and len(return_data) == limit:
+        next_args = request.args.to_dict()
+        next_args['offset'] = offset + limit
+        response.headers['Link'] = f'<{url_for(request.endpoint, **next_args)}>; rel="next"'
+    return response
+
+
 @api.route('/get_models_in_limits')
+@http_cache('grid', version=get_grid_version)
 def get_models_in_limits():
     """Returns PHOENIX models that have FUV and NUV flux density values within the upper and lower limits of the given GALEX FUV and NUV values.
 
@@ -504,6 +785,12 @@ def get_models_in_limits():
         nuv: GALEX NUV flux density converted, scaled, and photosphere subtracted from previous flux processing steps
         fuv_err: GALEX FUV error flux density converted, scaled, and photosphere subtracted from previous flux processing steps
         nuv_err: GALEX NUV error flux density converted, scaled, and photosphere subtracted from previous flux processing steps
+        fields: Comma separated model fields to return (optional, e.g. fits_filename,chi_squared)
+        limit: Number of models to return (optional, all models by default)
+        offset: Number of models to skip (optional, follow the Link header for the next page)
+        spectra: true to include the wavelength and flux data of each model's spectrum (optional)
+
+    With Accept: application/x-ndjson the models are streamed, one per line (see models_response).
 
     Returns:
         JSON string with all models within limits
@@ -525,19 +812,18 @@ def get_models_in_limits():
     nuv = request.args.get('nuv')
     fuv_err = request.args.get('fuv_err')
     nuv_err = request.args.get('nuv_err')
+    try:
+        fields, offset, limit = get_page_args()
+    except ValueError as e:
+        return json.dumps(str(e)), 400
     
     try:
         if subtype is not None:
             grid = f'{subtype.lower()}_grid'
             if fuv is not None and nuv is not None and fuv_err is not None and nuv_err is not None:
-                models_in_limits = get_models_within_limits(float(nuv), float(fuv), float(nuv_err), float(fuv_err), grid)
-                return_data = {}
-                count = 0
-                for i in models_in_limits:
-                    del i['_id']
-                    return_data[f'model_{count}'] = i
-                    count += 1
-                return json.dumps(return_data)
+                # only the requested page and fields leave the database
+                return models_response(get_models_within_limits, (float(nuv), float(fuv), float(nuv_err), float(fuv_err), grid),
+                                       fields, ('_id',), offset, limit)
             else:
                 return json.dumps('Values are needed for fuv, fuv_err, nuv, and nuv_err, please include these arguments and try again.')
         else:
@@ -547,6 +833,7 @@ def get_models_in_limits():
 
 
 @api.route('/get_models_by_chi_squared')
+@http_cache('grid', version=get_grid_version)
 def get_models_by_chi_squared():
     """Returns PHOENIX models in the given subtype grid sorted by lowest to highest chi squared value.
 
@@ -556,6 +843,12 @@ def get_models_by_chi_squared():
         subtype: The name of the PHOENIX subtype grid to search on (example 'M2')
         fuv: GALEX FUV flux density converted, scaled, and photosphere subtracted from previous flux processing steps
         nuv: GALEX NUV flux density converted, scaled, and photosphere subtracted from previous flux processing steps
+        fields: Comma separated model fields to return (optional, e.g. fits_filename,chi_squared)
+        limit: Number of models to return (optional, all models by default)
+        offset: Number of models to skip (optional, follow the Link header for the next page)
+        spectra: true to include the wavelength and flux data of each model's spectrum (optional)
+
+    With Accept: application/x-ndjson the models are streamed, one per line (see models_response).
 
     Returns:
         JSON string with all models within provided subgrid sorted by chi squared value
@@ -586,18 +879,16 @@ def get_models_by_chi_squared():
     subtype = request.args.get('subtype')
     fuv = request.args.get('fuv')
     nuv = request.args.get('nuv')
+    try:
+        fields, offset, limit = get_page_args()
+    except ValueError as e:
+        return json.dumps(str(e)), 400
     try:
         if subtype is not None:
             grid = f'{subtype.lower()}_grid'
             if fuv is not None and nuv is not None:
-                models_with_chi_squared = get_models_with_chi_squared(float(nuv), float(fuv), grid)
-                return_data = {}
-                count = 0
-                for i in models_with_chi_squared:
-                    del i['_id']
-                    return_data[f'model_{count}'] = i
-                    count += 1
-                return json.dumps(return_data)
+                return models_response(get_models_with_chi_squared, (float(nuv), float(fuv), grid),
+                                       fields, ('_id',), offset, limit)
             else:
                 return json.dumps('Values are needed for fuv, and nuv, please include these arguments and try again.')
         else:
@@ -607,6 +898,7 @@ def get_models_by_chi_squared():
 
 
 @api.route('/get_models_by_weighted_fuv')
+@http_cache('grid', version=get_grid_version)
 def get_models_by_weighted_fuv():
     """Returns PHOENIX models in the given subtype grid sorted by lowest to highest chi squared values and weighted on the FUV.
 
@@ -616,6 +908,12 @@ def get_models_by_weighted_fuv():
         subtype: The name of the PHOENIX subtype grid to search on (example 'M2')
         fuv: GALEX FUV flux density converted, scaled, and photosphere subtracted from previous flux processing steps
         nuv: GALEX NUV flux density converted, scaled, and photosphere subtracted from previous flux processing steps
+        fields: Comma separated model fields to return (optional, e.g. fits_filename,chi_squared)
+        limit: Number of models to return (optional, all models by default)
+        offset: Number of models to skip (optional, follow the Link header for the next page)
+        spectra: true to include the wavelength and flux data of each model's spectrum (optional)
+
+    With Accept: application/x-ndjson the models are streamed, one per line (see models_response).
 
     Returns:
         Example:
@@ -647,20 +945,16 @@ def get_models_by_weighted_fuv():
     subtype = request.args.get('subtype')
     fuv = request.args.get('fuv')
     nuv = request.args.get('nuv')
+    try:
+        fields, offset, limit = get_page_args()
+    except ValueError as e:
+        return json.dumps(str(e)), 400
     try:
         if subtype is not None:
             grid = f'{subtype.lower()}_grid'
             if fuv is not None and nuv is not None:
-                models_weighted = get_models_with_weighted_fuv(float(nuv), float(fuv), grid)
-                return_data = {}
-                count = 0
-                for i in models_weighted:
-                    del i['_id']
-                    del i['chi_squared_fuv']
-                    del i['chi_squared_nuv']
-                    return_data[f'model_{count}'] = i
-                    count += 1
-                return json.dumps(return_data)
+                return models_response(get_models_with_weighted_fuv, (float(nuv), float(fuv), grid),
+                                       fields, ('_id', 'chi_squared_fuv', 'chi_squared_nuv'), offset, limit)
             else:
                 return json.dumps('Values are needed for fuv, and nuv, please include these arguments and try again.')
         else:
@@ -670,6 +964,7 @@ def get_models_by_weighted_fuv():
 
 
 @api.route('/get_models_by_flux_ratio')
+@http_cache('grid', version=get_grid_version)
 def get_models_by_flux_ratio():
     """Returns PHOENIX models in the given subtype grid sorted from lowest to highest chi squared value of flux ratios.
 
@@ -679,6 +974,12 @@ def get_models_by_flux_ratio():
         subtype: The name of the PHOENIX subtype grid to search on (example 'M2')
         fuv: GALEX FUV flux density converted, scaled, and photosphere subtracted from previous flux processing steps
         nuv: GALEX NUV flux density converted, scaled, and photosphere subtracted from previous flux processing steps
+        fields: Comma separated model fields to return (optional, e.g. fits_filename,chi_squared)
+        limit: Number of models to return (optional, all models by default)
+        offset: Number of models to skip (optional, follow the Link header for the next page)
+        spectra: true to include the wavelength and flux data of each model's spectrum (optional)
+
+    With Accept: application/x-ndjson the models are streamed, one per line (see models_response).
 
     Returns:
         Example:
@@ -714,20 +1015,16 @@ def get_models_by_flux_ratio():
     subtype = request.args.get('subtype')
     fuv = request.args.get('fuv')
     nuv = request.args.get('nuv')
+    try:
+        fields, offset, limit = get_page_args()
+    except ValueError as e:
+        return json.dumps(str(e)), 400
     try:
         if subtype is not None:
             grid = f'{subtype.lower()}_grid'
             if fuv is not None and nuv is not None:
-                models_ratios = get_flux_ratios(float(nuv), float(fuv), grid)
-                return_data = {}
-                count = 0
-                for i in models_ratios:
-                    del i['_id']
-                    del i['galex_flux_ratio']
-                    del i['model_flux_ratio']
-                    return_data[f'model_{count}'] = i
-                    count += 1
-                return json.dumps(return_data)
+                return models_response(get_flux_ratios, (float(nuv), float(fuv), grid),
+                                       fields, ('_id', 'galex_flux_ratio', 'model_flux_ratio'), offset, limit)
             else:
                 return json.dumps('Values are needed for fuv, and nuv, please include these arguments and try again.')
         else:
@@ -736,7 +1033,86 @@ def get_models_by_flux_ratio():
         return json.dumps('Value of fuv, fuv_err, nuv, or nuv_err is non-numerical. Please check your arguments and try again.')
 
 
+@api.route('/match', methods=['GET', 'POST'])
+@http_cache('grid', version=get_grid_version)
+def match():
+    """Runs the model search of the results page for raw stellar parameters and GALEX fluxes in one call.
+
+    Replaces chaining convert_scale_photosphere_subtract_galex_fluxes, get_matching_subtype,
+    get_models_in_limits or get_models_by_chi_squared, and get_model_data. The fluxes are
+    processed, predicted, and searched with the same decision logic as the results page
+    (including the saturated, upper limit, and detection only searches, and growing the error
+    bars to 3 and 5 σ), and the subtype and photosphere model are looked up once.
+
+    Example HTML path: /api/match?teff=4014.0&logg=4.68&mass=0.64&dist=6.33256&rad=0.58&fuv=55.76&fuv_err=8.7&nuv=1002.16&nuv_err=14.88
+
+    The arguments can also be POSTed as a JSON object.
+
+    Args:
+        teff: Effective temperature of the target star in Kelvin
+        logg: Surface gravity of the target star in centimeters per second squared (cm/s^2)
+        mass: Mass of the target star in solar masses
+        dist: Distance of the target star in parsecs
+        rad: Stellar radius in solar radii
+        fuv: GALEX FUV in microjanskies
+        nuv: GALEX NUV in microjanskies
+        fuv_err: GALEX FUV error in microjanskies (optional, without it the FUV is a detection only)
+        nuv_err: GALEX NUV error in microjanskies (optional, without it the NUV is a detection only)
+        fuv_flag: normal (default), null (predicted from the NUV), saturated, or upper_limit
+        nuv_flag: normal (default), null (predicted from the FUV), saturated, or upper_limit
+        spectra: true to include the wavelength and flux data of each model's spectrum
+        star_name: The name of the target (optional, only returned)
+
+    With Accept: application/x-ndjson the results are streamed: the first line holds everything
+    but the models, then each model follows on its own line (with its spectrum, read as it is
+    sent).
+
+    Returns:
+        JSON string with the matched subtype and photosphere model, the processed fluxes, the
+        searches run and the tier that found their models, the ranked models, and the messages
+        of the results page.
+        Example:
+            {
+                "subtype": {"model": "M0", "teff": 3850, "logg": 4.78, "mass": 0.53},
+                "searches": [{"fuv": {"value": 167.6, "error": 26.2, "flag": "normal"}, "nuv": {...}, "tier": "within_limits", "model_count": 1}],
+                "models": [
+                    {
+                        "rank": 1,
+                        "search_tier": "within_limits",
+                        "fits_filename": "PEGASUS.M0.Teff=3850.logg=4.78.TRgrad=9.cmtop=5.5.cmin=3.fits",
+                        "euv": 3330.45216695799,
+                        "fuv": 177.670504667116,
+                        "nuv": 1236.00277651224,
+                        "chi_squared": 0.71
+                    }
+                ],
+                ...
+            }
+    """
+    params = request.get_json(silent=True) if request.method == 'POST' else None
+    if not isinstance(params, dict):
+        params = request.values
+    try:
+        stellar_object = stellar_object_from_params(params)
+    except ValueError as e:
+        return json.dumps(str(e)), 400
+    include_spectra = str(params.get('spectra', 'false')).lower() == 'true'
+    stream = wants_ndjson()
+    result = match_for_api(stellar_object, include_spectra, stream=stream)
+    if 'error' in result:
+        return json.dumps(result['error']), 404
+    if stream:
+        models = result.pop('models')
+
+        def generate():
+            yield result
+            yield from models
+        return ndjson_response(generate())
+    return json.dumps(result)
+
+
 @api.route('/get_model_data')
+@http_cache('spectra')
 def get_model_data():
     """Returns the wavelength and flux data columns from a PHEONIX model FITS file.
 
@@ -753,19 +1129,12 @@ def get_model_data():
     fits_filename = request.args.get('fits_filename')
     try:
         if fits_filename is not None:
-            filepath = None
-            return_data = {}
-            for root, subfolders, filenames in os.walk(os.path.join(current_app.root_path, current_app.config['FITS_FOLDER'])):
-                for filename in filenames:
-                    if filename == fits_filename:
-                        filepath = root + '/' + filename
-            if filepath is not None:    
-                hst = fits.open(filepath)
-                data = hst[1].data
-                return_data['wavelength_data'] = data['WAVELENGTH'][0].tolist()
-                return_data['flux_data'] = data['FLUX'][0].tolist()
-                return json.dumps(return_data)
+            # found through the FITS manifest, decoded and compressed once per worker
+            payload = spectra.get_payload(fits_filename)
+            if payload is not None:
+                return precompressed_response(payload, 'application/json')
             else:
-                return json.dumps('Data not yet available for that file.')
+                # not cached, the file can be added later
+                return json.dumps('Data not yet available for that file.'), 200, {'Cache-Control': 'no-cache'}
     except ValueError:
         return json.dumps('The value of fits_filename threw an error. Please check your value and try again.')
\ No newline at end of file
@@ -1,5 +1,6 @@
 # configuring environment variables
 import os
+import tempfile
 from dotenv import load_dotenv
 load_dotenv()
 
@@ -7,9 +8,9 @@ load_dotenv()
 class Config(object):
     SECRET_KEY = os.getenv("SECRET_KEY")
 
-    # for flask sessions
+    # for flask sessions (stored in the sessions collection, see helpers_session_store)
     SESSION_PERMANENT = False
-    SESSION_TYPE = "filesystem"
+    PERMANENT_SESSION_LIFETIME = int(os.getenv("PERMANENT_SESSION_LIFETIME", 3600))
 
     # for flask mail
     MAIL_SERVER = os.getenv("MAIL_SERVER")
@@ -23,9 +24,159 @@ class Config(object):
     # for downloads
     FITS_FOLDER = os.getenv("FITS_FOLDER_PATH")
 
-    # for cache
-    CACHE_TYPE = 'simple'
-    CACHE_DEFAULT_TIMEOUT = 1800
+    # for cache (memoized grid queries). A file system cache is shared by all workers of a host,
+    # and evicts entries once it holds more than CACHE_THRESHOLD.
+    CACHE_TYPE = 'FileSystemCache'
+    CACHE_DIR = os.getenv("CACHE_DIR", os.path.join(tempfile.gettempdir(), "euv_spectra_cache"))
+    CACHE_THRESHOLD = int(os.getenv("CACHE_THRESHOLD", 20000))
+    CACHE_DEFAULT_TIMEOUT = int(os.getenv("CACHE_DEFAULT_TIMEOUT", 24 * 3600))
+
+    # for remote catalog circuit breakers (SIMBAD, NEA, MAST)
+    CIRCUIT_BREAKER_FAILURE_THRESHOLD = int(os.getenv("CIRCUIT_BREAKER_FAILURE_THRESHOLD", 3))
+    CIRCUIT_BREAKER_COOLDOWN = int(os.getenv("CIRCUIT_BREAKER_COOLDOWN", 120))
+    CIRCUIT_BREAKER_STATE_CACHE_SECONDS = 5
+    # maximum concurrent calls per worker to each remote catalog
+    CATALOG_MAX_CONCURRENCY = {
+        'simbad': int(os.getenv("SIMBAD_MAX_CONCURRENCY", 4)),
+        'nasa_exoplanet_archive': int(os.getenv("NEA_MAX_CONCURRENCY", 4)),
+        'mast': int(os.getenv("MAST_MAX_CONCURRENCY", 4)),
+    }
+
+    # for remote catalog calls: timeouts (seconds), retries with jittered exponential backoff, hedging, and the
+    # most attempts per worker that can be running at once (including hedged and abandoned ones)
+    REMOTE_CALL_POLICY = {
+        'simbad': {'connect_timeout': float(os.getenv("SIMBAD_CONNECT_TIMEOUT", 5)),
+                   'read_timeout': float(os.getenv("SIMBAD_READ_TIMEOUT", 20)),
+                   'retries': int(os.getenv("SIMBAD_RETRIES", 2)),
+                   'backoff_base': 0.5, 'backoff_max': 8,
+                   'hedge': os.getenv("SIMBAD_HEDGE", "true").lower() == "true",
+                   'max_in_flight': int(os.getenv("SIMBAD_MAX_IN_FLIGHT", 12))},
+        'nasa_exoplanet_archive': {'connect_timeout': float(os.getenv("NEA_CONNECT_TIMEOUT", 5)),
+                                   'read_timeout': float(os.getenv("NEA_READ_TIMEOUT", 60)),
+                                   'retries': int(os.getenv("NEA_RETRIES", 2)),
+                                   'backoff_base': 1, 'backoff_max': 15,
+                                   'hedge': os.getenv("NEA_HEDGE", "false").lower() == "true",
+                                   'max_in_flight': int(os.getenv("NEA_MAX_IN_FLIGHT", 12))},
+        'mast': {'connect_timeout': float(os.getenv("MAST_CONNECT_TIMEOUT", 5)),
+                 'read_timeout': float(os.getenv("MAST_READ_TIMEOUT", 30)),
+                 'retries': int(os.getenv("MAST_RETRIES", 2)),
+                 'backoff_base': 1, 'backoff_max': 15,
+                 'hedge': os.getenv("MAST_HEDGE", "true").lower() == "true",
+                 'max_in_flight': int(os.getenv("MAST_MAX_IN_FLIGHT", 12))},
+    }
+    # until there are this many timed attempts, hedged attempts start after the default delay
+    REMOTE_CALL_HEDGE_MIN_SAMPLES = 20
+    REMOTE_CALL_HEDGE_DEFAULT_DELAY = float(os.getenv("REMOTE_CALL_HEDGE_DEFAULT_DELAY", 10))
+    REMOTE_CALL_TIMINGS_TTL = int(os.getenv("REMOTE_CALL_TIMINGS_TTL", 30 * 24 * 3600))
+
+    # for the async serving mode (asgi.py): catalog searches are awaited on one event loop per process
+    ASYNC_HTTP_MAX_CONNECTIONS = int(os.getenv("ASYNC_HTTP_MAX_CONNECTIONS", 200))
+    # maximum concurrent calls per process to each remote catalog (CATALOG_MAX_CONCURRENCY of the sync mode)
+    ASYNC_CATALOG_MAX_CONCURRENCY = int(os.getenv("ASYNC_CATALOG_MAX_CONCURRENCY", 32))
+    # threads per process answering the Flask routes of the async mode (every route but the async ones)
+    ASGI_WSGI_WORKERS = int(os.getenv("ASGI_WSGI_WORKERS", 16))
+    SIMBAD_SESAME_URL = os.getenv("SIMBAD_SESAME_URL", "https://cds.unistra.fr/cgi-bin/nph-sesame/-oxp/S")
+    NEA_TAP_URL = os.getenv("NEA_TAP_URL", "https://exoplanetarchive.ipac.caltech.edu/TAP/sync")
+    MAST_API_URL = os.getenv("MAST_API_URL", "https://mast.stsci.edu/api/v0/invoke")
+
+    # for the shared catalog response cache (seconds)
+    CATALOG_CACHE_TTL = {
+        'simbad': int(os.getenv("SIMBAD_CACHE_TTL", 30 * 24 * 3600)),
+        'nasa_exoplanet_archive': int(os.getenv("NEA_CACHE_TTL", 24 * 3600)),
+    }
+    CATALOG_CACHE_NEGATIVE_TTL = int(os.getenv("CATALOG_CACHE_NEGATIVE_TTL", 3600))
+    CATALOG_CACHE_STALE_TTL = int(os.getenv("CATALOG_CACHE_STALE_TTL", 90 * 24 * 3600))
+    CATALOG_CACHE_COORD_DECIMALS = 4
+
+    # for the local GALEX source store
+    GALEX_STORE_QUERY_RADIUS = float(os.getenv("GALEX_STORE_QUERY_RADIUS", 0.2))  # degrees, the MAST default cone
+    GALEX_STORE_INDEX_CHECK_SECONDS = 30  # how often the background thread of each worker loads new rows into the index
+
+    # for the in-memory GALEX epoch table
+    GALEX_EPOCHS_CHECK_SECONDS = int(os.getenv("GALEX_EPOCHS_CHECK_SECONDS", 60))
+
+    # for background jobs (batch target resolution)
+    JOB_WORKERS = int(os.getenv("JOB_WORKERS", 8))
+    # search form jobs run on their own pool, not behind batch targets
+    SEARCH_JOB_WORKERS = int(os.getenv("SEARCH_JOB_WORKERS", 4))
+    BATCH_RESOLVE_MAX_TARGETS = int(os.getenv("BATCH_RESOLVE_MAX_TARGETS", 5000))
+    JOB_RESULT_TTL = int(os.getenv("JOB_RESULT_TTL", 7 * 24 * 3600))
+    # a job whose worker stopped renewing its lease this long (seconds) is marked as failed
+    JOB_LEASE_SECONDS = int(os.getenv("JOB_LEASE_SECONDS", 60))
+    # how often a streamed job (NDJSON) checks for new results (seconds)
+    JOB_FOLLOW_INTERVAL = float(os.getenv("JOB_FOLLOW_INTERVAL", 1))
+    # how long identical searches wait on one running search (seconds)
+    SINGLE_FLIGHT_LEASE = int(os.getenv("SINGLE_FLIGHT_LEASE", 300))
+    # how long a worker waits on an identical search running on another worker before running it
+    # itself (seconds), the longest remote call deadline by default
+    SINGLE_FLIGHT_MAX_WAIT = float(os.getenv("SINGLE_FLIGHT_MAX_WAIT", max(
+        policy['connect_timeout'] + policy['read_timeout'] for policy in REMOTE_CALL_POLICY.values())))
+
+    # for app startup
+    MONITORING_DASHBOARD_ENABLED = os.getenv("MONITORING_DASHBOARD_ENABLED", "true").lower() == "true"
+    STARTUP_REPORT = os.getenv("STARTUP_REPORT", "false").lower() == "true"
+
+    # for the grid model routes, the most models one page can hold
+    GRID_PAGE_MAX_LIMIT = int(os.getenv("GRID_PAGE_MAX_LIMIT", 1000))
+
+    # for the array mode of the flux conversion routes (rows per request)
+    ARRAY_MAX_ROWS = int(os.getenv("ARRAY_MAX_ROWS", 100000))
+    # the largest body (bytes) read, checked before it is parsed (enough for ARRAY_MAX_ROWS rows of a few columns)
+    ARRAY_MAX_BODY_BYTES = int(os.getenv("ARRAY_MAX_BODY_BYTES", 20 * 1024 * 1024))
+
+    # for the worker warm-up and the /healthz/ready check
+    WARMUP_ENABLED = os.getenv("WARMUP_ENABLED", "true").lower() == "true"
+    # how many of the spectra matched by the most recently viewed results are decoded at warm-up
+    WARMUP_SPECTRA_COUNT = int(os.getenv("WARMUP_SPECTRA_COUNT", 20))
+    WARMUP_RECENT_RESULTS = int(os.getenv("WARMUP_RECENT_RESULTS", 500))
+    HEALTH_CHECK_TIMEOUT = float(os.getenv("HEALTH_CHECK_TIMEOUT", 2))
+
+    # for the FITS manifest and the decoded spectra kept per worker
+    SPECTRA_MANIFEST_CHECK_SECONDS = int(os.getenv("SPECTRA_MANIFEST_CHECK_SECONDS", 300))
+    SPECTRA_CACHE_SIZE = int(os.getenv("SPECTRA_CACHE_SIZE", 64))
+
+    # for the PEGASUS grid version (checked for grid changes at most this often, seconds)
+    GRID_VERSION_CHECK_SECONDS = int(os.getenv("GRID_VERSION_CHECK_SECONDS", 60))
+    # for cached results pages (seconds a result is kept after it was last viewed)
+    RESULT_CACHE_TTL = int(os.getenv("RESULT_CACHE_TTL", 90 * 24 * 3600))
+
+    # for HTTP caching, the Cache-Control of each class of route
+    HTTP_CACHE_CONTROL = {
+        # answers from the PEGASUS grid, revalidated with an ETag that includes the grid version
+        'grid': f'public, max-age={int(os.getenv("HTTP_CACHE_GRID_MAX_AGE", 3600))}',
+        # pure calculations on the request parameters
+        'calculation': 'public, max-age=86400',
+        # model spectra never change for a filename
+        'spectra': 'public, max-age=31536000, immutable',
+        # results figures, the results hash covers the inputs and the grid version
+        'result': 'public, max-age=31536000, immutable',
+        # answers derived from remote catalogs, which can change upstream
+        'catalog': f'public, max-age={int(os.getenv("HTTP_CACHE_CATALOG_MAX_AGE", 300))}',
+        # spectra looked up through the session (no subtype in the URL)
+        'private': 'private, max-age=3600',
+        # error messages (most routes answer them with a 200) and catalog answers with search errors
+        'error': 'no-store',
+    }
+
+    # for HTTP response compression (brotli and zstd are offered if the brotli/zstandard packages are installed)
+    COMPRESSION_ENABLED = os.getenv("COMPRESSION_ENABLED", "true").lower() == "true"
+    COMPRESSION_MIN_SIZE = int(os.getenv("COMPRESSION_MIN_SIZE", 1024))  # bytes, smaller responses are sent as is
+    COMPRESSION_MIMETYPES = ('text/html', 'application/json', 'text/csv', 'text/plain', 'text/css', 'text/javascript', 'application/javascript')
+    # levels of the responses compressed on every request, so on the fast side
+    COMPRESSION_LEVELS = {
+        'text/html': {'gzip': 6, 'br': 5, 'zstd': 3},
+        'application/json': {'gzip': int(os.getenv("COMPRESSION_JSON_GZIP_LEVEL", 6)),
+                             'br': int(os.getenv("COMPRESSION_JSON_BR_LEVEL", 5)),
+                             'zstd': int(os.getenv("COMPRESSION_JSON_ZSTD_LEVEL", 3))},
+        'default': {'gzip': 6, 'br': 4, 'zstd': 3},
+    }
+    # levels of the static payloads (spectra, results figures), compressed once when they are cached
+    PRECOMPRESSION_LEVELS = {'gzip': 9, 'br': 9, 'zstd': 12}
+
+    # for scheduled jobs (NEA mirror refresh)
+    SCHEDULER_ENABLED = os.getenv("SCHEDULER_ENABLED", "true").lower() == "true"
+    NEA_MIRROR_REFRESH_HOURS = int(os.getenv("NEA_MIRROR_REFRESH_HOURS", 24))
+    NEA_MIRROR_FULL_REFRESH_DAYS = int(os.getenv("NEA_MIRROR_FULL_REFRESH_DAYS", 7))
 
     # for captcha
     RECAPTCHA_PUBLIC_KEY = os.getenv("RECAPTCHA_PUBLIC_KEY")
@@ -4,21 +4,16 @@ from flask_caching import Cache
 from pymongo import MongoClient
 from os import environ
 from euv_spectra_app.config import Config
-import flask_monitoringdashboard as dashboard
-
-cache = Cache()
 
 app = Flask(__name__)
 app.config.from_object(Config)
 app.secret_key = environ.get('SECRET_KEY')
 
-cache.init_app(app)
+# the app is passed in so the cache can also be used outside of requests (e.g. in background jobs)
+cache = Cache(app)
 mail = Mail(app)
 app.jinja_env.filters['zip'] = zip
 
-dashboard.config.init_from(file='/config.py')
-dashboard.bind(app)
-
 # hello!
 
 
@@ -26,7 +21,9 @@ dashboard.bind(app)
 
 # ======= DB Setup ==========
 uri = environ.get('MONGODB_URI')
-client = MongoClient(uri)
+# connect=False: the client connects on first use, so importing the app does not wait on Mongo
+# and a gunicorn master that preloads the app never opens connections its workers would inherit
+client = MongoClient(uri, connect=False)
 my_db = environ.get('MONGODB_DATABASE')
 db = client.get_database(my_db)
 
@@ -34,6 +31,18 @@ db = client.get_database(my_db)
 model_parameter_grid = db.model_parameter_grid
 photosphere_models = db.photosphere_models
 mast_galex_times = db.mast_galex_times
+service_health = db.service_health
+remote_call_timings = db.remote_call_timings
+catalog_cache = db.catalog_cache
+nea_pscomppars = db.nea_pscomppars
+mirror_state = db.mirror_state
+locks = db.locks
+sessions = db.sessions
+galex_sources = db.galex_sources
+galex_coverage = db.galex_coverage
+jobs = db.jobs
+job_results = db.job_results
+result_cache = db.result_cache
 m0_grid = db.m0_grid
 m1_grid = db.m1_grid
 m2_grid = db.m2_grid
@@ -0,0 +1,27 @@
+from flask import Blueprint, jsonify
+from euv_spectra_app.helpers_warmup import get_readiness
+
+health = Blueprint("health", __name__, url_prefix="/healthz")
+
+
+@health.route('/live')
+def live():
+    """Liveness check: the worker is up and answering requests (it may still be warming up)."""
+    response = jsonify({'alive': True})
+    response.headers['Cache-Control'] = 'no-store'
+    return response
+
+
+@health.route('/ready')
+def ready():
+    """Readiness check for the load balancer.
+
+    Returns 200 once this worker's warm-up finished and its dependencies (Mongo and the cache
+    backend) answer, else 503, so traffic is only routed to warm workers. The body reports the
+    warm-up status and step times and each dependency's latency.
+    """
+    readiness = get_readiness()
+    response = jsonify(readiness)
+    response.status_code = 200 if readiness['ready'] else 503
+    response.headers['Cache-Control'] = 'no-store'
+    return response
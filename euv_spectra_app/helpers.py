@@ -1,8 +1,9 @@
 import json
-from astropy.io import fits
-import plotly.graph_objects as go
-from euv_spectra_app.extensions import *
 from euv_spectra_app.models import StellarObject, ProperMotionData, GalexFluxes
+from euv_spectra_app.helpers_spectra import spectra
+from euv_spectra_app.startup import lazy_import
+
+go = lazy_import('plotly.graph_objects')
 
 
 def remove_objs_from_obj_dict(obj_dict):
@@ -12,7 +13,7 @@ def remove_objs_from_obj_dict(obj_dict):
 
 
 def insert_data_into_form(obj, form):
-    attrs = vars(obj)
+    attrs = obj.to_dict()
     for attr_name, attr_value in attrs.items():
         if attr_name == 'fluxes':
             # is an object, go again
@@ -39,6 +40,11 @@ def to_json(obj):
         # Recursively call to_json on each element in the list or tuple
         return [to_json(element) for element in obj]
 
+    # If the object has a to_dict method, it's one of the slotted model objects
+    if hasattr(obj, 'to_dict'):
+        # Recursively call to_json on each attribute of the object
+        return to_json(obj.to_dict())
+
     # If the object has a __dict__ attribute, it's probably a custom object
     if hasattr(obj, '__dict__'):
         # Recursively call to_json on each attribute of the object
@@ -60,12 +66,15 @@ def from_json(json_str):
             if key == 'pm_data' and value is not None:
                 proper_motion_dict = value
                 for pm_key, pm_value in proper_motion_dict.items():
-                    setattr(proper_motion_obj, pm_key, pm_value)
+                    if pm_key in ProperMotionData.__slots__:
+                        setattr(proper_motion_obj, pm_key, pm_value)
             elif key == 'fluxes' and value is not None:
                 galex_fluxes_dict = value
                 for flux_key, flux_value in galex_fluxes_dict.items():
-                    setattr(galex_fluxes_obj, flux_key, flux_value)
-            setattr(stellar_target_obj, key, value)
+                    if flux_key in GalexFluxes.__slots__:
+                        setattr(galex_fluxes_obj, flux_key, flux_value)
+            elif key in StellarObject.__slots__:
+                setattr(stellar_target_obj, key, value)
         stellar_target_obj.pm_data = proper_motion_obj
         stellar_target_obj.fluxes = galex_fluxes_obj
         return stellar_target_obj
@@ -94,10 +103,7 @@ def create_plotly_graph(files):
     for key, value in files.items():
         if 'model' in key:
             # get model data from fits file
-            hst = fits.open(value['filepath'])
-            data = hst[1].data
-            w_obs = data['WAVELENGTH'][0]
-            f_obs = data['FLUX'][0]
+            w_obs, f_obs = spectra.get_spectrum(value['filepath'])
             # get final model name by checking for flags or index #
             model_name = f"<b>Model {value['index'] + 1} Spectrum</b>"
             if value['index'] == 0:
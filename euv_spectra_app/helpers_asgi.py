@@ -0,0 +1,130 @@
+# ASGI SERVING (ROUTING, REQUESTS AND RESPONSES OF THE ASYNC ROUTES)
+import json
+from urllib.parse import parse_qsl
+from werkzeug.datastructures import Headers, MultiDict
+from werkzeug.http import parse_accept_header, parse_etags
+from euv_spectra_app.config import Config
+from euv_spectra_app.helpers_http_cache import make_etag
+from euv_spectra_app.helpers_compression import COMPRESSORS, ENCODINGS, get_level
+
+
+class AsyncRequest():
+    """The parts of an HTTP request the async routes use (the query arguments and headers)."""
+    def __init__(self, scope):
+        self.method = scope['method']
+        self.path = scope['path']
+        self.args = MultiDict(parse_qsl(scope.get('query_string', b'').decode('latin-1'), keep_blank_values=True))
+        self.headers = Headers([(name.decode('latin-1'), value.decode('latin-1')) for name, value in scope['headers']])
+
+
+class AsyncRoutes():
+    """A group of async route handlers under a URL prefix, registered like a blueprint's routes.
+
+    A handler takes an AsyncRequest and returns a response from json_response.
+    """
+    def __init__(self, url_prefix=''):
+        self.url_prefix = url_prefix
+        # path -> (handler, methods)
+        self.handlers = {}
+
+    def route(self, rule, methods=('GET',)):
+        def decorator(handler):
+            self.handlers[self.url_prefix + rule] = (handler, (set(methods) | {'HEAD'}) if 'GET' in methods else set(methods))
+            return handler
+        return decorator
+
+    def match(self, scope):
+        """Returns the handler of an HTTP request, or None if it is not one of these routes."""
+        handler, methods = self.handlers.get(scope['path'], (None, ()))
+        return handler if scope['method'] in methods else None
+
+
+def json_response(request, data, status=200, policy=None):
+    """Encodes an answer as a JSON response, with the HTTP caching and compression of the sync routes.
+
+    Successful answers get the Cache-Control of the policy and an ETag of the body, and a
+    matching If-None-Match is answered with a 304 (see helpers_http_cache). Error messages and
+    answers with the 'error' policy are marked no-store instead. Bodies of at
+    least COMPRESSION_MIN_SIZE are compressed like helpers_compression.compress_response does.
+
+    Returns:
+        The status code, the headers, and the body.
+    """
+    body = json.dumps(data).encode()
+    headers = Headers({'Content-Type': 'application/json'})
+    encoding = None
+    if status == 200 and Config.COMPRESSION_ENABLED and len(body) >= Config.COMPRESSION_MIN_SIZE:
+        headers['Vary'] = 'Accept-Encoding'
+        encoding = parse_accept_header(request.headers.get('Accept-Encoding')).best_match(ENCODINGS)
+    if status == 200 and policy is not None and isinstance(data, str):
+        # an error message, never cached (see helpers_http_cache.is_error_body)
+        policy = 'error'
+    if status == 200 and policy == 'error':
+        headers['Cache-Control'] = Config.HTTP_CACHE_CONTROL['error']
+    elif status == 200 and policy is not None:
+        etag = make_etag(body)
+        headers['Cache-Control'] = Config.HTTP_CACHE_CONTROL[policy]
+        # weak if compressed, like the ETags of the compressed sync responses
+        headers['ETag'] = f'W/"{etag}"' if encoding is not None else f'"{etag}"'
+        if parse_etags(request.headers.get('If-None-Match')).contains_weak(etag):
+            del headers['Content-Type']
+            return 304, headers, b''
+    if encoding is not None:
+        body = COMPRESSORS[encoding](body, get_level('application/json', encoding))
+        headers['Content-Encoding'] = encoding
+    return status, headers, body
+
+
+async def send_response(send, status, headers, body, head=False):
+    """Sends a response from json_response (without the body for HEAD requests)."""
+    if status != 304:
+        headers['Content-Length'] = str(len(body))
+    await send({'type': 'http.response.start', 'status': status,
+                'headers': [(name.lower().encode('latin-1'), value.encode('latin-1')) for name, value in headers.items()]})
+    await send({'type': 'http.response.body', 'body': b'' if head else body})
+
+
+class AsgiRouter():
+    """The ASGI app: the async routes are answered on the event loop, every other request by the wrapped Flask app.
+
+    Args:
+        routes: The AsyncRoutes groups.
+        fallback: The ASGI app every other request goes to (the Flask app in a thread pool WSGI adapter).
+        on_startup: Coroutine functions awaited at lifespan startup.
+        on_shutdown: Coroutine functions awaited at lifespan shutdown.
+    """
+    def __init__(self, routes, fallback, on_startup=(), on_shutdown=()):
+        self.routes = routes
+        self.fallback = fallback
+        self.on_startup = on_startup
+        self.on_shutdown = on_shutdown
+
+    async def lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                try:
+                    for startup in self.on_startup:
+                        await startup()
+                except Exception as e:
+                    await send({'type': 'lifespan.startup.failed', 'message': str(e)})
+                    return
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                for shutdown in self.on_shutdown:
+                    await shutdown()
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan':
+            await self.lifespan(receive, send)
+            return
+        if scope['type'] == 'http':
+            for routes in self.routes:
+                handler = routes.match(scope)
+                if handler is not None:
+                    request = AsyncRequest(scope)
+                    await send_response(send, *await handler(request), head=request.method == 'HEAD')
+                    return
+        await self.fallback(scope, receive, send)
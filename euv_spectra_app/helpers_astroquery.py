@@ -1,17 +1,13 @@
 # FOR ASTROQUERY/GALEX DATA
-from euv_spectra_app.extensions import db
+from euv_spectra_app.helpers_galex_epochs import galex_epochs
+from euv_spectra_app.helpers_catalogs import get_custom_simbad, get_nea_client, get_mast_catalogs
+from euv_spectra_app.helpers_remote import remote_call
+from euv_spectra_app.startup import lazy_import
 import numpy.ma as ma
-from astropy.time import Time
-import astropy.units as u
-from astropy.coordinates import SkyCoord, Distance
-from astroquery.mast import Catalogs
-from astroquery.ipac.nexsci.nasa_exoplanet_archive import NasaExoplanetArchive
-from astroquery.simbad import Simbad
 
-customSimbad = Simbad()
-customSimbad.remove_votable_fields('coordinates')
-customSimbad.add_votable_fields(
-    'ra', 'dec', 'pmra', 'pmdec', 'plx', 'rv_value', 'typed_id')
+u = lazy_import('astropy.units')
+astropy_time = lazy_import('astropy.time')
+astropy_coordinates = lazy_import('astropy.coordinates')
 
 
 class StellarTarget():
@@ -70,8 +66,8 @@ class StellarTarget():
                 return
         elif self.star_name:
             # STEP N1: Check if name is in the mast target database (meant to check for case & spacing errors)
-            data = NasaExoplanetArchive.query_criteria(
-                table="pscomppars", select="DISTINCT hostname")
+            data = remote_call('nasa_exoplanet_archive', get_nea_client().query_criteria,
+                               table="pscomppars", select="DISTINCT hostname")
             host_stars = data['hostname']
             for name in host_stars:
                 if self.star_name.upper().replace(' ', '') == name.upper().replace(' ', ''):
@@ -119,7 +115,7 @@ class StellarTarget():
         """
         try:
             # create a skycoord object
-            c = SkyCoord(self.position, unit=(u.hourangle, u.deg))
+            c = astropy_coordinates.SkyCoord(self.position, unit=(u.hourangle, u.deg))
             # get ra and dec from skycoord object
             self.coordinates = (c.ra.degree, c.dec.degree)
             return
@@ -139,7 +135,7 @@ class StellarTarget():
         Raises:
             A string detailing that SIMBAD coulld not find any object under the inputted name.
         """
-        result_table = customSimbad.query_object(self.star_name)
+        result_table = remote_call('simbad', get_custom_simbad().query_object, self.star_name)
         if result_table and len(result_table) > 0:
             data = result_table[0]
             self.coordinates = (data['RA'], data['DEC'])
@@ -171,10 +167,10 @@ class StellarTarget():
             are found or if the target is not a M or K type star.
         """
         if self.star_name:
-            nea_data = NasaExoplanetArchive.query_criteria(
+            nea_data = remote_call('nasa_exoplanet_archive', get_nea_client().query_criteria,
                 table="pscomppars", select="top 5 disc_refname, st_spectype, st_teff, st_logg, st_mass, st_rad, sy_dist, sy_jmag", where=f"hostname like '%{self.star_name}%'", order="hostname")
         elif self.position:
-            nea_data = NasaExoplanetArchive.query_region(table="pscomppars", coordinates=SkyCoord(
+            nea_data = remote_call('nasa_exoplanet_archive', get_nea_client().query_region, table="pscomppars", coordinates=astropy_coordinates.SkyCoord(
                 ra=self.coordinates[0] * u.deg, dec=self.coordinates[1] * u.deg), radius=1.0 * u.deg)
         if len(nea_data) > 0:
             data = nea_data[0]
@@ -220,7 +216,7 @@ class StellarTarget():
         """
         # STEP 1: Query the MAST catalogs object by GALEX catalog & given ra and dec
         try:
-            galex_data = Catalogs.query_object(
+            galex_data = remote_call('mast', get_mast_catalogs().query_object,
                 f'{self.coordinates[0]} {self.coordinates[1]}', catalog="GALEX")
             # STEP 2: If there are results returned and results within 0.167 arcmins, then start processing the data.
             if len(galex_data) > 0:
@@ -383,9 +379,10 @@ class ProperMotionDataOld():
             fails for any reason.
         """
         try:
-            # STEP 1: Find a GALEX observation time from custom compiled dataset
-            galex_time = db.mast_galex_times.find_one(
-                {'target': star_name})['t_min']
+            # STEP 1: Find a GALEX observation time from the in-memory GALEX epoch table
+            galex_time = galex_epochs.get_epoch(star_name)
+            if galex_time is None:
+                raise KeyError(star_name)
         except:
             return 'No GALEX observations found, unable to correct coordinates. \nLook under question 3 on the FAQ page for more information.'
         else:
@@ -394,16 +391,16 @@ class ProperMotionDataOld():
                 coords = coordinates[0] + ' ' + coordinates[1]
                 skycoord_obj = ''
                 # STEP 3: Calculate time difference between observation time and Jan 1st, 2000 (J2000)
-                t3 = Time(galex_time, format='mjd') - \
-                    Time(51544.0, format='mjd')
+                t3 = astropy_time.Time(galex_time, format='mjd') - \
+                    astropy_time.Time(51544.0, format='mjd')
                 # STEP 4: Convert time (which will return in seconds) into years
                 td_year = t3.sec / 60 / 60 / 24 / 365.25
                 # STEP 5: Check to see if radial velocity is given then create SkyCoord object with all data
                 if self.radial_velocity:
-                    skycoord_obj = SkyCoord(coords, unit=(u.hourangle, u.deg), distance=Distance(parallax=self.parallax*u.mas, allow_negative=True),
+                    skycoord_obj = astropy_coordinates.SkyCoord(coords, unit=(u.hourangle, u.deg), distance=astropy_coordinates.Distance(parallax=self.parallax*u.mas, allow_negative=True),
                                             pm_ra_cosdec=self.pmra*u.mas/u.yr, pm_dec=self.pmdec*u.mas/u.yr, radial_velocity=self.radial_velocity*u.km/u.s)
                 else:
-                    skycoord_obj = SkyCoord(coords, unit=(u.hourangle, u.deg), distance=Distance(
+                    skycoord_obj = astropy_coordinates.SkyCoord(coords, unit=(u.hourangle, u.deg), distance=astropy_coordinates.Distance(
                         parallax=self.parallax*u.mas, allow_negative=True), pm_ra_cosdec=self.pmra*u.mas/u.yr, pm_dec=self.pmdec*u.mas/u.yr)
                 # STEP 6: Use apply_space_motion function to calculate new coordinates
                 skycoord_obj = skycoord_obj.apply_space_motion(
@@ -0,0 +1,477 @@
+# ASYNC CATALOG SEARCH (FOR THE ASGI SERVING MODE, SEE asgi.py)
+import copy
+import json
+import time
+import asyncio
+import inspect
+import xml.etree.ElementTree as ElementTree
+from os import environ
+from urllib.parse import quote
+import httpx
+from motor import motor_asyncio
+from euv_spectra_app.config import Config
+from euv_spectra_app.models import StellarObject
+from euv_spectra_app.helpers_remote import remote_policies, RETRYABLE_FAILURES, ensure_remote_call_indexes
+from euv_spectra_app.helpers_circuit_breaker import CircuitOpenError, SERVICE_FAILURES, simbad_breaker, nea_breaker, mast_breaker
+from euv_spectra_app.helpers_catalog_cache import ensure_catalog_cache_indexes, read_through_steps, name_key, coords_key, is_not_found
+from euv_spectra_app.helpers_catalogs import nea_row_to_dict
+from euv_spectra_app.helpers_nea_mirror import NEA_MIRROR_STATE_ID, hostname_key, host_prefix_filter, cone_filter, closest_host, mirror_row_to_nea_dict
+from euv_spectra_app.helpers_galex_store import (GALEX_STORE_COLUMNS, GALEX_STORE_STATE_ID, galex_index, search_galex_store,
+                                                 ensure_galex_store_indexes, galex_source_operations, coverage_replacement,
+                                                 stored_sources, stored_coverage)
+from euv_spectra_app.helpers_single_flight import search_key
+
+# seconds between polls of a MAST request that is still executing
+MAST_POLL_SECONDS = 0.5
+NEA_COLUMNS = 'disc_refname, st_spectype, st_teff, st_logg, st_mass, st_rad, sy_dist, sy_jmag'
+
+
+class AsyncResources():
+    """The HTTP and Mongo clients of the async mode.
+
+    Both belong to the event loop, so they are opened when the ASGI app starts (lifespan
+    startup) and closed when it stops, instead of at import time like the sync clients.
+    """
+    def __init__(self):
+        self.http = None
+        self.client = None
+        self.db = None
+
+    async def start(self):
+        self.http = httpx.AsyncClient(limits=httpx.Limits(max_connections=Config.ASYNC_HTTP_MAX_CONNECTIONS))
+        self.client = motor_asyncio.AsyncIOMotorClient(environ.get('MONGODB_URI'))
+        self.db = self.client.get_database(environ.get('MONGODB_DATABASE'))
+        # created once, with the sync client, so the async writes can skip the check
+        await asyncio.to_thread(ensure_indexes)
+
+    async def close(self):
+        if self.http is not None:
+            await self.http.aclose()
+        if self.client is not None:
+            self.client.close()
+
+
+async_resources = AsyncResources()
+
+
+def ensure_indexes():
+    """Creates the indexes of the collections the async search writes to."""
+    ensure_remote_call_indexes()
+    ensure_catalog_cache_indexes()
+    ensure_galex_store_indexes()
+
+
+async def request_service(service, method, url, **kwargs):
+    """Sends an HTTP request to a remote catalog service with the timeouts of its remote call policy.
+
+    Transport errors and 5xx answers are raised as ConnectionError and TimeoutError, so they
+    count as service failures (RETRYABLE_FAILURES) like the errors of the sync clients.
+
+    Raises:
+        httpx.HTTPStatusError for 4xx answers, raised as RemoteQueryError by the remote call
+        policy (the query itself is wrong, not retried).
+    """
+    policy = Config.REMOTE_CALL_POLICY[service]
+    timeout = httpx.Timeout(policy['read_timeout'], connect=policy['connect_timeout'])
+    try:
+        response = await async_resources.http.request(method, url, timeout=timeout, **kwargs)
+    except httpx.TimeoutException as e:
+        raise TimeoutError(f'{service} timed out: {e}') from e
+    except httpx.TransportError as e:
+        raise ConnectionError(f'{service} could not be reached: {e}') from e
+    if response.status_code >= 500:
+        raise ConnectionError(f'{service} answered with status {response.status_code}')
+    response.raise_for_status()
+    return response
+
+
+"""——————————————————————————————SHARED STEPS——————————————————————————————"""
+
+async def run_steps_async(steps):
+    """Runs a generator of steps (see helpers_steps) with the async Mongo client and returns its return value.
+
+    The same steps run with the sync client in the sync mode, so the circuit breakers, retries
+    and catalog cache make the same state transitions in both modes.
+    """
+    value, error = None, None
+    while True:
+        try:
+            step = steps.throw(error) if error is not None else steps.send(value)
+        except StopIteration as stop:
+            return stop.value
+        value, error = None, None
+        try:
+            if step[0] == 'db':
+                _, collection, method, args, kwargs = step
+                value = await getattr(async_resources.db[collection], method)(*args, **kwargs)
+            elif step[0] == 'call':
+                value = step[1]()
+                if inspect.isawaitable(value):
+                    value = await value
+            else:
+                await asyncio.sleep(step[1])
+        except Exception as e:
+            error = e
+
+
+"""——————————————————————————————REMOTE CALL POLICY——————————————————————————————"""
+
+async def run_attempt(policy, attempt, func, args, kwargs):
+    """Runs one attempt with a hard deadline, hedged with a second attempt if it is slow (see RemoteCallPolicy.run_attempt).
+
+    Unlike the pool threads of the sync mode, attempts that lost the race or passed the
+    deadline are cancelled, so they are not bounded by the policy's max_in_flight.
+    """
+    # task -> if it is the hedged attempt, and when it started
+    attempts = {}
+
+    def timed_attempt(hedged):
+        task = asyncio.ensure_future(run_steps_async(policy.timed_steps(attempt, hedged, lambda: func(*args, **kwargs))))
+        attempts[task] = (hedged, time.time())
+        return task
+
+    started = time.time()
+    pending = {timed_attempt(False)}
+    try:
+        if policy.hedge:
+            done, _ = await asyncio.wait(pending, timeout=min(policy.hedge_delay(), policy.deadline))
+            if not done:
+                pending.add(timed_attempt(True))
+        error = None
+        while pending:
+            remaining = policy.deadline - (time.time() - started)
+            done, pending = await asyncio.wait(pending, timeout=max(remaining, 0), return_when=asyncio.FIRST_COMPLETED)
+            if not done:
+                break
+            for task in done:
+                if task.exception() is None:
+                    return task.result()
+                error = task.exception()
+                if not isinstance(error, RETRYABLE_FAILURES):
+                    raise error
+        if error is not None and not pending:
+            raise error
+        # the attempts still running are cancelled, so they never store their own timing
+        abandoned, pending = pending, set()
+        for task in abandoned:
+            task.cancel()
+        for task in abandoned:
+            hedged, started_at = attempts[task]
+            await run_steps_async(policy.record_attempt_steps(attempt, hedged, started_at, time.time() - started_at, 'timeout'))
+        raise TimeoutError(f'{policy.service} did not answer within {policy.deadline} seconds.')
+    finally:
+        for task in pending:
+            task.cancel()
+
+
+async def remote_call(service, func, *args, idempotent=True, **kwargs):
+    """Awaits a coroutine function that queries a remote catalog service under that service's policy.
+
+    Uses the same policy objects and retry steps as the sync remote_call, so both modes share
+    the timeouts, retries and the latencies the hedge delay is taken from.
+    """
+    policy = remote_policies[service]
+    return await run_steps_async(policy.call_steps(lambda attempt: run_attempt(policy, attempt, func, args, kwargs), idempotent))
+
+
+"""——————————————————————————————CIRCUIT BREAKERS——————————————————————————————"""
+
+class AsyncCircuitBreaker():
+    """The async side of a CircuitBreaker.
+
+    Runs the sync breaker's steps, so the circuit is the same service_health document, cached
+    copy, and state transitions in both modes (and every worker). Calls are limited to
+    ASYNC_CATALOG_MAX_CONCURRENCY at a time per process, instead of the sync breaker's
+    per-thread limit.
+    """
+    def __init__(self, breaker):
+        self.breaker = breaker
+        self.service = breaker.service
+        # created on first use, inside the event loop
+        self._concurrency = None
+
+    async def call(self, func, *args, **kwargs):
+        """Awaits a coroutine function that talks to the service, guarded by the circuit (see CircuitBreaker.call).
+
+        Raises:
+            CircuitOpenError: If the circuit is open and the call was not attempted.
+            Any exception raised by func. Service failures are recorded before re-raising.
+        """
+        if self._concurrency is None:
+            self._concurrency = asyncio.Semaphore(Config.ASYNC_CATALOG_MAX_CONCURRENCY)
+
+        async def call_service():
+            async with self._concurrency:
+                return await remote_call(self.service, func, *args, **kwargs)
+        return await run_steps_async(self.breaker.call_steps(call_service))
+
+
+simbad_async_breaker = AsyncCircuitBreaker(simbad_breaker)
+nea_async_breaker = AsyncCircuitBreaker(nea_breaker)
+mast_async_breaker = AsyncCircuitBreaker(mast_breaker)
+
+
+async def read_through(breaker, key, fetch, not_found=is_not_found):
+    """Returns a catalog answer from the shared cache, or fetches and stores it (see helpers_catalog_cache.read_through).
+
+    Args:
+        breaker: The AsyncCircuitBreaker of the catalog service.
+        key: The cache key, from name_key() or coords_key().
+        fetch: A coroutine function with no arguments that queries the catalog.
+        not_found: A function that checks if an answer means "not found".
+    """
+    return await run_steps_async(read_through_steps(breaker.service, key, lambda: breaker.call(fetch), not_found))
+
+
+"""——————————————————————————————CATALOG QUERIES——————————————————————————————"""
+
+def to_sexagesimal(ra, dec):
+    """Formats RA and DEC (degrees) as sexagesimal strings like SIMBAD's ('hh mm ss.ssss', '+dd mm ss.sss')."""
+    ra_seconds = round((ra % 360) / 15 * 3600, 4)
+    hours, rest = divmod(ra_seconds, 3600)
+    minutes, seconds = divmod(rest, 60)
+    dec_seconds = round(abs(dec) * 3600, 3)
+    degrees, dec_rest = divmod(dec_seconds, 3600)
+    arcminutes, arcseconds = divmod(dec_rest, 60)
+    return (f'{int(hours):02d} {int(minutes):02d} {seconds:07.4f}',
+            f'{"-" if dec < 0 else "+"}{int(degrees):02d} {int(arcminutes):02d} {arcseconds:06.3f}')
+
+
+def xml_number(element, path):
+    """Returns the number at a path of an XML element, or None if it is missing or empty."""
+    text = element.findtext(path)
+    if text is None or not text.strip():
+        return None
+    return float(text)
+
+
+async def fetch_simbad(star_name):
+    """Resolves a star name with SIMBAD (through the CDS Sesame name resolver, which answers in one request).
+
+    Returns:
+        The same dict as helpers_catalogs.fetch_simbad (so both modes share the cached
+        answers), or None if SIMBAD does not know the star name.
+    """
+    # Sesame takes the name as the whole query string
+    response = await request_service('simbad', 'GET', f'{Config.SIMBAD_SESAME_URL}?{quote(star_name)}')
+    resolver = ElementTree.fromstring(response.content).find('.//Resolver')
+    if resolver is None or xml_number(resolver, 'jradeg') is None:
+        return None
+    ra, dec = to_sexagesimal(xml_number(resolver, 'jradeg'), xml_number(resolver, 'jdedeg'))
+    return {
+        'ra': ra,
+        'dec': dec,
+        'pmra': xml_number(resolver, 'pm/pmRA'),
+        'pmdec': xml_number(resolver, 'pm/pmDE'),
+        'plx': xml_number(resolver, 'plx/v'),
+        'rv': xml_number(resolver, 'Vel/v'),
+    }
+
+
+async def query_nea_tap(query):
+    """Runs an ADQL query on the NASA Exoplanet Archive TAP service and returns the rows as dicts."""
+    response = await request_service('nasa_exoplanet_archive', 'GET', Config.NEA_TAP_URL, params={'query': query, 'format': 'json'})
+    return response.json()
+
+
+async def fetch_nea_host_names():
+    """Queries the NASA Exoplanet Archive for the names of all exoplanet host stars."""
+    return [row['hostname'] for row in await query_nea_tap('select distinct hostname from pscomppars')]
+
+
+async def fetch_nasa_exoplanet_archive(star_name=None, coords=None):
+    """Queries the NASA Exoplanet Archive for stellar parameters by name or position (see helpers_catalogs).
+
+    Returns:
+        A dict of stellar parameters for the first matching row, or None if nothing was found.
+    """
+    if star_name:
+        corrected_star_name = star_name.replace("'", "''")
+        rows = await query_nea_tap(f"select top 5 {NEA_COLUMNS} from pscomppars where hostname like '%{corrected_star_name}%' order by hostname")
+    else:
+        ra, dec = float(coords[0]), float(coords[1])
+        rows = await query_nea_tap(f"select {NEA_COLUMNS} from pscomppars where contains(point('icrs', ra, dec), circle('icrs', {ra}, {dec}, 1.0)) = 1")
+    if rows:
+        return nea_row_to_dict(rows[0])
+    return None
+
+
+async def fetch_galex_sources(ra, dec, radius):
+    """Queries the MAST GALEX catalog for every source within a radius (degrees) of a position.
+
+    Returns:
+        A list of dicts with the GALEX_STORE_COLUMNS (see helpers_galex_store.fetch_galex_sources).
+    """
+    request = {'service': 'Mast.Galex.Catalog', 'params': {'ra': ra, 'dec': dec, 'radius': radius},
+               'format': 'json', 'pagesize': 50000, 'page': 1}
+    while True:
+        response = await request_service('mast', 'POST', Config.MAST_API_URL, data={'request': json.dumps(request)})
+        result = response.json()
+        # long queries answer with EXECUTING until they are done, the policy's deadline bounds the polling
+        if result.get('status') != 'EXECUTING':
+            break
+        await asyncio.sleep(MAST_POLL_SECONDS)
+    if result.get('status') == 'ERROR':
+        raise ValueError(f'MAST GALEX query failed: {result.get("msg")}')
+    return [{column: row.get(column) for column in GALEX_STORE_COLUMNS} for row in result.get('data', [])]
+
+
+"""——————————————————————————————CACHED LOOKUPS——————————————————————————————"""
+
+async def search_simbad(star_name):
+    """Returns SIMBAD data for a star name through the shared catalog cache."""
+    return await read_through(simbad_async_breaker, name_key(star_name), lambda: fetch_simbad(star_name))
+
+
+async def nea_mirror_is_loaded():
+    """Checks if the NEA pscomppars mirror has been loaded at least once."""
+    state = await async_resources.db.mirror_state.find_one({'_id': NEA_MIRROR_STATE_ID})
+    return state is not None and state.get('count', 0) > 0
+
+
+async def lookup_nea_host_names():
+    """Returns the names of all exoplanet host stars, from the mirror if it has been loaded."""
+    if await nea_mirror_is_loaded():
+        return await async_resources.db.nea_pscomppars.distinct('hostname')
+    return await read_through(nea_async_breaker, 'host_names', fetch_nea_host_names, not_found=lambda names: not names)
+
+
+async def lookup_nasa_exoplanet_archive(star_name=None, coords=None):
+    """Returns NASA Exoplanet Archive stellar parameters by name or position, from the mirror if possible.
+
+    Like helpers_nea_mirror.lookup_nasa_exoplanet_archive, falls back to the live archive
+    (through the shared catalog cache) if the mirror has not been loaded or has no match.
+    """
+    if await nea_mirror_is_loaded():
+        nea_pscomppars = async_resources.db.nea_pscomppars
+        if star_name:
+            row = await nea_pscomppars.find_one({'hostname_key': hostname_key(star_name)}, sort=[('hostname', 1)])
+            if row is None:
+                row = await nea_pscomppars.find_one(host_prefix_filter(star_name), sort=[('hostname', 1)])
+        else:
+            ra, dec = float(coords[0]), float(coords[1])
+            row = closest_host(await nea_pscomppars.find(cone_filter(ra, dec, 1.0)).to_list(None), ra, dec)
+        if row is not None:
+            return mirror_row_to_nea_dict(row)
+    key = name_key(star_name) if star_name else coords_key(coords[0], coords[1])
+    return await read_through(nea_async_breaker, key, lambda: fetch_nasa_exoplanet_archive(star_name, coords))
+
+
+async def ingest_galex_sources(rows, coverage):
+    """Adds GALEX catalog rows and the cone they cover to the store (see helpers_galex_store.ingest_galex_sources)."""
+    db = async_resources.db
+    now = time.time()
+    operations = galex_source_operations(rows, now)
+    if operations:
+        await db.galex_sources.bulk_write(operations, ordered=False)
+    await db.galex_coverage.replace_one(*coverage_replacement(coverage, now), upsert=True)
+    await db.mirror_state.update_one({'_id': GALEX_STORE_STATE_ID}, {'$max': {'last_ingest': now}}, upsert=True)
+
+
+async def lookup_galex(ra, dec):
+    """Returns the GALEX sources around a position, from the local store if possible (see helpers_galex_store.lookup_galex)."""
+    ra, dec = float(ra), float(dec)
+    # the sky index is only searched here (its background thread loads and rebuilds it), so it runs on the loop
+    result = search_galex_store(ra, dec)
+    if result is not None:
+        return result
+    coverage = (ra, dec, Config.GALEX_STORE_QUERY_RADIUS)
+    rows = await mast_async_breaker.call(fetch_galex_sources, *coverage)
+    await ingest_galex_sources(rows, coverage)
+    galex_index.add_pending(stored_sources(rows), stored_coverage(coverage))
+    return search_galex_store(ra, dec)
+
+
+"""——————————————————————————————STELLAR SEARCH——————————————————————————————"""
+
+async def get_stellar_parameters(stellar_object):
+    """Searches the catalogs for a stellar object, like StellarObject.get_stellar_parameters.
+
+    The steps, and how each answer or error is applied to the object, are the same (the
+    StellarObject methods are shared), but the catalog lookups are awaited, so one event
+    loop holds many searches at once. The CPU bound steps (coordinate parsing, proper motion
+    correction) and the memoized subtype lookup run on threads so they do not stall the loop.
+    """
+    # STEP 1: Check for search type (position or name)
+    if stellar_object.position:
+        converted_coords = await asyncio.to_thread(stellar_object.convert_coords, stellar_object.position)
+        if converted_coords is not None:
+            stellar_object.modal_page_error_msg = converted_coords
+            return
+    elif stellar_object.star_name:
+        try:
+            host_stars = await lookup_nea_host_names()
+        except (CircuitOpenError,) + SERVICE_FAILURES as e:
+            # NEA is unavailable, continue with the name as the user typed it
+            print(f'In depth NEA host name error: {e}')
+            host_stars = []
+        stellar_object.match_host_name(host_stars)
+        try:
+            simbad_data = stellar_object.set_simbad_data(stellar_object.star_name, await search_simbad(stellar_object.star_name))
+        except Exception as e:
+            simbad_data = stellar_object.simbad_error(e)
+        if simbad_data is not None:
+            stellar_object.modal_error_msgs.append(simbad_data)
+        if not await asyncio.to_thread(stellar_object.correct_proper_motion):
+            return
+    star_name, position, coords = stellar_object.star_name, stellar_object.position, stellar_object.coords
+    # STEP 2: Search NASA Exoplanet Archive with the search term & type
+    try:
+        nea_answer = await lookup_nasa_exoplanet_archive(star_name, coords)
+    except Exception as e:
+        nea_data = stellar_object.nasa_exoplanet_archive_error(e)
+    else:
+        nea_data = stellar_object.set_nasa_exoplanet_archive_data(star_name, coords, nea_answer)
+    if nea_data is not None:
+        stellar_object.modal_error_msgs.append(nea_data)
+    # STEP 3: Get the stellar subtype
+    await asyncio.to_thread(stellar_object.get_stellar_subtype, stellar_object.teff, stellar_object.logg, stellar_object.mass)
+    # STEP 4: Search GALEX with the corrected/converted coords
+    pm_corrected_coords = stellar_object.pm_corrected_coords
+    query_coords = stellar_object.get_galex_query_coords(star_name, position, pm_corrected_coords, coords)
+    try:
+        galex_answer = await lookup_galex(query_coords[0], query_coords[1]) if query_coords is not None else None
+    except Exception as e:
+        galex_data = stellar_object.galex_error(e, position, pm_corrected_coords, coords)
+    else:
+        galex_data = stellar_object.set_galex_data(star_name, position, pm_corrected_coords, coords, galex_answer)
+    if galex_data is not None:
+        stellar_object.modal_error_msgs.append(galex_data)
+    # STEP 5: Check that at least one main search returned data
+    if nea_data is not None and galex_data is not None:
+        stellar_object.modal_page_error_msg = 'Nothing found for your target in the NExSci database or the MAST GALEX database.'
+
+
+class AsyncSingleFlight():
+    """Makes concurrent identical searches of this process share one execution (see SingleFlight).
+
+    The shared execution is shielded, so a client that disconnects does not cancel it for
+    the others waiting on it.
+    """
+    def __init__(self):
+        self._calls = {}
+
+    async def do(self, key, func):
+        """Awaits func() for a key, or the execution already running for that key, and returns a deep copy of its result."""
+        task = self._calls.get(key)
+        if task is None:
+            task = asyncio.ensure_future(func())
+            self._calls[key] = task
+            task.add_done_callback(lambda _: self._calls.pop(key, None))
+        return copy.deepcopy(await asyncio.shield(task))
+
+
+async_search_flight = AsyncSingleFlight()
+
+
+async def search_stellar_object(star_name=None, position=None):
+    """Searches the catalogs for one target. Identical searches running at the same time share one execution.
+
+    Returns:
+        The searched StellarObject.
+    """
+    async def search():
+        stellar_object = StellarObject(star_name=star_name, position=position)
+        await get_stellar_parameters(stellar_object)
+        return stellar_object
+    return await async_search_flight.do(search_key(star_name, position), search)
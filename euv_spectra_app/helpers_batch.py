@@ -0,0 +1,169 @@
+from euv_spectra_app.models import StellarObject
+from euv_spectra_app.helpers import to_json
+from euv_spectra_app.helpers_fluxes import surface_scale
+from euv_spectra_app.config import Config
+from euv_spectra_app.helpers_jobs import executor, search_executor, new_job_id, create_job, get_job, mark_job_running, update_job, record_job_result
+from euv_spectra_app.helpers_locks import acquire_lock, release_lock, get_lock_holder
+from euv_spectra_app.helpers_single_flight import search_key, stellar_search_flight
+
+
+def search_stellar_object(star_name=None, position=None):
+    """Searches the catalogs for one target and returns the stellar object as a JSON serializable dict."""
+    stellar_object = StellarObject(star_name=star_name, position=position)
+    stellar_object.get_stellar_parameters()
+    return to_json(stellar_object)
+
+
+def to_parameters_response(data):
+    """Returns the answer of the parameter search API routes (sync and async) for a searched stellar object.
+
+    Args:
+        data: The searched stellar object, as to_json returns it.
+
+    Returns:
+        A dict of the stellar parameters, with the error messages of the search joined under
+        modal_error_msg if there were any.
+    """
+    pm_data = data.get('pm_data')
+    fluxes = data.get('fluxes') or {}
+    scale = None
+    if data.get('dist') is not None and data.get('rad') is not None:
+        scale = float(surface_scale(data['dist'], data['rad']))
+    stellar_data = {
+        'star_name': data.get('star_name'),
+        'position': data.get('position'),
+        'coordinates': data.get('pm_corrected_coords') or data.get('coords'),
+        'teff': data.get('teff'),
+        'logg': data.get('logg'),
+        'mass': data.get('mass'),
+        'dist': data.get('dist'),
+        'rad': data.get('rad'),
+        'proper_motion_data': None if pm_data is None else {
+            'pmra': pm_data.get('pm_ra'),
+            'pmdec': pm_data.get('pm_dec'),
+            'parallax': pm_data.get('plx'),
+            'radial_velocity': pm_data.get('rad_vel'),
+        },
+        'fluxes': {
+            'fuv': fluxes.get('fuv'),
+            'fuv_err': fluxes.get('fuv_err'),
+            'nuv': fluxes.get('nuv'),
+            'nuv_err': fluxes.get('nuv_err'),
+            'scale': scale,
+        },
+        'j_band': data.get('j_band'),
+        'fuv': fluxes.get('fuv'),
+        'nuv': fluxes.get('nuv'),
+        'fuv_err': fluxes.get('fuv_err'),
+        'nuv_err': fluxes.get('nuv_err'),
+    }
+    errors = [msg for msg in [data.get('modal_page_error_msg')] + (data.get('modal_error_msgs') or []) if msg]
+    if errors:
+        stellar_data['modal_error_msg'] = '\n'.join(errors)
+    return stellar_data
+
+
+def parameters_cache_policy(stellar_data):
+    """Returns the HTTP cache policy of a parameter search answer: answers with search errors (e.g. a catalog
+    that is down, or a misspelled target) are not cached."""
+    return 'error' if stellar_data.get('modal_error_msg') else 'catalog'
+
+
+def resolve_target(star_name=None, position=None):
+    """Resolves the stellar parameters of one target through the catalog layer.
+
+    Runs the same SIMBAD, NASA Exoplanet Archive and GALEX searches as the search form,
+    so it shares the catalog cache, local mirrors, and circuit breakers. Identical
+    searches running at the same time share one execution.
+
+    Returns:
+        A JSON serializable dict of the stellar object, with any error messages under
+        modal_error_msgs (and modal_page_error_msg if the search could not run at all).
+    """
+    data = stellar_search_flight.do(search_key(star_name, position), lambda: search_stellar_object(star_name, position))
+    # the flux object keeps a copy of the stellar object, which is not needed here
+    if data.get('fluxes') is not None:
+        data['fluxes'].pop('stellar_obj', None)
+    return data
+
+
+def resolve_and_record(job_id, index, target):
+    """Resolves one target of a batch job and records the result on the job."""
+    mark_job_running(job_id)
+    try:
+        result = resolve_target(**target)
+        failed = bool(result.get('modal_page_error_msg'))
+    except Exception as e:
+        print(f'Batch resolution error for {target}: {e}')
+        result = {'error': f'Unknown error while resolving target: {e}'}
+        failed = True
+    record_job_result(job_id, index, target, result, failed)
+    return {'index': index, 'target': target, 'result': result, 'failed': failed}
+
+
+def start_batch_resolution(targets):
+    """Starts resolving many targets in the background on the shared bounded worker pool.
+
+    Each target runs in its own pool thread, and the per-catalog concurrency limits of the
+    circuit breakers keep the number of calls to each archive bounded.
+
+    Args:
+        targets: A list of dicts with either a star_name or a position key.
+
+    Returns:
+        The job id, to poll with get_job and read the results with get_job_results.
+    """
+    job_id = create_job('resolve', len(targets), params={'targets': targets})
+    for index, target in enumerate(targets):
+        executor.submit(resolve_and_record, job_id, index, target)
+    return job_id
+
+
+"""——————————————————————————————SEARCH JOBS——————————————————————————————"""
+
+def run_search_job(job_id, star_name=None, position=None, lock_name=None):
+    """Runs a search form query in the background, reporting each catalog step on the job."""
+    mark_job_running(job_id)
+    target = {'star_name': star_name, 'position': position}
+    try:
+        stellar_object = StellarObject(star_name=star_name, position=position)
+        stellar_object.get_stellar_parameters(progress=lambda step: update_job(job_id, step=step))
+        # the full object is kept (including the flux object's copy) so the modal and results pages can rebuild it
+        result = to_json(stellar_object)
+        failed = bool(result.get('modal_page_error_msg'))
+    except Exception as e:
+        print(f'Search job error for {target}: {e}')
+        result = {'modal_page_error_msg': f'Unknown error while searching for your target: {e}'}
+        failed = True
+    try:
+        record_job_result(job_id, 0, target, result, failed)
+    finally:
+        if lock_name is not None:
+            release_lock(lock_name, job_id)
+
+
+def start_search_job(star_name=None, position=None):
+    """Starts a search form query in the background so the request does not wait on the catalogs.
+
+    Search jobs run on their own small pool, so they start right away even while a batch
+    job fills the shared job pool.
+
+    If the same search (ignoring spacing and case) is already running on any worker, its
+    job is returned instead of starting another one, so concurrent users searching for the
+    same target share one set of catalog calls.
+
+    Returns:
+        The job id, to poll with get_job and read the result with get_job_results.
+    """
+    job_id = new_job_id()
+    # the lock is held with the job id, so other workers can find the running job
+    lock_name = f'search_job:{search_key(star_name, position)}'
+    if acquire_lock(lock_name, Config.SINGLE_FLIGHT_LEASE, token=job_id) is None:
+        running_job_id = get_lock_holder(lock_name)
+        if running_job_id is not None and get_job(running_job_id) is not None:
+            return running_job_id
+        # the running job finished in the meantime, start a new one without the lock
+        lock_name = None
+    create_job('search', 1, params={'star_name': star_name, 'position': position}, job_id=job_id)
+    search_executor.submit(run_search_job, job_id, star_name, position, lock_name)
+    return job_id
@@ -0,0 +1,106 @@
+import time
+from datetime import datetime, timedelta
+from euv_spectra_app.config import Config
+from euv_spectra_app.extensions import catalog_cache
+from euv_spectra_app.helpers_circuit_breaker import CircuitOpenError, SERVICE_FAILURES
+from euv_spectra_app.helpers_steps import db_step, call_step, run_steps
+
+_indexes_created = False
+
+
+def ensure_catalog_cache_indexes():
+    """Creates the TTL index that removes entries once they are too old to serve, even as stale."""
+    global _indexes_created
+    if not _indexes_created:
+        catalog_cache.create_index('expires_at', expireAfterSeconds=0)
+        _indexes_created = True
+
+
+def normalize_star_name(star_name):
+    """Normalizes a star name for cache keys: no surrounding spaces, single spaces, upper case."""
+    return ' '.join(str(star_name).split()).upper()
+
+
+def name_key(star_name):
+    """Returns the cache key for a search by star name."""
+    return f'name:{normalize_star_name(star_name)}'
+
+
+def coords_key(ra, dec):
+    """Returns the cache key for a search by position, with RA and DEC rounded so nearby searches share an entry."""
+    decimals = Config.CATALOG_CACHE_COORD_DECIMALS
+    return f'coords:{float(ra):.{decimals}f},{float(dec):.{decimals}f}'
+
+
+def is_not_found(value):
+    """Default check for a "not found" catalog answer."""
+    return value is None
+
+
+def catalog_cache_document(source, key, value, negative=False):
+    """Returns the cache entry of a catalog answer, with the TTL of its source (or the negative TTL for not found answers)."""
+    ttl = Config.CATALOG_CACHE_NEGATIVE_TTL if negative else Config.CATALOG_CACHE_TTL[source]
+    now = time.time()
+    return {'source': source,
+            'key': key,
+            'value': value,
+            'found': not negative,
+            'fetched_at': now,
+            'fresh_until': now + ttl,
+            'expires_at': datetime.utcnow() + timedelta(seconds=ttl + Config.CATALOG_CACHE_STALE_TTL)}
+
+
+def store_catalog_result(source, key, value, negative=False):
+    """Stores a catalog answer in the shared cache."""
+    ensure_catalog_cache_indexes()
+    catalog_cache.replace_one({'_id': f'{source}:{key}'}, catalog_cache_document(source, key, value, negative), upsert=True)
+
+
+def read_through_steps(source, key, fetch_through_breaker, not_found=is_not_found):
+    """Steps (see helpers_steps) of read_through, shared with the async mode.
+
+    Args:
+        source: The catalog service name, the cache source.
+        key: The cache key.
+        fetch_through_breaker: A function with no arguments that queries the catalog through its circuit breaker.
+        not_found: A function that checks if an answer means "not found".
+    """
+    entry = yield db_step('catalog_cache', 'find_one', {'_id': f'{source}:{key}'})
+    if entry is not None and entry['fresh_until'] > time.time():
+        return entry['value']
+    try:
+        value = yield call_step(fetch_through_breaker)
+    except (CircuitOpenError,) + SERVICE_FAILURES as e:
+        if entry is not None:
+            print(f'Serving stale {source} result for {key}: {e}')
+            return entry['value']
+        raise
+    yield call_step(ensure_catalog_cache_indexes)
+    yield db_step('catalog_cache', 'replace_one', {'_id': f'{source}:{key}'},
+                  catalog_cache_document(source, key, value, negative=not_found(value)), upsert=True)
+    return value
+
+
+def read_through(breaker, key, fetch, not_found=is_not_found):
+    """Returns a catalog answer from the shared cache, or fetches and stores it.
+
+    Entries live in the catalog_cache collection so they are shared by every worker and
+    survive restarts. Fresh entries are returned without calling the catalog. Expired
+    entries are refreshed, but if the catalog is down (circuit open or the call fails)
+    the stale entry is served instead of an error.
+
+    Args:
+        breaker: The CircuitBreaker of the catalog service. Its service name is the cache source.
+        key: The cache key, from name_key() or coords_key().
+        fetch: A function with no arguments that queries the catalog and returns a plain
+            (BSON serializable) answer.
+        not_found: A function that checks if an answer means "not found". Not found
+            answers are cached with the shorter negative TTL.
+
+    Returns:
+        The catalog answer.
+
+    Raises:
+        CircuitOpenError or the service failure from fetch if there is no entry to fall back on.
+    """
+    return run_steps(read_through_steps(breaker.service, key, lambda: breaker.call(fetch), not_found))
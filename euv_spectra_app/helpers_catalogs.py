@@ -0,0 +1,141 @@
+# FOR ASTROQUERY CATALOG DATA
+import numpy.ma as ma
+from euv_spectra_app.helpers_remote import configure_client_timeout
+from euv_spectra_app.startup import lazy_import
+from euv_spectra_app.helpers_catalog_cache import read_through, name_key, coords_key
+from euv_spectra_app.helpers_circuit_breaker import simbad_breaker, nea_breaker
+
+u = lazy_import('astropy.units')
+astropy_coordinates = lazy_import('astropy.coordinates')
+nasa_exoplanet_archive = lazy_import('astroquery.ipac.nexsci.nasa_exoplanet_archive')
+simbad = lazy_import('astroquery.simbad')
+mast = lazy_import('astroquery.mast')
+
+_custom_simbad = None
+
+
+def get_custom_simbad():
+    """Returns the SIMBAD client configured with the fields we use, created on first use."""
+    global _custom_simbad
+    if _custom_simbad is None:
+        custom_simbad = simbad.Simbad()
+        custom_simbad.remove_votable_fields('coordinates')
+        custom_simbad.add_votable_fields(
+            'ra', 'dec', 'pmra', 'pmdec', 'plx', 'rv_value', 'typed_id')
+        _custom_simbad = configure_client_timeout(custom_simbad, 'simbad')
+    return _custom_simbad
+
+
+def get_nea_client():
+    """Returns the NASA Exoplanet Archive client with the timeouts of its remote call policy."""
+    return configure_client_timeout(nasa_exoplanet_archive.NasaExoplanetArchive, 'nasa_exoplanet_archive')
+
+
+def get_mast_catalogs():
+    """Returns the MAST catalogs client with the timeouts of its remote call policy."""
+    return configure_client_timeout(mast.Catalogs, 'mast')
+
+
+# Maximum distance (arcmin) between the target coordinates and a GALEX source for a match
+GALEX_MATCH_RADIUS = 0.167
+
+
+def to_plain_value(value):
+    """Converts a value from an astropy table row into a plain Python value.
+
+    Masked values become None, quantities lose their units, and numpy scalars become
+    Python scalars, so the value can be stored in MongoDB and the session.
+    """
+    if value is None or ma.is_masked(value):
+        return None
+    if bool(getattr(value, 'mask', False)):
+        return None
+    value = getattr(value, 'unmasked', value)
+    value = getattr(value, 'value', value)
+    if hasattr(value, 'item'):
+        value = value.item()
+    return value
+
+
+def nea_row_to_dict(row):
+    """Converts a NASA Exoplanet Archive pscomppars row into a plain dict of the columns we use."""
+    return {
+        'teff': to_plain_value(row['st_teff']),
+        'logg': to_plain_value(row['st_logg']),
+        'mass': to_plain_value(row['st_mass']),
+        'rad': to_plain_value(row['st_rad']),
+        'dist': to_plain_value(row['sy_dist']),
+        'jmag': to_plain_value(row['sy_jmag']),
+        'spectype': to_plain_value(row['st_spectype']),
+        'disc_refname': to_plain_value(row['disc_refname']),
+    }
+
+
+"""——————————————————————————————CATALOG QUERIES——————————————————————————————"""
+
+def fetch_simbad(star_name):
+    """Queries SIMBAD for coordinates and proper motion data.
+
+    Returns:
+        A dict with ra, dec (sexagesimal strings), pmra, pmdec, plx, and rv, or None if
+        SIMBAD has no results for the star name.
+    """
+    result_table = get_custom_simbad().query_object(star_name)
+    if result_table and len(result_table) > 0:
+        data = result_table[0]
+        return {
+            'ra': to_plain_value(data['RA']),
+            'dec': to_plain_value(data['DEC']),
+            'pmra': to_plain_value(data['PMRA']),
+            'pmdec': to_plain_value(data['PMDEC']),
+            'plx': to_plain_value(data['PLX_VALUE']),
+            'rv': to_plain_value(data['RV_VALUE']),
+        }
+    return None
+
+
+def fetch_nea_host_names():
+    """Queries the NASA Exoplanet Archive for the names of all exoplanet host stars."""
+    data = get_nea_client().query_criteria(
+        table="pscomppars", select="DISTINCT hostname")
+    return [to_plain_value(name) for name in data['hostname']]
+
+
+def fetch_nasa_exoplanet_archive(star_name=None, coords=None):
+    """Queries the NASA Exoplanet Archive for stellar parameters by name or position.
+
+    Returns:
+        A dict of stellar parameters for the first matching row, or None if nothing was found.
+    """
+    if star_name:
+        corrected_star_name = star_name.replace("'", "''")
+        nea_data = get_nea_client().query_criteria(
+            table="pscomppars",
+            select="top 5 disc_refname, st_spectype, st_teff, st_logg, st_mass, st_rad, sy_dist, sy_jmag",
+            where=f"hostname like '%{corrected_star_name}%'",
+            order="hostname")
+    else:
+        nea_data = get_nea_client().query_region(table="pscomppars", coordinates=astropy_coordinates.SkyCoord(
+            ra=coords[0] * u.deg, dec=coords[1] * u.deg), radius=1.0 * u.deg)
+    if len(nea_data) > 0:
+        return nea_row_to_dict(nea_data[0])
+    return None
+
+
+"""——————————————————————————————CACHED CATALOG QUERIES——————————————————————————————"""
+
+def search_simbad(star_name):
+    """Returns SIMBAD data for a star name through the shared catalog cache."""
+    return read_through(simbad_breaker, name_key(star_name), lambda: fetch_simbad(star_name))
+
+
+def get_nea_host_names():
+    """Returns the names of all exoplanet host stars through the shared catalog cache."""
+    return read_through(nea_breaker, 'host_names', fetch_nea_host_names, not_found=lambda names: not names)
+
+
+def search_nasa_exoplanet_archive(star_name=None, coords=None):
+    """Returns NASA Exoplanet Archive stellar parameters by name or position through the shared catalog cache."""
+    key = name_key(star_name) if star_name else coords_key(coords[0], coords[1])
+    return read_through(nea_breaker, key, lambda: fetch_nasa_exoplanet_archive(star_name, coords))
+
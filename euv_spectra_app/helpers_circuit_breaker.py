@@ -0,0 +1,180 @@
+import time
+import threading
+from pymongo import ReturnDocument
+from euv_spectra_app.config import Config
+from euv_spectra_app.helpers_remote import remote_call, RETRYABLE_FAILURES
+from euv_spectra_app.helpers_steps import db_step, call_step, run_steps
+
+# Exceptions that mean the remote service itself is unhealthy (down, unreachable, 5xx, timed out).
+# Anything else (no results, unresolvable object, bad input) means the service answered.
+SERVICE_FAILURES = RETRYABLE_FAILURES
+
+
+class CircuitOpenError(Exception):
+    """Raised when a call is refused because the circuit for a service is open."""
+
+
+class CircuitBreaker():
+    """Tracks the health of one remote catalog service.
+
+    The circuit state is stored in the service_health collection so that every gunicorn
+    worker shares it. The state transitions are steps (see helpers_steps), run by call here
+    and by AsyncCircuitBreaker in the async mode. Each worker keeps a copy of the state document for a few seconds so
+    checking the circuit does not cost a database round trip on every search.
+
+    States:
+        closed: Calls go through. Consecutive failures are counted.
+        open: Calls fail fast until the cooldown is over.
+        half_open: The cooldown is over and one worker is running a trial call. Other
+            workers keep failing fast until the trial succeeds (closed) or fails (open).
+    """
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half_open'
+
+    def __init__(self, service, failure_threshold=None, cooldown=None, state_cache_seconds=None, max_concurrency=None):
+        self.service = service
+        self.failure_threshold = failure_threshold or Config.CIRCUIT_BREAKER_FAILURE_THRESHOLD
+        self.cooldown = cooldown or Config.CIRCUIT_BREAKER_COOLDOWN
+        self.state_cache_seconds = state_cache_seconds if state_cache_seconds is not None else Config.CIRCUIT_BREAKER_STATE_CACHE_SECONDS
+        self._state = None
+        self._state_fetched_at = 0
+        self._lock = threading.Lock()
+        # limits how many calls this worker makes to the service at the same time (batch jobs run many threads)
+        self._concurrency = threading.BoundedSemaphore(max_concurrency) if max_concurrency else None
+
+    def _set_cached_state(self, state):
+        with self._lock:
+            self._state = state
+            self._state_fetched_at = time.time()
+
+    def get_state_steps(self, refresh=False):
+        """Steps (see helpers_steps) that return the circuit state document, read from the database at most every few seconds."""
+        if refresh or self._state is None or time.time() - self._state_fetched_at > self.state_cache_seconds:
+            state = yield db_step('service_health', 'find_one', {'_id': self.service})
+            if state is None:
+                state = {'_id': self.service, 'state': self.CLOSED, 'failures': 0, 'opened_at': None}
+            self._set_cached_state(state)
+        return self._state
+
+    def get_state(self, refresh=False):
+        """Returns the circuit state document, read from the database at most every few seconds."""
+        return run_steps(self.get_state_steps(refresh))
+
+    def allow_request_steps(self):
+        """Steps that check if a call to the service should be attempted.
+
+        Returns:
+            True if the circuit is closed, or if the cooldown is over and this worker won the
+            trial call. False if the circuit is open (or another worker is running the trial).
+        """
+        state = yield from self.get_state_steps()
+        if state['state'] == self.CLOSED:
+            return True
+        if time.time() - state['opened_at'] < self.cooldown:
+            return False
+        # Cooldown is over. Only the worker that flips the stored state gets to run the trial
+        # call, the filter on opened_at makes this an atomic compare and swap.
+        trial_state = yield db_step(
+            'service_health', 'find_one_and_update',
+            {'_id': self.service, 'state': state['state'], 'opened_at': state['opened_at']},
+            {'$set': {'state': self.HALF_OPEN, 'opened_at': time.time()}},
+            return_document=ReturnDocument.AFTER)
+        if trial_state is None:
+            yield from self.get_state_steps(refresh=True)
+            return False
+        self._set_cached_state(trial_state)
+        return True
+
+    def record_success_steps(self):
+        """Steps that close the circuit after a successful call.
+
+        The filter skips the write when the stored circuit is already closed with no failures,
+        so the reset is decided on the database state and not on this worker's cached copy
+        (which may still show closed while the circuit is half open).
+        """
+        new_state = yield db_step(
+            'service_health', 'find_one_and_update',
+            {'_id': self.service, '$or': [{'state': {'$ne': self.CLOSED}}, {'failures': {'$ne': 0}}]},
+            {'$set': {'state': self.CLOSED, 'failures': 0, 'opened_at': None}},
+            return_document=ReturnDocument.AFTER)
+        if new_state is None:
+            # already closed (or never failed), nothing changed
+            new_state = {'_id': self.service, 'state': self.CLOSED, 'failures': 0, 'opened_at': None}
+        self._set_cached_state(new_state)
+
+    def record_failure_steps(self, error=None):
+        """Steps that count a failed call and open the circuit if the failure threshold is reached.
+
+        Only a circuit that is not open yet is opened, so failures of calls that started before
+        it opened do not push its cooldown out.
+        """
+        new_state = yield db_step(
+            'service_health', 'find_one_and_update',
+            {'_id': self.service},
+            {'$inc': {'failures': 1},
+             '$set': {'last_error': str(error), 'last_failure_at': time.time()},
+             '$setOnInsert': {'state': self.CLOSED, 'opened_at': None}},
+            upsert=True, return_document=ReturnDocument.AFTER)
+        if new_state['state'] == self.HALF_OPEN or (new_state['state'] == self.CLOSED and new_state['failures'] >= self.failure_threshold):
+            opened_state = yield db_step(
+                'service_health', 'find_one_and_update',
+                {'_id': self.service, 'state': {'$ne': self.OPEN}},
+                {'$set': {'state': self.OPEN, 'opened_at': time.time()}},
+                return_document=ReturnDocument.AFTER)
+            if opened_state is not None:
+                print(f'Opening circuit for {self.service} after {new_state["failures"]} failures: {error}')
+                new_state = opened_state
+            else:
+                # another worker opened it first
+                new_state = yield db_step('service_health', 'find_one', {'_id': self.service})
+        self._set_cached_state(new_state)
+
+    def call_steps(self, call_service):
+        """Steps that run a call to the service guarded by the circuit, and record its outcome.
+
+        Args:
+            call_service: A function with no arguments that makes the call (under the service's
+                remote call policy and concurrency limit).
+
+        Raises:
+            CircuitOpenError: If the circuit is open and the call was not attempted.
+            Any exception raised by the call. Service failures are recorded before re-raising.
+        """
+        if not (yield from self.allow_request_steps()):
+            raise CircuitOpenError(f'{self.service} is currently unavailable.')
+        try:
+            result = yield call_step(call_service)
+        except SERVICE_FAILURES as e:
+            yield from self.record_failure_steps(e)
+            raise
+        except Exception:
+            # the service answered, the error is about the query itself
+            yield from self.record_success_steps()
+            raise
+        yield from self.record_success_steps()
+        return result
+
+    def call(self, func, *args, **kwargs):
+        """Calls a function that talks to the service, guarded by the circuit.
+
+        The outcome of the call is recorded as the health of the service, replacing the
+        separate liveness probe that used to run before every query. The call runs under the
+        service's remote call policy (timeouts, retries, hedging), so only a call that failed
+        after its retries counts as a failure.
+
+        Raises:
+            CircuitOpenError: If the circuit is open and the call was not attempted.
+            Any exception raised by func. Service failures are recorded before re-raising.
+        """
+        def call_service():
+            if self._concurrency is None:
+                return remote_call(self.service, func, *args, **kwargs)
+            with self._concurrency:
+                return remote_call(self.service, func, *args, **kwargs)
+        return run_steps(self.call_steps(call_service))
+
+
+simbad_breaker = CircuitBreaker('simbad', max_concurrency=Config.CATALOG_MAX_CONCURRENCY['simbad'])
+nea_breaker = CircuitBreaker('nasa_exoplanet_archive', max_concurrency=Config.CATALOG_MAX_CONCURRENCY['nasa_exoplanet_archive'])
+mast_breaker = CircuitBreaker('mast', max_concurrency=Config.CATALOG_MAX_CONCURRENCY['mast'])
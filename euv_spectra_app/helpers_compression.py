@@ -0,0 +1,108 @@
+# HTTP RESPONSE COMPRESSION (GZIP, AND BROTLI OR ZSTANDARD IF INSTALLED)
+import gzip
+from flask import request, make_response
+from euv_spectra_app.config import Config
+
+# in requirements.txt, but optional: without them only gzip is offered
+try:
+    import brotli
+except ImportError:
+    brotli = None
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+
+def gzip_compress(data, level):
+    """Compresses bytes with gzip, always to the same bytes for the same data (mtime is zeroed)."""
+    return gzip.compress(data, compresslevel=level, mtime=0)
+
+
+def brotli_compress(data, level):
+    return brotli.compress(data, quality=level)
+
+
+def zstd_compress(data, level):
+    return zstandard.ZstdCompressor(level=level).compress(data)
+
+
+COMPRESSORS = {'gzip': gzip_compress}
+if brotli is not None:
+    COMPRESSORS['br'] = brotli_compress
+if zstandard is not None:
+    COMPRESSORS['zstd'] = zstd_compress
+# best first, a client accepting several equally gets the first
+ENCODINGS = [encoding for encoding in ('br', 'zstd', 'gzip') if encoding in COMPRESSORS]
+
+
+def get_level(mimetype, encoding):
+    """Returns the compression level of a content type and encoding (COMPRESSION_LEVELS in config)."""
+    levels = Config.COMPRESSION_LEVELS.get(mimetype, Config.COMPRESSION_LEVELS['default'])
+    return levels[encoding]
+
+
+def choose_encoding(available=ENCODINGS):
+    """Returns the best of the available encodings the client accepts (Accept-Encoding), or None."""
+    return request.accept_encodings.best_match([encoding for encoding in ENCODINGS if encoding in available])
+
+
+def precompress(data):
+    """Compresses a static payload once in every available encoding, at PRECOMPRESSION_LEVELS.
+
+    For payloads that never change once cached (model spectra, results figures), so the cost
+    of the higher levels is paid once instead of on every response.
+
+    Returns:
+        A dict of encoding to compressed bytes. The uncompressed data is not kept, it is
+        decompressed from gzip for the rare client that accepts no encoding.
+    """
+    return {encoding: compress(data, Config.PRECOMPRESSION_LEVELS[encoding]) for encoding, compress in COMPRESSORS.items()}
+
+
+def precompressed_response(payload, mimetype):
+    """Returns a response of a precompressed payload (see precompress) in the best encoding the client accepts.
+
+    Args:
+        payload: A dict of encoding to compressed bytes, with at least gzip.
+        mimetype: The content type of the uncompressed data.
+    """
+    encoding = choose_encoding(payload)
+    if encoding is None:
+        response = make_response(gzip.decompress(payload['gzip']))
+    else:
+        response = make_response(payload[encoding])
+        response.headers['Content-Encoding'] = encoding
+    response.mimetype = mimetype
+    response.vary.add('Accept-Encoding')
+    return response
+
+
+def compress_response(response):
+    """Compresses a response in the best encoding the client accepts (registered as an after_request function).
+
+    Only successful responses of a COMPRESSION_MIMETYPES content type and of at least
+    COMPRESSION_MIN_SIZE bytes are compressed, at the level of their content type. Streamed
+    responses (NDJSON, files) and responses that are already encoded (precompressed payloads)
+    are left alone. A compressed response's ETag is made weak, since it no longer identifies
+    the exact bytes, which is still enough to answer If-None-Match with a 304.
+    """
+    if (not Config.COMPRESSION_ENABLED or response.status_code != 200 or response.direct_passthrough
+            or response.is_streamed or 'Content-Encoding' in response.headers
+            or response.mimetype not in Config.COMPRESSION_MIMETYPES
+            or 'no-transform' in response.headers.get('Cache-Control', '')):
+        return response
+    data = response.get_data()
+    if len(data) < Config.COMPRESSION_MIN_SIZE:
+        return response
+    # caches keep one copy per encoding, also of the uncompressed response
+    response.vary.add('Accept-Encoding')
+    encoding = choose_encoding()
+    if encoding is None:
+        return response
+    response.set_data(COMPRESSORS[encoding](data, get_level(response.mimetype, encoding)))
+    response.headers['Content-Encoding'] = encoding
+    etag, weak = response.get_etag()
+    if etag is not None and not weak:
+        response.set_etag(etag, weak=True)
+    return response
@@ -1,5 +1,41 @@
 from euv_spectra_app.extensions import *
+from euv_spectra_app.helpers_memoize import memoize_query
 
+# Precision the query inputs are rounded to for memoization. Finer than the grid spacing, so
+# the rounding does not change which models match.
+PARAMETER_DECIMALS = {'teff': 1, 'logg': 3, 'mass': 3}
+FLUX_SIGNIFICANT_DIGITS = {name: 9 for name in ('corrected_nuv', 'corrected_fuv', 'corrected_nuv_err', 'corrected_fuv_err')}
+
+
+def page_stages(fields=None, exclude=(), skip=0, limit=None):
+    """Returns the pipeline stages that page and project the sorted models of a grid query.
+
+    The page is cut before the projection, so the database only projects the models that are
+    returned (and a $sort followed by $limit only keeps the top models while sorting).
+
+    Args:
+        fields: Names of the fields to return (_id is only returned if it is named). None
+            returns every field but the excluded ones.
+        exclude: Names of fields to leave out when no fields are given.
+        skip: Number of models to skip.
+        limit: Maximum number of models to return, None for all of them.
+    """
+    stages = []
+    if skip:
+        stages.append({'$skip': skip})
+    if limit is not None:
+        stages.append({'$limit': limit})
+    if fields:
+        projection = {field: 1 for field in fields}
+        if '_id' not in fields:
+            projection['_id'] = 0
+        stages.append({'$project': projection})
+    elif exclude:
+        stages.append({'$project': {field: 0 for field in exclude}})
+    return stages
+
+
+@memoize_query(decimals=PARAMETER_DECIMALS)
 def get_matching_subtype(teff, logg, mass):
     """Matches to a subtype in the PEGASUS grid.
 
@@ -43,6 +79,7 @@ def get_matching_subtype(teff, logg, mass):
     return list(matching_subtype)[0]
 
 
+@memoize_query(decimals=PARAMETER_DECIMALS)
 def get_matching_photosphere(teff, logg, mass):
     """Matches to a PHOENIX photosphere model.
 
@@ -74,6 +111,7 @@ def get_matching_photosphere(teff, logg, mass):
     ])
     return list(matching_photosphere_model)[0]
 
+@memoize_query(collections=('model_collection',))
 def search_db(model_collection, fuv, nuv):
     # NORMAL SEARCH: fuv, fuv_err, nuv, and nuv_err are all there, search within limits
     # DETECTION ONLY SEARCH: fuv and nuv are there but no errors, search for closest match
@@ -122,7 +160,8 @@ def construct_flux_query(fieldname, flux_flag, flux_value, flux_err):
         query = {}
     return query
 
-def get_models_with_chi_squared(corrected_nuv, corrected_fuv, model_collection):
+@memoize_query(significant=FLUX_SIGNIFICANT_DIGITS, collections=('model_collection',))
+def get_models_with_chi_squared(corrected_nuv, corrected_fuv, model_collection, fields=None, exclude=(), skip=0, limit=None):
     """Calculates chi square (χ2) values.
 
     Calculates the chi square values of FUV and NUV flux densities of each model in
@@ -136,6 +175,7 @@ def get_models_with_chi_squared(corrected_nuv, corrected_fuv, model_collection):
          subtracted) of the user's stellar target.
         model_collection: The name of the MongoDB collection representing the matched 
          stellar subtype.
+        fields, exclude, skip, limit: The page and projection of the models (see page_stages).
 
     Returns:
         The matching MongoDB model collection with all documents containing an 
@@ -162,11 +202,14 @@ def get_models_with_chi_squared(corrected_nuv, corrected_fuv, model_collection):
                 } 
             } 
         },
-        { "$sort": { "chi_squared": 1 } }
+        # _id breaks ties, so pages do not overlap
+        { "$sort": { "chi_squared": 1, "_id": 1 } },
+        *page_stages(fields, exclude, skip, limit)
     ])
     return models_with_chi_squared
 
-def get_models_with_weighted_fuv(corrected_nuv, corrected_fuv, model_collection):
+@memoize_query(significant=FLUX_SIGNIFICANT_DIGITS, collections=('model_collection',))
+def get_models_with_weighted_fuv(corrected_nuv, corrected_fuv, model_collection, fields=None, exclude=(), skip=0, limit=None):
     """Calculates chi square value with weighted preference on FUV flux.
 
     Calculates the chi square values of FUV and NUV flux densities of each model in
@@ -182,6 +225,7 @@ def get_models_with_weighted_fuv(corrected_nuv, corrected_fuv, model_collection)
          subtracted) of the user's stellar target.
         model_collection: The name of the MongoDB collection representing the matched 
          stellar subtype.
+        fields, exclude, skip, limit: The page and projection of the models (see page_stages).
 
     Returns:
         The matching MongoDB model collection with all documents having a FUV chi 
@@ -203,15 +247,15 @@ def get_models_with_weighted_fuv(corrected_nuv, corrected_fuv, model_collection)
                 {"$divide": [{"$pow": [{"$subtract": ["$fuv", corrected_fuv]}, 2]}, corrected_fuv]}]
             }, 2]}
         }},
-        {"$sort": {"chi_squared": 1}}
+        # filtered in the database, so the page is cut from the filtered models
+        {"$match": {"$expr": {"$lt": ["$chi_squared_fuv", "$chi_squared_nuv"]}}},
+        {"$sort": {"chi_squared": 1, "_id": 1}},
+        *page_stages(fields, exclude, skip, limit)
     ])
-    final_models = []
-    for model in list(models_with_fuv_less_than_nuv):
-        if model['chi_squared_fuv'] < model['chi_squared_nuv']:
-            final_models.append(model)
-    return final_models
+    return models_with_fuv_less_than_nuv
 
-def get_flux_ratios(corrected_nuv, corrected_fuv, model_collection):
+@memoize_query(significant=FLUX_SIGNIFICANT_DIGITS, collections=('model_collection',))
+def get_flux_ratios(corrected_nuv, corrected_fuv, model_collection, fields=None, exclude=(), skip=0, limit=None):
     """TESTING: Computes the chi square value of flux ratios.
 
     Computes the chi square value of the model NUV to FUV flux ratio compared to
@@ -224,6 +268,7 @@ def get_flux_ratios(corrected_nuv, corrected_fuv, model_collection):
          subtracted) of the user's stellar target.
         model_collection: The name of the MongoDB collection representing the matched 
          stellar subtype.
+        fields, exclude, skip, limit: The page and projection of the models (see page_stages).
 
     Returns:
         The matching MongoDB collection with an additional field, 'chi_squared',
@@ -250,11 +295,13 @@ def get_flux_ratios(corrected_nuv, corrected_fuv, model_collection):
                 }
             }
         },
-        {"$sort": {"chi_squared": 1}}
+        {"$sort": {"chi_squared": 1, "_id": 1}},
+        *page_stages(fields, exclude, skip, limit)
     ])
     return models_with_ratio
 
-def get_models_within_limits(corrected_nuv, corrected_fuv, corrected_nuv_err, corrected_fuv_err, model_collection):
+@memoize_query(significant=FLUX_SIGNIFICANT_DIGITS, collections=('model_collection',))
+def get_models_within_limits(corrected_nuv, corrected_fuv, corrected_nuv_err, corrected_fuv_err, model_collection, fields=None, exclude=(), skip=0, limit=None):
     """Searches for models within limits of GALEX FUV and NUV flux densities.
 
     Args:
@@ -268,6 +315,7 @@ def get_models_within_limits(corrected_nuv, corrected_fuv, corrected_nuv_err, co
          photosphere subtracted) of the user's stellar target.
         model_collection: The name of the MongoDB collection representing the matched 
          stellar subtype.
+        fields, exclude, skip, limit: The page and projection of the models (see page_stages).
 
     Returns:
         MongoDB documents in the collection that have an FUV flux density value within 
@@ -300,6 +348,7 @@ def get_models_within_limits(corrected_nuv, corrected_fuv, corrected_nuv_err, co
                 } 
             } 
         },
-        { "$sort": { "chi_squared": 1 } }
+        { "$sort": { "chi_squared": 1, "_id": 1 } },
+        *page_stages(fields, exclude, skip, limit)
     ])
     return models_within_limits
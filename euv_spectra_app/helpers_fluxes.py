@@ -0,0 +1,140 @@
+# VECTORIZED GALEX FLUX CONVERSIONS (FOR THE ARRAY MODE OF THE API)
+import csv
+import io
+import json
+import math
+import numpy as np
+from euv_spectra_app.config import Config
+
+# effective wavelengths (Å) of the GALEX bands
+WAVELENGTHS = {'fuv': 1542.3, 'nuv': 2274.4}
+# AB magnitude zero points and flux density (ergs/s/cm2/Å) at them, of the GALEX bands
+MAG_ZERO_POINTS = {'fuv': (18.82, 1.4e-15), 'nuv': (20.08, 2.06e-16)}
+PARSEC_CM = 3.08567758e18
+SOLAR_RADIUS_CM = 6.9e10
+
+
+def mag_to_ujy(mag, flux_type):
+    """Converts GALEX AB magnitudes to microjanskies (works on numbers and arrays)."""
+    zero_point, zero_point_flux = MAG_ZERO_POINTS[flux_type]
+    # mag(AB) → erg/s/cm^2/A
+    flux_density = np.power(10.0, (np.asarray(mag, dtype=float) - zero_point) / -2.5) * zero_point_flux
+    # erg/s/cm^2/A → uJy
+    return ((flux_density * WAVELENGTHS[flux_type] ** 2) / 3e-5) * 1e6
+
+
+def ujy_to_flux_density(flux, flux_type):
+    """Converts microjanskies to ergs/s/cm2/Å (works on numbers and arrays)."""
+    return (3e-5 * (np.asarray(flux, dtype=float) * 1e-6)) / WAVELENGTHS[flux_type] ** 2
+
+
+def surface_scale(dist, rad):
+    """Returns the factor that scales a flux to the stellar surface, from the distance (pc) and radius."""
+    return (np.asarray(dist, dtype=float) * PARSEC_CM) ** 2 / (np.asarray(rad, dtype=float) * SOLAR_RADIUS_CM) ** 2
+
+
+def propagate_error(transform, values, errors):
+    """Returns the error of transformed values, like the scalar routes: the average distance of the
+    transformed upper and lower limits from the transformed value, (f(x + err) - f(x - err)) / 2.
+
+    The absolute value is returned, so decreasing transforms (magnitudes to fluxes) give positive errors.
+    """
+    return np.abs(transform(values + errors) - transform(values - errors)) / 2
+
+
+class TooManyRowsError(ValueError):
+    """The body of an array mode request is larger than the API converts (answered with a 413 status)."""
+
+
+def check_row_count(rows):
+    """Raises TooManyRowsError if there are more than ARRAY_MAX_ROWS rows."""
+    if rows > Config.ARRAY_MAX_ROWS:
+        raise TooManyRowsError(f'Too many rows, at most {Config.ARRAY_MAX_ROWS} can be converted in one request.')
+
+
+def read_columns(request):
+    """Reads the rows of an array mode request into columns.
+
+    The body is either JSON, as an object of column name to list of values or a list of row
+    objects, or CSV with a header row (Content-Type text/csv). Missing and empty values are
+    NaN, and come back as null.
+
+    The size of the body is checked before it is read, and the number of rows before the
+    values are converted, so an oversized upload is rejected without being parsed in full.
+
+    Returns:
+        A dict of column name to float numpy array, all of the same length.
+
+    Raises:
+        TooManyRowsError if the body is larger than ARRAY_MAX_BODY_BYTES or has more than
+        ARRAY_MAX_ROWS rows.
+        ValueError with a message for the client if the body can not be read, a value is
+        non-numerical, or the columns differ in length.
+    """
+    if request.content_length is not None and request.content_length > Config.ARRAY_MAX_BODY_BYTES:
+        raise TooManyRowsError(f'The body is too large, at most {Config.ARRAY_MAX_BODY_BYTES} bytes can be converted in one request.')
+    # a body without a Content-Length (chunked) is read no further than the limit
+    body = request.stream.read(Config.ARRAY_MAX_BODY_BYTES + 1)
+    if len(body) > Config.ARRAY_MAX_BODY_BYTES:
+        raise TooManyRowsError(f'The body is too large, at most {Config.ARRAY_MAX_BODY_BYTES} bytes can be converted in one request.')
+    if request.mimetype == 'text/csv':
+        reader = csv.DictReader(io.StringIO(body.decode(request.charset, errors='replace')))
+        rows = []
+        for row in reader:
+            rows.append(row)
+            check_row_count(len(rows))
+        data = {name: [row.get(name) for row in rows] for name in (reader.fieldnames or [])}
+    else:
+        try:
+            data = json.loads(body) if request.is_json else None
+        except ValueError:
+            data = None
+        if isinstance(data, list):
+            check_row_count(len(data))
+            if not all(isinstance(row, dict) for row in data):
+                raise ValueError('A JSON array body must be a list of row objects. Please check your format and try again.')
+            names = {name for row in data for name in row}
+            data = {name: [row.get(name) for row in data] for name in names}
+        if not isinstance(data, dict):
+            raise ValueError('The body must be a JSON object of columns, a JSON array of rows, or CSV with a header row. Please check your format and try again.')
+    columns = {}
+    for name, values in data.items():
+        name = name.strip()
+        if not isinstance(values, list):
+            raise ValueError(f'Column {name} must be a list of values. Please check your format and try again.')
+        check_row_count(len(values))
+        try:
+            columns[name] = np.array([np.nan if value is None or value == '' else float(value) for value in values], dtype=float)
+        except (TypeError, ValueError):
+            raise ValueError(f'Column {name} has a non-numerical value. Please check your inputs and try again.')
+    lengths = {len(values) for values in columns.values()}
+    if len(lengths) > 1:
+        raise ValueError('Every column must have the same number of rows. Please check your inputs and try again.')
+    return columns
+
+
+def get_column(columns, args, name, rows):
+    """Returns a column of the body, else a single value from the query arguments for every row, else None.
+
+    Raises:
+        ValueError if the query argument is non-numerical.
+    """
+    if name in columns:
+        return columns[name]
+    value = args.get(name)
+    if value is None:
+        return None
+    try:
+        return np.full(rows, float(value))
+    except ValueError:
+        raise ValueError(f'Value of {name} is non-numerical. Please check your inputs and try again.')
+
+
+def count_rows(columns):
+    """Returns the number of rows of the columns."""
+    return len(next(iter(columns.values()))) if columns else 0
+
+
+def to_column(values):
+    """Returns a numpy array as a list for JSON, with NaN and infinite values as null."""
+    return [value if math.isfinite(value) else None for value in values.tolist()]
@@ -0,0 +1,99 @@
+# FOR GALEX OBSERVATION TIMES
+import time
+import threading
+import numpy as np
+from euv_spectra_app.config import Config
+from euv_spectra_app.extensions import mast_galex_times
+
+
+def target_key(star_name):
+    """Normalizes a target name so spacing and case variants match (e.g. "GJ 338 B" and "gj338b")."""
+    return ''.join(str(star_name).split()).upper()
+
+
+class GalexEpochTable():
+    """In-process table of the GALEX visit epochs of every target in the mast_galex_times collection.
+
+    Maps each normalized target name to a sorted array of the t_min (MJD) of all its GALEX
+    visits. The table is loaded once per worker and reloaded when the collection changes,
+    which is checked at most every GALEX_EPOCHS_CHECK_SECONDS. Whatever edits the t_min of
+    existing documents has to set their updated_at, or the edit is not seen.
+    """
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.checked_at = 0
+        self.fingerprint = None
+        self.epochs = {}
+        self.indexed = False
+
+    def get_fingerprint(self, collection):
+        """Returns a cheap value that changes when documents are added, removed, or updated (see updated_at)."""
+        if not self.indexed:
+            collection.create_index('updated_at')
+            self.indexed = True
+        newest = collection.find_one({}, {'_id': 1}, sort=[('_id', -1)])
+        updated = collection.find_one({'updated_at': {'$exists': True}}, {'updated_at': 1}, sort=[('updated_at', -1)])
+        return (collection.estimated_document_count(), newest['_id'] if newest else None,
+                updated['updated_at'] if updated else None)
+
+    def refresh(self, force=False, collection=None):
+        """Reloads the table if the collection changed since it was loaded.
+
+        Args:
+            force: Check the collection now instead of waiting for GALEX_EPOCHS_CHECK_SECONDS.
+            collection: The mast_galex_times collection to load from (the shared client's by default,
+                a temporary client's when preloading in the gunicorn master).
+        """
+        if collection is None:
+            collection = mast_galex_times
+        if not force and time.time() - self.checked_at < Config.GALEX_EPOCHS_CHECK_SECONDS:
+            return
+        with self.lock:
+            if not force and time.time() - self.checked_at < Config.GALEX_EPOCHS_CHECK_SECONDS:
+                return
+            self.checked_at = time.time()
+            fingerprint = self.get_fingerprint(collection)
+            if fingerprint == self.fingerprint:
+                return
+            visits = {}
+            for row in collection.find({}, {'target': 1, 't_min': 1}):
+                if row.get('target') is None or row.get('t_min') is None:
+                    continue
+                visits.setdefault(target_key(row['target']), []).append(float(row['t_min']))
+            # replaced as a whole so lookups never see a half loaded table
+            self.epochs = {key: np.unique(epochs) for key, epochs in visits.items()}
+            self.fingerprint = fingerprint
+
+    def get_version(self):
+        """Returns a string that changes when the table is reloaded with changed data (for HTTP caching)."""
+        self.refresh()
+        return str(self.fingerprint)
+
+    def get_epochs(self, star_name):
+        """Returns the sorted epochs (MJD) of all GALEX visits of a target, or None if it has no visits."""
+        self.refresh()
+        return self.epochs.get(target_key(star_name))
+
+    def get_epoch(self, star_name, near=None):
+        """Returns a single GALEX visit epoch (MJD) of a target.
+
+        Args:
+            star_name: The target name.
+            near: An epoch (MJD). If given, the visit closest to it is returned, for example the
+                visit of the GALEX source that was matched. Otherwise the earliest visit is returned.
+
+        Returns:
+            The epoch, or None if the target has no GALEX visits.
+        """
+        epochs = self.get_epochs(star_name)
+        if epochs is None or len(epochs) == 0:
+            return None
+        if near is None:
+            return float(epochs[0])
+        # epochs are sorted, so the closest one is next to where near would be inserted
+        i = int(np.searchsorted(epochs, near))
+        candidates = epochs[max(i - 1, 0):i + 1]
+        return float(candidates[np.argmin(np.abs(candidates - near))])
+
+
+galex_epochs = GalexEpochTable()
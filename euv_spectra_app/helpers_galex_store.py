@@ -0,0 +1,337 @@
+import time
+import threading
+import numpy as np
+from pymongo import ReplaceOne
+from euv_spectra_app.config import Config
+from euv_spectra_app.extensions import galex_sources, galex_coverage, mirror_state
+from euv_spectra_app.helpers_circuit_breaker import mast_breaker
+from euv_spectra_app.helpers_catalogs import to_plain_value, get_mast_catalogs, GALEX_MATCH_RADIUS
+from euv_spectra_app.startup import lazy_import
+
+spatial = lazy_import('scipy.spatial')
+table = lazy_import('astropy.table')
+
+# The GALEX catalog columns the store keeps. objID is the row key.
+GALEX_STORE_COLUMNS = ['objID', 'ra', 'dec', 'fuv_flux', 'fuv_fluxerr', 'nuv_flux', 'nuv_fluxerr',
+                       'fuv_flux_aper_7', 'nuv_flux_aper_7']
+GALEX_STORE_STATE_ID = 'galex_store'
+# Rows ingested this many seconds before the last index refresh are loaded again, so rows that
+# were still being written by another worker during the refresh are not missed.
+GALEX_STORE_INGEST_OVERLAP = 60
+# Height (degrees) of the declination bands the index keeps a KD-tree for.
+GALEX_STORE_BAND_DEGREES = 1
+
+_indexes_created = False
+
+
+def ensure_galex_store_indexes():
+    """Creates the ingest time indexes used to load new rows into the in-process index."""
+    global _indexes_created
+    if not _indexes_created:
+        galex_sources.create_index('ingested_at')
+        galex_coverage.create_index('ingested_at')
+        _indexes_created = True
+
+
+def unit_vectors(ra, dec):
+    """Converts RA and DEC (degrees) into unit vectors on the sphere, so a KD-tree can be used for cone searches."""
+    ra = np.radians(np.asarray(ra, dtype=float))
+    dec = np.radians(np.asarray(dec, dtype=float))
+    return np.column_stack((np.cos(dec) * np.cos(ra), np.cos(dec) * np.sin(ra), np.sin(dec)))
+
+
+def chord_length(angle):
+    """Returns the straight line distance between two unit vectors separated by an angle (radians)."""
+    return 2 * np.sin(np.asarray(angle) / 2)
+
+
+def chord_to_angle(chord):
+    """Returns the angle (radians) between two unit vectors separated by a straight line distance."""
+    return 2 * np.arcsin(np.clip(np.asarray(chord) / 2, 0, 1))
+
+
+"""——————————————————————————————IN-PROCESS SKY INDEX——————————————————————————————"""
+
+def search_rows(rows, ra, dec, radius):
+    """Returns the (row, separation in radians) of the rows within a radius (degrees) of a position, without a KD-tree (for a few rows)."""
+    if not rows:
+        return []
+    center = unit_vectors(ra, dec)[0]
+    separations = chord_to_angle(np.linalg.norm(unit_vectors([row['ra'] for row in rows], [row['dec'] for row in rows]) - center, axis=1))
+    return [(row, separation) for row, separation in zip(rows, separations) if separation <= np.radians(radius)]
+
+
+class SkyBands():
+    """KD-trees of stored rows (with ra and dec) split into declination bands of GALEX_STORE_BAND_DEGREES.
+
+    New rows only rebuild the trees of the bands they fall in. The (KD-tree, rows) snapshot of a
+    band is replaced as a whole, so searches never see a half built tree.
+    """
+    def __init__(self):
+        self.rows = {}
+        self.trees = {}
+
+    def band(self, dec):
+        """Returns the band of a declination (degrees)."""
+        return min(max(int((dec + 90) // GALEX_STORE_BAND_DEGREES), 0), int(180 // GALEX_STORE_BAND_DEGREES))
+
+    def contains(self, row):
+        """Checks if a row (by its _id) was added."""
+        return row['_id'] in self.rows.get(self.band(row['dec']), {})
+
+    def add(self, rows):
+        """Adds rows (or replaces them, by _id) and rebuilds the trees of their bands."""
+        bands = set()
+        for row in rows:
+            band = self.band(row['dec'])
+            self.rows.setdefault(band, {})[row['_id']] = row
+            bands.add(band)
+        for band in bands:
+            band_rows = list(self.rows[band].values())
+            self.trees[band] = (spatial.cKDTree(unit_vectors([row['ra'] for row in band_rows], [row['dec'] for row in band_rows])), band_rows)
+
+    def search(self, ra, dec, radius):
+        """Returns the (row, separation in radians) of the rows within a radius (degrees) of a position."""
+        center = unit_vectors(ra, dec)[0]
+        found = []
+        # a row within the radius is at most the radius away in declination
+        for band in range(self.band(dec - radius), self.band(dec + radius) + 1):
+            tree, rows = self.trees.get(band, (None, []))
+            if tree is None:
+                continue
+            indices = tree.query_ball_point(center, chord_length(np.radians(radius)))
+            if indices:
+                separations = chord_to_angle(np.linalg.norm(tree.data[indices] - center, axis=1))
+                found.extend(zip((rows[i] for i in indices), separations))
+        return found
+
+
+class GalexSourceIndex():
+    """In-process KD-trees of the stored GALEX sources and of the sky regions already queried.
+
+    The index is loaded from the galex_sources and galex_coverage collections by a background
+    thread of each worker, which every GALEX_STORE_INDEX_CHECK_SECONDS loads the rows ingested
+    since its last refresh (by any worker) and rebuilds the trees of their declination bands.
+    Searches never load or rebuild anything. The rows this worker just ingested are searched
+    as they are until the background thread has loaded them.
+    """
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.loaded_until = None
+        self.sources = SkyBands()
+        self.coverage = SkyBands()
+        # the radius (degrees) of the largest region in coverage
+        self.coverage_radius = 0
+        self.pending_lock = threading.Lock()
+        # (sources, coverage) ingested by this worker and not loaded yet, replaced as a whole
+        self.pending = ((), ())
+        self.refresher_started = False
+
+    def start_refresher(self):
+        """Starts the thread that refreshes the index every GALEX_STORE_INDEX_CHECK_SECONDS (once per worker)."""
+        with self.pending_lock:
+            if self.refresher_started:
+                return
+            self.refresher_started = True
+        threading.Thread(target=self.run_refresher, name='galex-index', daemon=True).start()
+
+    def run_refresher(self):
+        while True:
+            try:
+                self.refresh()
+            except Exception as e:
+                print(f'GALEX source index refresh error: {e}')
+            time.sleep(Config.GALEX_STORE_INDEX_CHECK_SECONDS)
+
+    def refresh(self, database=None):
+        """Loads rows ingested since the last refresh and rebuilds the KD-trees of their bands.
+
+        Args:
+            database: The database to load from (the shared client's by default, a temporary
+                client's when preloading in the gunicorn master).
+        """
+        sources_collection = database.galex_sources if database is not None else galex_sources
+        coverage_collection = database.galex_coverage if database is not None else galex_coverage
+        state_collection = database.mirror_state if database is not None else mirror_state
+        with self.lock:
+            state = state_collection.find_one({'_id': GALEX_STORE_STATE_ID})
+            if state is None or (self.loaded_until is not None and state['last_ingest'] <= self.loaded_until):
+                return
+            query = {}
+            if self.loaded_until is not None:
+                query = {'ingested_at': {'$gte': self.loaded_until - GALEX_STORE_INGEST_OVERLAP}}
+            self.loaded_until = state['last_ingest']
+            new_sources = list(sources_collection.find(query, {'ingested_at': 0}))
+            new_coverage = list(coverage_collection.find(query, {'ingested_at': 0}))
+            self.sources.add(new_sources)
+            self.coverage.add(new_coverage)
+            self.coverage_radius = max([self.coverage_radius] + [row['radius'] for row in new_coverage])
+            with self.pending_lock:
+                sources, coverage = self.pending
+                self.pending = (tuple(row for row in sources if not self.sources.contains(row)),
+                                tuple(row for row in coverage if not self.coverage.contains(row)))
+
+    def add_pending(self, sources, coverage):
+        """Makes stored rows this worker just ingested searchable until the background refresh loads them.
+
+        Args:
+            sources: The stored source rows (see stored_sources).
+            coverage: The stored covered region (see stored_coverage).
+        """
+        with self.pending_lock:
+            self.pending = (self.pending[0] + tuple(sources), self.pending[1] + (coverage,))
+
+    def is_covered(self, ra, dec, radius):
+        """Checks if a cone (degrees) lies completely inside a sky region that was already queried."""
+        pending = self.pending[1]
+        largest = max([self.coverage_radius] + [row['radius'] for row in pending])
+        # only regions whose center is closer than the largest region radius can contain the cone
+        regions = self.coverage.search(ra, dec, largest) + search_rows(pending, ra, dec, largest)
+        # (with a small tolerance for the cone of the region itself)
+        return any(separation + np.radians(radius) <= np.radians(region['radius']) + 1e-9 for region, separation in regions)
+
+    def cone_search(self, ra, dec, radius):
+        """Returns the stored sources within a radius (degrees) of a position, closest first.
+
+        Each source is a copy of its stored row with the distance to the position added
+        in arcmin (distance_arcmin), like the MAST catalog results.
+        """
+        found = {}
+        for row, separation in self.sources.search(ra, dec, radius) + search_rows(self.pending[0], ra, dec, radius):
+            found[row['_id']] = (row, separation)
+        results = []
+        for row, separation in sorted(found.values(), key=lambda item: item[1]):
+            source = {key: value for key, value in row.items() if key != '_id'}
+            source['distance_arcmin'] = float(np.degrees(separation) * 60)
+            results.append(source)
+        return results
+
+
+galex_index = GalexSourceIndex()
+
+
+"""——————————————————————————————STORE POPULATION——————————————————————————————"""
+
+def ingest_galex_sources(rows, coverage=None):
+    """Adds GALEX catalog rows to the store.
+
+    Args:
+        rows: Dicts with the GALEX_STORE_COLUMNS (plain values).
+        coverage: Optional (ra, dec, radius) cone in degrees that the rows completely cover,
+            i.e. every GALEX source in the cone is in the rows. Only covered regions are
+            answered from the store.
+
+    Returns:
+        The number of rows written.
+    """
+    ensure_galex_store_indexes()
+    now = time.time()
+    operations = galex_source_operations(rows, now)
+    if operations:
+        galex_sources.bulk_write(operations, ordered=False)
+    if coverage is not None:
+        galex_coverage.replace_one(*coverage_replacement(coverage, now), upsert=True)
+    mirror_state.update_one({'_id': GALEX_STORE_STATE_ID}, {'$max': {'last_ingest': now}}, upsert=True)
+    return len(operations)
+
+
+def stored_sources(rows):
+    """Returns the documents the store keeps for GALEX catalog rows (rows without an objID or position are left out)."""
+    docs = []
+    for row in rows:
+        if row.get('objID') is None or row.get('ra') is None or row.get('dec') is None:
+            continue
+        doc = {column: row.get(column) for column in GALEX_STORE_COLUMNS if column != 'objID'}
+        doc['_id'] = row['objID']
+        docs.append(doc)
+    return docs
+
+
+def galex_source_operations(rows, now):
+    """Returns the bulk write operations that store GALEX catalog rows."""
+    return [ReplaceOne({'_id': doc['_id']}, dict(doc, ingested_at=now), upsert=True) for doc in stored_sources(rows)]
+
+
+def stored_coverage(coverage):
+    """Returns the document the store keeps for a covered (ra, dec, radius) cone."""
+    ra, dec, radius = (float(value) for value in coverage)
+    return {'_id': f'{ra:.6f},{dec:.6f},{radius:.6f}', 'ra': ra, 'dec': dec, 'radius': radius}
+
+
+def coverage_replacement(coverage, now):
+    """Returns the filter and document that store a covered (ra, dec, radius) cone."""
+    doc = stored_coverage(coverage)
+    return {'_id': doc.pop('_id')}, dict(doc, ingested_at=now)
+
+
+def fetch_galex_sources(ra, dec, radius):
+    """Queries the MAST GALEX catalog for every source within a radius (degrees) of a position.
+
+    Returns:
+        A list of dicts with the GALEX_STORE_COLUMNS.
+    """
+    galex_data = mast_breaker.call(get_mast_catalogs().query_object, f'{ra} {dec}', catalog="GALEX", radius=radius)
+    return [{column: to_plain_value(row[column]) for column in GALEX_STORE_COLUMNS} for row in galex_data]
+
+
+def import_galex_catalog(path, ra, dec, radius):
+    """Bulk imports a downloaded slice of the GALEX catalog (any format astropy can read, e.g. CSV, FITS, VOTable).
+
+    Args:
+        path: The path of the catalog slice. It needs the GALEX_STORE_COLUMNS (any case).
+        ra: The RA (degrees) of the center of the cone the slice covers.
+        dec: The DEC (degrees) of the center of the cone the slice covers.
+        radius: The radius (degrees) of the cone the slice covers.
+
+    Returns:
+        The number of rows written.
+    """
+    catalog = table.Table.read(path)
+    columns = {name.lower(): name for name in catalog.colnames}
+    missing = [column for column in GALEX_STORE_COLUMNS if column.lower() not in columns]
+    if missing:
+        raise ValueError(f'GALEX catalog slice is missing columns: {", ".join(missing)}')
+    rows = [{column: to_plain_value(row[columns[column.lower()]]) for column in GALEX_STORE_COLUMNS} for row in catalog]
+    return ingest_galex_sources(rows, coverage=(ra, dec, radius))
+
+
+"""——————————————————————————————STORE LOOKUPS——————————————————————————————"""
+
+def search_galex_store(ra, dec):
+    """Answers a GALEX search from the store if the sky region around the position was already queried.
+
+    Returns:
+        A dict with the number of GALEX sources around the position (n_sources) and the
+        closest source within GALEX_MATCH_RADIUS (match, None if there is no such source),
+        or None if the store can not answer for this position.
+    """
+    galex_index.start_refresher()
+    if not galex_index.is_covered(ra, dec, GALEX_MATCH_RADIUS / 60):
+        return None
+    sources = galex_index.cone_search(ra, dec, Config.GALEX_STORE_QUERY_RADIUS)
+    if not sources and not galex_index.is_covered(ra, dec, Config.GALEX_STORE_QUERY_RADIUS):
+        # the position is covered but part of the surrounding cone is not, there may be sources there
+        return None
+    match = None
+    if sources and sources[0]['distance_arcmin'] < GALEX_MATCH_RADIUS:
+        match = sources[0]
+    return {'n_sources': len(sources), 'match': match}
+
+
+def lookup_galex(ra, dec):
+    """Returns the GALEX sources around a position, from the local store if possible.
+
+    If the store has not seen this sky region, MAST is queried for the whole
+    GALEX_STORE_QUERY_RADIUS cone and the results are added to the store, so later
+    searches in the same region are answered locally. The index is not rebuilt for them,
+    the new rows are searched as they are until its background refresh loads them.
+    """
+    ra, dec = float(ra), float(dec)
+    result = search_galex_store(ra, dec)
+    if result is not None:
+        return result
+    coverage = (ra, dec, Config.GALEX_STORE_QUERY_RADIUS)
+    rows = fetch_galex_sources(*coverage)
+    ingest_galex_sources(rows, coverage=coverage)
+    galex_index.add_pending(stored_sources(rows), stored_coverage(coverage))
+    return search_galex_store(ra, dec)
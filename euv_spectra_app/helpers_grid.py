@@ -0,0 +1,65 @@
+# FOR TRACKING CHANGES TO THE PEGASUS GRID
+import time
+import hashlib
+import threading
+from euv_spectra_app.config import Config
+from euv_spectra_app.extensions import db
+
+
+class GridVersion():
+    """Tracks a version string of the PEGASUS grid, which changes whenever the grid data changes.
+
+    The version is a hash of the document count and newest _id of the model_parameter_grid,
+    photosphere_models, and every *_grid collection. It is recomputed at most every
+    GRID_VERSION_CHECK_SECONDS, so caches keyed by it (results, memoized queries) are
+    invalidated within that time of a grid import.
+    """
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.checked_at = 0
+        self.version = None
+        self.collections = set()
+
+    def refresh(self, force=False, database=None):
+        """Recomputes the version if it was last checked more than GRID_VERSION_CHECK_SECONDS ago.
+
+        Args:
+            force: Check the grid now.
+            database: The database to check (the shared client's by default, a temporary
+                client's when preloading in the gunicorn master).
+        """
+        if database is None:
+            database = db
+        if not force and time.time() - self.checked_at < Config.GRID_VERSION_CHECK_SECONDS:
+            return
+        with self.lock:
+            if not force and time.time() - self.checked_at < Config.GRID_VERSION_CHECK_SECONDS:
+                return
+            names = sorted(name for name in database.list_collection_names()
+                           if name.endswith('_grid') or name == 'photosphere_models')
+            fingerprint = hashlib.sha1()
+            for name in names:
+                collection = database.get_collection(name)
+                newest = collection.find_one({}, {'_id': 1}, sort=[('_id', -1)])
+                fingerprint.update(f"{name}:{collection.estimated_document_count()}:{newest['_id'] if newest else None};".encode())
+            self.collections = set(names)
+            self.version = fingerprint.hexdigest()[:16]
+            self.checked_at = time.time()
+
+    def get_version(self):
+        """Returns the current grid version string."""
+        self.refresh()
+        return self.version
+
+    def has_collection(self, name):
+        """Returns if a grid collection (e.g. m0_grid) exists, without listing the collections on every call."""
+        self.refresh()
+        return name in self.collections
+
+
+grid_version = GridVersion()
+
+
+def get_grid_version():
+    """Returns the current PEGASUS grid version string."""
+    return grid_version.get_version()
@@ -0,0 +1,101 @@
+# HTTP CACHING (ETAGS, CACHE-CONTROL, AND 304 RESPONSES)
+import hashlib
+import functools
+from datetime import datetime, timezone
+from flask import request, make_response
+from euv_spectra_app.config import Config
+from euv_spectra_app.helpers_stream import wants_ndjson
+
+
+def params_only():
+    """Version for routes whose answer only depends on the request (pure calculations, immutable files)."""
+    return ''
+
+
+def make_etag(*parts):
+    """Returns a deterministic ETag value for the given parts (request parameters, data versions, ...)."""
+    return hashlib.sha1(repr(parts).encode()).hexdigest()
+
+
+def request_etag(version):
+    """Returns the ETag of the current request: its endpoint and parameters plus the data version."""
+    return make_etag(request.endpoint, sorted(request.view_args.items()), sorted(request.args.items(multi=True)), version)
+
+
+def is_not_modified(etag=None, last_modified=None):
+    """Returns if the client's cached copy is still current (If-None-Match, else If-Modified-Since)."""
+    if request.if_none_match:
+        # weak comparison, compressed responses carry the weak form of the ETag
+        return etag is not None and request.if_none_match.contains_weak(etag)
+    if request.if_modified_since and last_modified is not None:
+        return last_modified.replace(microsecond=0) <= request.if_modified_since
+    return False
+
+
+def apply_cache_headers(response, policy, etag=None, last_modified=None, weak=False):
+    """Sets the Cache-Control of a policy (see HTTP_CACHE_CONTROL in config) and the validators on a response."""
+    response.headers['Cache-Control'] = Config.HTTP_CACHE_CONTROL[policy]
+    if etag is not None:
+        response.set_etag(etag, weak=weak)
+    if last_modified is not None:
+        response.last_modified = last_modified
+    return response
+
+
+def not_modified(policy, etag=None, last_modified=None, weak=False):
+    """Returns an empty 304 response with the same caching headers as the full response."""
+    return apply_cache_headers(make_response('', 304), policy, etag, last_modified, weak)
+
+
+def is_error_body(body):
+    """Checks if a response body is an error message. The routes answer errors as a JSON string (often with a 200),
+    and every successful answer is a JSON object, list, or number."""
+    return body.lstrip()[:1] == b'"'
+
+
+def http_cache(policy, version=None):
+    """Adds HTTP caching to a GET route.
+
+    Args:
+        policy: The Cache-Control policy name (HTTP_CACHE_CONTROL in config), e.g. 'grid',
+            'spectra', or 'catalog'.
+        version: A function returning the version of the data the route answers from, e.g.
+            get_grid_version. The ETag is then derived from the request parameters and the
+            version before the route runs, so a matching If-None-Match is answered with a 304
+            without doing any work. Without a version the ETag is a hash of the response body,
+            which still saves the transfer but not the work.
+
+    Only successful GET and HEAD responses are cached, and a route can opt a response out by
+    setting its own Cache-Control. Error messages answered with a 200 (see is_error_body) are
+    marked no-store, so a typo or an upstream outage is not kept by browsers and proxies.
+    Streamed (NDJSON) requests are not cached, and the cached responses vary on Accept, so a
+    cache never answers a streaming client with JSON.
+    """
+    def decorator(view):
+        @functools.wraps(view)
+        def wrapper(*args, **kwargs):
+            if request.method not in ('GET', 'HEAD') or wants_ndjson():
+                return view(*args, **kwargs)
+            etag = request_etag(version()) if version is not None else None
+            if etag is not None and is_not_modified(etag):
+                response = not_modified(policy, etag)
+                response.vary.add('Accept')
+                return response
+            response = make_response(view(*args, **kwargs))
+            if response.status_code != 200 or response.is_streamed or 'Cache-Control' in response.headers:
+                # errors, streams, and responses that set their own caching are left alone
+                return response
+            if is_error_body(response.get_data()):
+                return apply_cache_headers(response, 'error')
+            if etag is None:
+                etag = make_etag(response.get_data())
+            apply_cache_headers(response, policy, etag)
+            response.vary.add('Accept')
+            return response.make_conditional(request)
+        return wrapper
+    return decorator
+
+
+def file_last_modified(*mtimes):
+    """Returns the newest of some file modification times (os.path.getmtime) as a datetime."""
+    return datetime.fromtimestamp(max(mtimes), tz=timezone.utc)
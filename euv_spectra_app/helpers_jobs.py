@@ -0,0 +1,220 @@
+import time
+import uuid
+import threading
+from datetime import datetime, timedelta
+from concurrent.futures import ThreadPoolExecutor
+from pymongo import ReturnDocument
+from euv_spectra_app.config import Config
+from euv_spectra_app.extensions import jobs, job_results
+
+# Bounded pool shared by the batch jobs of this worker
+executor = ThreadPoolExecutor(max_workers=Config.JOB_WORKERS, thread_name_prefix='job')
+# Small pool of the search form jobs, so a user's search never queues behind the targets of a batch
+search_executor = ThreadPoolExecutor(max_workers=Config.SEARCH_JOB_WORKERS, thread_name_prefix='search-job')
+
+_indexes_created = False
+
+# the unfinished jobs run by this worker, their leases are renewed by the heartbeat thread
+_owned_jobs = set()
+_owned_jobs_lock = threading.Lock()
+_heartbeat_started = False
+
+ORPHANED_JOB_ERROR = 'The worker running this job stopped before it finished. Please submit it again.'
+
+
+def ensure_job_indexes():
+    """Creates the TTL indexes that remove old jobs and their results, and the index used to page through results."""
+    global _indexes_created
+    if not _indexes_created:
+        jobs.create_index('expires_at', expireAfterSeconds=0)
+        job_results.create_index('expires_at', expireAfterSeconds=0)
+        job_results.create_index([('job_id', 1), ('_id', 1)])
+        jobs.create_index([('status', 1), ('lease_until', 1)])
+        _indexes_created = True
+
+
+"""——————————————————————————————JOB LEASES——————————————————————————————"""
+
+def start_job_heartbeat():
+    """Starts the thread that renews the leases of the jobs this worker runs (once per worker).
+
+    A job whose lease runs out was left unfinished by a worker that died (for example killed
+    by a timeout), and is marked as failed by fail_orphaned_jobs.
+    """
+    global _heartbeat_started
+    with _owned_jobs_lock:
+        if _heartbeat_started:
+            return
+        _heartbeat_started = True
+    threading.Thread(target=run_job_heartbeat, name='job-heartbeat', daemon=True).start()
+
+
+def run_job_heartbeat():
+    """Renews the leases of this worker's jobs and fails orphaned jobs, every third of the lease."""
+    while True:
+        time.sleep(Config.JOB_LEASE_SECONDS / 3)
+        try:
+            with _owned_jobs_lock:
+                owned = list(_owned_jobs)
+            if owned:
+                jobs.update_many({'_id': {'$in': owned}, 'status': {'$in': ['queued', 'running']}},
+                                 {'$set': {'lease_until': time.time() + Config.JOB_LEASE_SECONDS}})
+            fail_orphaned_jobs()
+        except Exception as e:
+            print(f'Job heartbeat error: {e}')
+
+
+def release_job(job_id):
+    """Stops renewing the lease of a job this worker no longer runs."""
+    with _owned_jobs_lock:
+        _owned_jobs.discard(job_id)
+
+
+def fail_orphaned_jobs(job_id=None):
+    """Marks the unfinished jobs whose lease ran out as failed.
+
+    Args:
+        job_id: Only check this job (all jobs by default).
+
+    Returns:
+        The number of jobs marked as failed.
+    """
+    query = {'status': {'$in': ['queued', 'running']}, 'lease_until': {'$lt': time.time()}}
+    if job_id is not None:
+        query['_id'] = job_id
+    result = jobs.update_many(query, {'$set': {'status': 'failed', 'error': ORPHANED_JOB_ERROR, 'updated_at': time.time()}})
+    return result.modified_count
+
+
+def new_job_id():
+    """Returns a new random job id."""
+    return uuid.uuid4().hex
+
+
+def create_job(job_type, total, params=None, job_id=None):
+    """Creates a job document that tracks the progress of a background job.
+
+    Jobs are stored in the jobs collection so their progress can be polled from any worker.
+    The job is run by the calling worker, which keeps renewing its lease until it finishes.
+
+    Args:
+        job_type: The kind of job (e.g. 'resolve').
+        total: The number of items the job will process.
+        params: Optional plain dict of the job input, kept for reference.
+        job_id: Optional id for the job, from new_job_id(). A new one is made by default.
+
+    Returns:
+        The job id.
+    """
+    ensure_job_indexes()
+    job_id = job_id or new_job_id()
+    now = time.time()
+    if total > 0:
+        with _owned_jobs_lock:
+            _owned_jobs.add(job_id)
+        start_job_heartbeat()
+    jobs.insert_one({
+        '_id': job_id,
+        'type': job_type,
+        'status': 'queued' if total > 0 else 'done',
+        'total': total,
+        'completed': 0,
+        'failed': 0,
+        'params': params,
+        'created_at': now,
+        'updated_at': now,
+        'lease_until': now + Config.JOB_LEASE_SECONDS,
+        'expires_at': datetime.utcnow() + timedelta(seconds=Config.JOB_RESULT_TTL)})
+    return job_id
+
+
+def mark_job_running(job_id):
+    """Marks a queued job as running."""
+    jobs.update_one({'_id': job_id, 'status': 'queued'}, {'$set': {'status': 'running', 'updated_at': time.time()}})
+
+
+def update_job(job_id, **fields):
+    """Sets extra progress fields on a job (for example the current step of a search job)."""
+    fields['updated_at'] = time.time()
+    jobs.update_one({'_id': job_id}, {'$set': fields})
+
+
+def record_job_result(job_id, index, item, result, failed=False):
+    """Stores the result of one item of a job and counts it towards the job progress.
+
+    The job is marked done when its last item is recorded.
+
+    Returns:
+        The updated job document.
+    """
+    job_results.insert_one({
+        'job_id': job_id,
+        'index': index,
+        'item': item,
+        'result': result,
+        'failed': failed,
+        'expires_at': datetime.utcnow() + timedelta(seconds=Config.JOB_RESULT_TTL)})
+    job = jobs.find_one_and_update(
+        {'_id': job_id},
+        {'$inc': {'completed': 1, 'failed': 1 if failed else 0}, '$set': {'updated_at': time.time()}},
+        return_document=ReturnDocument.AFTER)
+    if job is not None and job['completed'] >= job['total']:
+        jobs.update_one({'_id': job_id}, {'$set': {'status': 'done'}})
+        job['status'] = 'done'
+        release_job(job_id)
+    return job
+
+
+def get_job(job_id):
+    """Returns the progress of a job as a plain dict, or None if there is no such job.
+
+    An unfinished job whose lease ran out is marked as failed first (status 'failed', with
+    the reason under error).
+    """
+    job = jobs.find_one({'_id': job_id}, {'params': 0, 'expires_at': 0})
+    if job is None:
+        return None
+    if job['status'] in ('queued', 'running') and job.get('lease_until', float('inf')) < time.time():
+        if fail_orphaned_jobs(job_id):
+            job.update(status='failed', error=ORPHANED_JOB_ERROR)
+    job['job_id'] = job.pop('_id')
+    job['progress'] = job['completed'] / job['total'] if job['total'] else 1.0
+    return job
+
+
+def get_job_results(job_id, offset=0, limit=100):
+    """Returns a page of the recorded results of a job, in the order they finished."""
+    rows = job_results.find({'job_id': job_id}, {'_id': 0, 'job_id': 0, 'expires_at': 0}).sort('_id', 1).skip(offset).limit(limit)
+    return list(rows)
+
+
+def follow_job_results(job_id, offset=0, interval=None):
+    """Yields the results of a job from offset on as they are recorded, until the job is done or failed.
+
+    Polls job_results every JOB_FOLLOW_INTERVAL seconds. The job status is read before each
+    poll, so the last poll, after the job finished, yields every result recorded before it.
+    Results are told apart by their index, so one recorded out of _id order (by a pool thread
+    that inserted late) is still yielded once.
+
+    Args:
+        job_id: The id of the job.
+        offset: The number of results to skip, in the order they finished.
+        interval: Seconds between polls (JOB_FOLLOW_INTERVAL by default).
+    """
+    interval = interval or Config.JOB_FOLLOW_INTERVAL
+    seen = set()
+    skip = offset
+    while True:
+        job = get_job(job_id)
+        finished = job is None or job['status'] in ('done', 'failed')
+        rows = job_results.find({'job_id': job_id, 'index': {'$nin': list(seen)}},
+                                {'_id': 0, 'job_id': 0, 'expires_at': 0}).sort('_id', 1)
+        for row in rows:
+            seen.add(row['index'])
+            if skip > 0:
+                skip -= 1
+                continue
+            yield row
+        if finished:
+            return
+        time.sleep(interval)
@@ -0,0 +1,63 @@
+import time
+import uuid
+from pymongo.errors import DuplicateKeyError
+from euv_spectra_app.extensions import locks
+
+
+def acquire_lock(name, lease_seconds, token=None):
+    """Tries to take a named lock shared by every worker and container.
+
+    The lock is a document in the locks collection with a lease, so a lock held by a
+    worker that died is released once the lease runs out.
+
+    Args:
+        name: The name of the lock.
+        lease_seconds: How long the lock is held if it is not released.
+        token: Optional token to hold the lock with (a random one by default). Other workers
+            can read it with get_lock_holder, e.g. to find the job that holds the lock.
+
+    Returns:
+        A token to release the lock with, or None if the lock is held by someone else.
+    """
+    now = time.time()
+    token = token or uuid.uuid4().hex
+    try:
+        # Matches only an expired lock. If the lock is free the upsert inserts it, and if it
+        # is held the upsert collides with the existing _id.
+        locks.find_one_and_update(
+            {'_id': name, 'lease_until': {'$lt': now}},
+            {'$set': {'token': token, 'lease_until': now + lease_seconds}},
+            upsert=True)
+        return token
+    except DuplicateKeyError:
+        return None
+
+
+def release_lock(name, token):
+    """Releases a named lock if it is still held with the given token."""
+    locks.delete_one({'_id': name, 'token': token})
+
+
+def is_locked(name):
+    """Checks if a named lock is currently held."""
+    return locks.count_documents({'_id': name, 'lease_until': {'$gte': time.time()}}, limit=1) > 0
+
+
+def get_lock_holder(name):
+    """Returns the token a named lock is currently held with, or None if it is free."""
+    lock = locks.find_one({'_id': name, 'lease_until': {'$gte': time.time()}}, {'token': 1})
+    return lock['token'] if lock else None
+
+
+def wait_for_unlock(name, timeout, interval=0.5):
+    """Waits until a named lock is free or the timeout (seconds) is over.
+
+    Returns:
+        True if the lock was released, False if the timeout ran out first.
+    """
+    deadline = time.time() + timeout
+    while is_locked(name):
+        if time.time() >= deadline:
+            return False
+        time.sleep(interval)
+    return True
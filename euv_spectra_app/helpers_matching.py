@@ -0,0 +1,588 @@
+# FOR MATCHING A STELLAR OBJECT TO PEGASUS MODELS (the results page), AND CACHING THE RESULTS
+import os
+import itertools
+import json
+import hashlib
+from datetime import datetime, timedelta
+from bson.binary import Binary
+from euv_spectra_app.config import Config
+from euv_spectra_app.extensions import result_cache
+from euv_spectra_app.models import StellarObject, GalexFluxes, PegasusGrid
+from euv_spectra_app.helpers import to_json, create_plotly_graph
+from euv_spectra_app.helpers_grid import grid_version, get_grid_version
+from euv_spectra_app.helpers_session import stellar_object_from_dict, link_fluxes
+from euv_spectra_app.helpers_dbqueries import get_matching_subtype
+from euv_spectra_app.helpers_spectra import spectra
+from euv_spectra_app.helpers_compression import gzip_compress
+from euv_spectra_app.startup import lazy_import
+
+plotly_utils = lazy_import('plotly.utils')
+
+'''———————————FOR TESTING PURPOSES (Test file)——————————'''
+# original test filename is M0.Teff=3850.logg=4.78.TRgrad=9.cmtop=6.cmin=4.fits
+TEST_FILEPATHS = [
+    os.path.abspath("euv_spectra_app/fits_files/test/original_test.fits"),
+    os.path.abspath("euv_spectra_app/fits_files/test/new_test.fits"),
+    os.path.abspath("euv_spectra_app/fits_files/test/new_test_0.fits"),
+    os.path.abspath("euv_spectra_app/fits_files/test/new_test_1.fits"),
+    os.path.abspath("euv_spectra_app/fits_files/test/new_test_2.fits"),
+    os.path.abspath("euv_spectra_app/fits_files/test/new_test_3.fits"),
+    os.path.abspath("euv_spectra_app/fits_files/test/new_test_4.fits"),
+    os.path.abspath("euv_spectra_app/fits_files/test/new_test_5.fits"),
+    os.path.abspath("euv_spectra_app/fits_files/test/new_test_6.fits"),
+    os.path.abspath("euv_spectra_app/fits_files/test/new_test_7.fits")
+]
+TEST_FILEPATH_NAMES = [
+    "original_test.fits", "new_test.fits", "new_test_0.fits", "new_test_1.fits",
+    "new_test_2.fits", "new_test_3.fits", "new_test_4.fits", "new_test_5.fits",
+    "new_test_6.fits", "new_test_7.fits"
+]
+"""———————————END TEST FILE DATA——————————"""
+
+# The stellar object fields the results depend on (the names are shown on the page)
+RESULT_INPUT_FIELDS = ('star_name', 'position', 'teff', 'logg', 'mass', 'dist', 'rad')
+RESULT_FLUX_INPUT_FIELDS = GalexFluxes.FLUX_FIELDS + GalexFluxes.ERROR_FIELDS + GalexFluxes.FLAG_FIELDS
+
+# The stellar parameters /api/match needs, and the flags a GALEX flux can have (as on the manual form)
+MATCH_PARAMETERS = ('teff', 'logg', 'mass', 'dist', 'rad')
+FLUX_FLAGS = ('normal', 'null', 'saturated', 'upper_limit')
+
+_indexes_created = False
+
+
+def ensure_result_cache_indexes():
+    """Creates the TTL index that removes results nobody viewed for RESULT_CACHE_TTL."""
+    global _indexes_created
+    if not _indexes_created:
+        result_cache.create_index('expires_at', expireAfterSeconds=0)
+        _indexes_created = True
+
+
+def match_models(stellar_object, subtype=None, plot=True):
+    """Runs the PEGASUS model search for a stellar object with all stellar parameters.
+
+    Processes the GALEX fluxes, finds the model subtype, searches the subtype's grid with
+    every combination of the processed FUV and NUV values, and builds the plot of the
+    matching models.
+
+    Args:
+        stellar_object: The stellar object, with all stellar parameters and its GALEX fluxes.
+        subtype: The matching model_parameter_grid document, if it was already looked up
+            (e.g. for the stellar subtype used by the flux predictions).
+        plot: If the plot of the matching models is built (graph_json is None otherwise).
+
+    Side Effects:
+        Sets the processed fluxes and model subtype of the stellar object.
+
+    Returns:
+        A dict with graph_json, matching_models, messages (a list of (message, category)
+        to flash), photosphere (the photosphere model subtracted from the fluxes), and
+        searches (for each FUV-NUV pair searched, the fluxes, the search tier that found
+        models, and the models), or a dict with an error message if the subtype's grid is
+        not available.
+    """
+    # STEP 2: Prepare GALEX fluxes for searching the grid
+    photosphere = stellar_object.fluxes.convert_scale_photosphere_subtract_fluxes()
+
+    # STEP 3: Create new PegasusGrid object and insert the stellar object with corrected fluxes
+    pegasus = PegasusGrid(stellar_object)
+
+    # STEP 4: Search the model_parameter_grid collection to find closest matching stellar subtype
+    if subtype is None:
+        subtype = pegasus.query_pegasus_subtype()
+    else:
+        stellar_object.model_collection = f"{subtype['model'].lower()}_grid"
+    stellar_object.model_subtype = subtype['model']
+    print('SUBTYPE', stellar_object.model_subtype)
+
+    # STEP 5: Check if model subtype data exists in database
+    model_collection = f'{stellar_object.model_subtype.lower()}_grid'
+    if not grid_version.has_collection(model_collection):
+        error_msg = f'The grid for model subtype {stellar_object.model_subtype} is currently unavailable. \
+                      Currently available subtypes: M0, M3, M4, M6. \nPlease contact us with your stellar \
+                      parameters and returned subtype if you think this is incorrect.'
+        return {'error': error_msg}
+
+    # STEP 6: Instantiate the following objects
+    messages = [] # (message, category) pairs to flash on the results page
+    plot_data = {}  # Dict to hold all data to plot
+    using_test_data = False # Bool to determine if we are using test data
+    model_index = 0  # Instantiating model index
+    return_models = [] # Instantiating list to hold all returned models
+    searches = [] # The fluxes, search tier, and models of each FUV-NUV pair searched
+
+    # STEP 7: Add the GALEX fluxes to plot data
+    for flux in ['fuv', 'nuv']:
+        key = f'galex_{flux}'
+        plot_data[key] = {'name': f'GALEX Processed {flux.upper()}'}
+        if flux == 'fuv':
+            plot_data[key]['wavelength'] = 1542
+        elif flux == 'nuv':
+            plot_data[key]['wavelength'] = 2315
+        err = getattr(stellar_object.fluxes, f'{flux}_err')
+        if getattr(stellar_object.fluxes, f'{flux}_is_saturated'):
+            plot_data[key]['name'] += '<br>(Saturated)'
+            plot_data[key]['flux_density'] = getattr(stellar_object.fluxes, f'processed_{flux}_saturated')
+            plot_data[key]['flag'] = 'saturated'
+        elif getattr(stellar_object.fluxes, f'{flux}_is_upper_limit'):
+            plot_data[key]['name'] += '<br>(Upper Limit)'
+            plot_data[key]['flux_density'] = getattr(stellar_object.fluxes, f'processed_{flux}_upper_limit')
+            plot_data[key]['flag'] = 'upper_limit'
+        else:
+            plot_data[key]['flux_density'] = getattr(stellar_object.fluxes, f'processed_{flux}')
+            if err is not None:
+                plot_data[key]['flux_density_err'] = err
+
+    # STEP 8: Get all possible searchable values of FUV and NUV from the GalexFluxes object
+    fuv_dict = {} # Dict to hold all FUV values
+    nuv_dict = {} # Dict to hold all NUV values
+    for key in GalexFluxes.PROCESSED_FIELDS:
+        val = getattr(stellar_object.fluxes, key)
+        if val is not None: # Only use processed fluxes that were set
+            flux = None
+            # Get which flux (FUV or NUV) if it is a value and is not an error value
+            if 'fuv' in key and 'err' not in key:
+                flux = 'fuv'
+            elif 'nuv' in key and 'err' not in key:
+                flux = 'nuv'
+            if flux is not None:
+                # If the key is a valid flux value, assign the data to the corresponding dict
+                flux_dict = locals().get(f'{flux}_dict') # Get the dictionary dynamically
+                flux_dict[key] = {'value': val} # Add the value of the flux
+                flux_dict[key]['error'] = None # Set the error as None by default
+                # Add flags and error if it exists
+                if key == f'processed_{flux}' and getattr(stellar_object.fluxes, f'processed_{flux}_err') is not None:
+                    # If there is an error, this means it is a normal flux. Add flag and error
+                    flux_dict[key]['error'] = getattr(stellar_object.fluxes, f'processed_{flux}_err')
+                    flux_dict[key]['flag'] = 'normal'
+                elif 'saturated' in key:
+                    # If it is saturated, add flag
+                    flux_dict[key]['flag'] = 'saturated'
+                elif 'upper_limit' in key:
+                    # If it is upper limit, add flag
+                    flux_dict[key]['flag'] = 'upper_limit'
+                else:
+                    # If it is none of these, means it is normal flux w/o error (detection only)
+                    flux_dict[key]['flag'] = 'detection_only'
+
+    # STEP 9: Get all possible combinations of fuv-nuv pairs. These are the pairs of fluxes that will be 
+    # used for PEGASUS grid searches.
+    key_pairs = list(itertools.product(list(fuv_dict), list(nuv_dict)))
+    # STEP 10: Iterate over each pair and run PEGASUS grid search on each pair
+    for fuv_key, nuv_key in key_pairs:
+        # STEP 10.1: Retrieve the fuv and nuv values using the keys from the dictionaries
+        fuv_value = fuv_dict[fuv_key]
+        nuv_value = nuv_dict[nuv_key]
+        print(f'SEARCHING USING FUV: {fuv_value}, NUV:{nuv_value}')
+        # STEP 10.2: Call the search_db function with the fuv and nuv values
+        models = pegasus.query_model_collection(fuv_value, nuv_value)
+        # The search tier that found the models: within_limits, within_3_sigma, within_5_sigma,
+        # lowest_chi_squared, weighted_fuv, or closest_match
+        tier = 'within_limits'
+        # STEP 10.3: Do additional processing on the returned models depending on the flag
+        # SATURATED/UPPER LIMIT WORK FLOW:
+            # If one val is saturated/upper limit and one val is normal and no models are returned,
+            # will need to increase error bars of normal flux by 3 sigma, then by 5 sigma
+            # If both fluxes are an upper limit or saturated value, just return the model with the 
+            # lowest chi-squared value (which will be the first model because they are already sorted)
+        if (fuv_value['flag'] == 'saturated' or fuv_value['flag'] == 'upper_limit') and nuv_value['flag'] == 'normal':
+            # For saturated/upper limit FUV flux and a normal NUV flux
+            # _ results found within upper and lower limits of the GALEX NUV flux and upper limits of GALEX FUV (upper limit)
+            if len(models) > 0:
+                messages.append((f'{len(models)} results found within the upper and lower limits of your submitted UV fluxes.', 'success'))
+            if len(models) == 0:
+                print('NO MODELS FOUND IN FIRST SAT SEARCH, GROWING BARS BY 3')
+                # grow nuv error bars by three
+                nuv_copy = nuv_value.copy()
+                nuv_copy['error'] = nuv_copy['error'] * 3
+                models = pegasus.query_model_collection(
+                    fuv_value, nuv_copy)
+                if len(models) > 0:
+                    tier = 'within_3_sigma'
+                    messages.append((f'{len(models)} results found within 3 σ of the GALEX NUV flux.', 'success'))
+            if len(models) == 0:
+                print('NO MODELS FOUND IN FIRST SAT SEARCH, GROWING BARS BY 5')
+                # grow nuv error bars by five
+                nuv_copy = nuv_value.copy()
+                nuv_copy['error'] = nuv_copy['error'] * 5
+                models = pegasus.query_model_collection(
+                    fuv_value, nuv_copy)
+                if len(models) > 0:
+                    tier = 'within_5_sigma'
+                    messages.append((f'{len(models)} results found within 5 σ of the GALEX NUV flux.', 'success'))
+            if len(models) == 0:
+                # if there are still no models, flash error
+                messages.append(('No models found within 5 σ of the GALEX NUV flux measurements.', 'danger'))
+        elif (nuv_value['flag'] == 'saturated' or nuv_value['flag'] == 'upper_limit') and fuv_value['flag'] == 'normal':
+            # For saturated/upper limit NUV flux and a normal FUV flux
+            if len(models) > 0:
+                messages.append((f'{len(models)} results found within the upper and lower limits of your submitted UV fluxes.', 'success'))
+            if len(models) == 0:
+                # grow fuv error bars by three
+                print('NO MODELS FOUND IN FIRST UPPER LIM SEARCH, GROWING BARS BY 3')
+                fuv_copy = fuv_value.copy()
+                fuv_copy['error'] = fuv_copy['error'] * 3
+                models = pegasus.query_model_collection(
+                    fuv_copy, nuv_value)
+                if len(models) > 0:
+                    tier = 'within_3_sigma'
+                    messages.append((f'{len(models)} results found within 3 σ of the GALEX FUV flux.', 'success'))
+            if len(models) == 0:
+                # grow fuv error bars by three
+                print('NO MODELS FOUND IN FIRST UPPER LIM SEARCH, GROWING BARS BY 5')
+                fuv_copy = fuv_value.copy()
+                fuv_copy['error'] = fuv_copy['error'] * 5
+                models = pegasus.query_model_collection(
+                    fuv_copy, nuv_value)
+                if len(models) > 0:
+                    tier = 'within_5_sigma'
+                    messages.append((f'{len(models)} results found within 5 σ of the GALEX FUV flux.', 'success'))
+            if len(models) == 0:
+                # if there are still no models, flash error
+                messages.append(('No models found within 5 σ of the GALEX FUV flux measurements.', 'danger'))
+        elif (fuv_value['flag'] == 'saturated' or nuv_value['flag'] == 'saturated') and (fuv_value['flag'] == 'upper_limit' or nuv_value['flag'] == 'upper_limit'):
+            # return first model (lowest chi-squared value)
+            if len(models) > 0:
+                messages.append((f'{len(models)} results found within upper and lower limits of GALEX UV fluxes. Returning model with lowest chi-squared value.', 'success'))
+                models = [models[0]]
+                tier = 'lowest_chi_squared'
+            else:
+                messages.append(('No results found within GALEX UV fluxes.', 'danger'))
+        elif (fuv_value['flag'] == 'saturated' and nuv_value['flag'] == 'saturated'):
+            if len(models) > 0:
+                messages.append((f'{len(models)} results found within GALEX UV fluxes. Returning model with lowest chi-squared value.', 'success'))
+                models = [models[0]]
+                tier = 'lowest_chi_squared'
+            else:
+                messages.append(('No results found within GALEX UV fluxes.', 'danger'))
+        elif (fuv_value['flag'] == 'upper_limit' and nuv_value['flag'] == 'upper_limit'):
+            if len(models) > 0:
+                messages.append((f'{len(models)} results found within GALEX UV fluxes. Returning model with lowest chi-squared value.', 'success'))
+                models = [models[0]]
+                tier = 'lowest_chi_squared'
+            else:
+                messages.append(('No results found within GALEX UV fluxes.', 'danger'))
+        # DETECTION ONLY WORKFLOW
+            # The models will be sorted by the diff_flux field, so the first model will have the closest 
+            # value to the given detection. Just return the first model.
+        if fuv_value['flag'] == 'detection_only' or nuv_value['flag'] == 'detection_only':
+            if len(models) > 0: # Check if there are returned models first
+                models = [models[0]]
+                tier = 'closest_match'
+                messages.append(('Returning closest match to GALEX UV fluxes.', 'warning'))
+            else:
+                messages.append(('No results found within GALEX UV fluxes.', 'danger'))
+        # NORMAL WORKFLOW
+            # If no models are found within the error bars of the given fluxes,
+            # search for models weighted on the FUV. If no models are returned 
+            # weighted on FUV, just return models with lowest chi squared value.
+        if fuv_value['flag'] == 'normal' and nuv_value['flag'] == 'normal':
+            if len(models) == 0:
+                # Do chi squared test between all models within selected subgrid and corrected observation
+                models_with_chi_squared = pegasus.query_pegasus_chi_square()
+                # If there are no models found within limits, return models ONLY with FUV < NUV, return with chi squared values
+                models_weighted = pegasus.query_pegasus_weighted_fuv()
+                if len(models_weighted) > 0:
+                    # If there are weighted results, use those
+                    messages.append(('No results found within upper and lower limits of UV fluxes. Returning document with nearest chi squared value weighted towards the FUV.', 'warning'))
+                    models = [models_weighted[0]]
+                    tier = 'weighted_fuv'
+                else:
+                    # If no weighted results, just use model with lowest chi squared
+                    messages.append(('No results found within upper and lower limits of UV fluxes. No model found with a close FUV match. Returning model with lowest chi-square value.', 'warning'))
+                    models = [models_with_chi_squared[0]]
+                    tier = 'lowest_chi_squared'
+            else:
+                messages.append((f'{len(models)} results found within the upper and lower limits of your submitted UV fluxes.', 'success'))
+        # STEP 11: After getting models for this search, we need to add each model to the plot data and 
+        # add any flags the models may have.
+        # Flags include:
+            # If there are saturated fluxes and this is a saturated search, add saturated option A flag
+            # If there are upper limit fluxes and this is a upper limit search, add upper limit option A flag
+            # If there are saturated fluxes and this is a normal search, add saturated option B flag
+            # If there are upper limit fluxes and this is a normal search, add upper limit option B flag
+            # If there are both saturated and upper limit fluxes, add saturated and upper limit option A flag
+        # STEP 11.1: Append all models to the return models list for return table
+        return_models += models
+        searches.append({'fuv': fuv_value, 'nuv': nuv_value, 'tier': tier if len(models) > 0 else None, 'models': models})
+        # STEP 11.2: Iterate over each model returned and add data and flag (if applicable)
+        for doc in models:
+            # for each matching model that comes back, get the filepath so we can check if it exists later
+            filepath = os.path.abspath(
+                f"euv_spectra_app/fits_files/{stellar_object.model_subtype}/{doc['fits_filename']}")
+            key = f'model_{model_index}'
+            plot_data[key] = {'index': model_index, # Add index for num tracking on return page
+                              'nuv': doc['nuv'], # Add NUV flux
+                              'fuv': doc['fuv'], # Add FUV flux
+                              'euv': doc['euv']} # Add EUV flux
+            model_index += 1 # After adding the model, increment the index
+            # Check if the model's filepath exists, if not use a test file
+            if os.path.exists(filepath):
+                # if the filepath exists, add to plot data
+                plot_data[key]['filepath'] = filepath
+            else:
+                # else if the filepath doesn't exist, add a test file
+                '''——————FOR TESTING PURPOSES (if FITS file is not yet available)—————'''
+                plot_data[key]['filepath'] = TEST_FILEPATHS[model_index-1]
+                # set using test data to True so test flash message will be sent to return template
+                using_test_data = True
+            # Now add the flag if there is one.
+            if (stellar_object.fluxes.fuv_is_saturated or stellar_object.fluxes.nuv_is_saturated) and (stellar_object.fluxes.fuv_is_upper_limit or stellar_object.fluxes.nuv_is_upper_limit):
+                # If there are both saturated and upper limit fluxes, add saturated and upper limit option A flag
+                plot_data[key]['flag'] = 'Saturated and Upper Limit<br> Search Option A<sup>[5]</sup>'
+            elif (stellar_object.fluxes.fuv_is_saturated or stellar_object.fluxes.nuv_is_saturated):
+                # If there are saturated fluxes and this is a saturated search, add saturated option A flag
+                if (fuv_value['flag'] == 'saturated' or nuv_value['flag'] == 'saturated'):
+                    plot_data[key]['flag'] = 'Saturated Search<br> Option A<sup>[5]</sup>'
+                # If there are saturated fluxes and this is a normal search, add saturated option B flag
+                if (fuv_value['flag'] == 'normal' and nuv_value['flag'] == 'normal'):
+                    plot_data[key]['flag'] = 'Saturated Search<br> Option B<sup>[5]</sup>'
+            elif (stellar_object.fluxes.fuv_is_upper_limit or stellar_object.fluxes.nuv_is_upper_limit):
+                # If there are upper limit fluxes and this is a upper limit search, add upper limit option A flag
+                if (fuv_value['flag'] == 'upper_limit' or nuv_value['flag'] == 'upper_limit'):
+                    plot_data[key]['flag'] = 'Upper Limit Search<br> Option A<sup>[5]</sup>'
+                # If there are upper limit fluxes and this is a normal search, add upper limit option B flag
+                if (fuv_value['flag'] == 'normal' and nuv_value['flag'] == 'normal'):
+                    plot_data[key]['flag'] = 'Upper Limit Search<br> Option B<sup>[5]</sup>'
+    # STEP 12: Generate plot using the compiled data
+    graph_json = None
+    if plot:
+        plotly_fig = create_plotly_graph(plot_data)
+        graph_json = json.dumps(
+            plotly_fig, cls=plotly_utils.PlotlyJSONEncoder)
+    # STEP 13: If using test data, add a message so user knows that test data is being used
+    if using_test_data == True:
+        messages.append(('EUV data not available yet, using test data for viewing purposes. Please contact us for more information.', 'danger'))
+    return {'graph_json': graph_json, 'matching_models': return_models, 'messages': messages, 'photosphere': photosphere, 'searches': searches}
+
+
+def get_number(params, name, required=False):
+    """Returns a numerical parameter as a float, or None if it is missing and not required.
+
+    Raises:
+        ValueError if the parameter is required and missing, or non-numerical.
+    """
+    value = params.get(name)
+    if value is None or value == '':
+        if required:
+            raise ValueError(f'Value for {name} is needed to search the PEGASUS grid. Please include this argument and try again.')
+        return None
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        raise ValueError(f'Value of {name} is non-numerical. Please check your inputs and try again.')
+
+
+def stellar_object_from_params(params):
+    """Builds a stellar object from raw stellar parameters and GALEX fluxes, like the manual form.
+
+    Args:
+        params: A mapping (query arguments or a JSON body) with teff, logg, mass, dist
+            (parsecs), and rad, the GALEX fuv, nuv, fuv_err, and nuv_err (microjanskies), the
+            fuv_flag and nuv_flag (normal by default, null, saturated, or upper_limit), and
+            optionally star_name.
+
+    Returns:
+        The stellar object.
+
+    Raises:
+        ValueError with a message for the client if a parameter is missing or invalid.
+    """
+    stellar_object = StellarObject(star_name=params.get('star_name'))
+    for name in MATCH_PARAMETERS:
+        setattr(stellar_object, name, get_number(params, name, required=True))
+    fluxes = stellar_object.fluxes
+    for flux in ('fuv', 'nuv'):
+        flag = params.get(f'{flux}_flag') or 'normal'
+        if flag not in FLUX_FLAGS:
+            raise ValueError(f'Value of {flux}_flag must be one of {", ".join(FLUX_FLAGS)}. Please check your inputs and try again.')
+        value = get_number(params, flux)
+        err = get_number(params, f'{flux}_err')
+        if flag == 'null' or value is None:
+            # left empty, it is predicted from the other flux
+            continue
+        if flag == 'normal':
+            setattr(fluxes, flux, value)
+            # as on the manual form, an error of 0 means there is no error (a detection only)
+            setattr(fluxes, f'{flux}_err', err if err != 0 else None)
+        else:
+            setattr(fluxes, f'{flux}_{flag}', value)
+            setattr(fluxes, f'{flux}_is_{flag}', True)
+    if all(getattr(fluxes, field) is None for field in GalexFluxes.FLUX_FIELDS):
+        raise ValueError('At least one GALEX flux (fuv or nuv) is needed to search the PEGASUS grid. Please include it and try again.')
+    return stellar_object
+
+
+def match_for_api(stellar_object, include_spectra=False, stream=False):
+    """Runs the model search of the results page in one call, for /api/match.
+
+    The subtype is looked up once, and used both for the flux predictions (stellar subtype)
+    and for the grid search (model subtype). The photosphere model is looked up once for
+    every flux. No plot is built.
+
+    Args:
+        stellar_object: A stellar object from stellar_object_from_params.
+        include_spectra: If the wavelength and flux data of each model's spectrum is included.
+        stream: If the models are returned as a generator (see iter_ranked_models), so they
+            can be streamed without holding every spectrum in memory.
+
+    Returns:
+        A JSON serializable dict with the subtype, the photosphere model, the processed fluxes,
+        each search (its fluxes, tier, and model count), the ranked models (in the order of the
+        results page, with the search tier that found them), and the messages of the results
+        page, or a dict with an error message if the subtype's grid is not available.
+    """
+    subtype = get_matching_subtype(stellar_object.teff, stellar_object.logg, stellar_object.mass)
+    stellar_object.stellar_subtype = subtype['model']
+    fluxes = link_fluxes(stellar_object).fluxes
+    messages = []
+    for check in (fluxes.check_null_fluxes, fluxes.check_saturated_fluxes, fluxes.check_upper_limit_fluxes):
+        message = check()
+        if message is not None:
+            messages.append((message, 'warning'))
+    result = match_models(stellar_object, subtype=subtype, plot=False)
+    if 'error' in result:
+        return result
+    models = iter_ranked_models(result['searches'], include_spectra)
+    photosphere = result['photosphere']
+    return {
+        'star_name': stellar_object.star_name,
+        'grid_version': get_grid_version(),
+        'subtype': {key: subtype[key] for key in ('model', 'teff', 'logg', 'mass')},
+        'photosphere': {key: photosphere.get(key) for key in ('teff', 'logg', 'mass', 'fuv', 'nuv')},
+        'processed_fluxes': {field: getattr(fluxes, field) for field in GalexFluxes.PROCESSED_FIELDS},
+        'searches': [{'fuv': search['fuv'], 'nuv': search['nuv'], 'tier': search['tier'], 'model_count': len(search['models'])}
+                     for search in result['searches']],
+        'models': models if stream else list(models),
+        'messages': [{'message': message, 'category': category} for message, category in messages + result['messages']],
+    }
+
+
+def iter_ranked_models(searches, include_spectra=False):
+    """Yields the models of the searches of match_models in the order of the results page.
+
+    Each model gets its rank (1 is the best match) and the search tier that found it, and its
+    spectrum if include_spectra (None if its FITS file is not available yet). The spectra are
+    read one model at a time, as the models are consumed.
+    """
+    rank = 0
+    for search in searches:
+        for model in search['models']:
+            rank += 1
+            entry = {key: val for key, val in model.items() if key != '_id'}
+            entry['rank'] = rank
+            entry['search_tier'] = search['tier']
+            if include_spectra:
+                entry['spectrum'] = spectra.get_spectrum_data(model['fits_filename'])
+            yield entry
+
+
+def canonical(value):
+    """Normalizes input values so equal inputs hash the same (e.g. 3850, 3850.0, and numpy floats)."""
+    if isinstance(value, dict):
+        return {key: canonical(val) for key, val in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [canonical(val) for val in value]
+    if isinstance(value, bool) or value is None or isinstance(value, str):
+        return value
+    return repr(float(value))
+
+
+def result_inputs(stellar_object):
+    """Returns the inputs of the results page for a stellar object: its parameters, fluxes, and flags."""
+    inputs = {field: getattr(stellar_object, field) for field in RESULT_INPUT_FIELDS}
+    inputs['fluxes'] = {field: getattr(stellar_object.fluxes, field) for field in RESULT_FLUX_INPUT_FIELDS}
+    return to_json(inputs)
+
+
+def result_key(inputs, version):
+    """Returns the content address of a result: a hash of its canonical inputs and the grid version."""
+    payload = json.dumps({'inputs': canonical(inputs), 'grid_version': version}, sort_keys=True, separators=(',', ':'))
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+def get_result(stellar_object):
+    """Returns the results of a stellar object, from the result cache or computed and cached.
+
+    Returns:
+        The result_cache document (its _id is the permalink hash), or a dict with an error
+        message if the results could not be computed. Errors are not cached.
+    """
+    version = get_grid_version()
+    inputs = result_inputs(stellar_object)
+    key = result_key(inputs, version)
+    cached = result_cache.find_one({'_id': key})
+    # an alias (see load_result) is only found here if the grid went back to an older version
+    if cached is not None and cached.get('moved_to') is None:
+        return cached
+    result = match_models(stellar_object)
+    if 'error' in result:
+        return result
+    stellar_data = to_json(stellar_object)
+    # the flux object keeps a copy of the stellar object, which is rebuilt on load
+    stellar_data['fluxes'].pop('stellar_obj', None)
+    now = datetime.utcnow()
+    doc = {
+        '_id': key,
+        'grid_version': version,
+        'inputs': inputs,
+        'stellar_object': stellar_data,
+        # the plot holds every model spectrum, compressed it stays well under the document size limit.
+        # gzip, so the results page's figure request is answered with the stored bytes as is
+        'graph_json': Binary(gzip_compress(result['graph_json'].encode(), Config.PRECOMPRESSION_LEVELS['gzip'])),
+        'matching_models': result['matching_models'],
+        'messages': [list(message) for message in result['messages']],
+        'created_at': now,
+        'expires_at': now + timedelta(seconds=Config.RESULT_CACHE_TTL),
+    }
+    try:
+        ensure_result_cache_indexes()
+        result_cache.replace_one({'_id': key}, doc, upsert=True)
+    except Exception as e:
+        # the page can still be shown, it just is not cached
+        print(f'Result cache write error: {e}')
+    return doc
+
+
+def keep_result(doc):
+    """Pushes back the expiry of a viewed result_cache document once it is past half of it."""
+    now = datetime.utcnow()
+    if doc['expires_at'] - now < timedelta(seconds=Config.RESULT_CACHE_TTL / 2):
+        result_cache.update_one({'_id': doc['_id']}, {'$set': {'expires_at': now + timedelta(seconds=Config.RESULT_CACHE_TTL)}})
+
+
+def load_result(key):
+    """Returns a cached result by its permalink hash.
+
+    If the grid changed since the result was computed, it is recomputed from its stored
+    inputs and cached under its new hash. The old entry is replaced by an alias
+    ({_id: old hash, moved_to: new hash}) that later loads follow, so shared permalinks
+    keep working across grid updates. The returned document's _id is then the new hash.
+
+    Returns:
+        The result_cache document, a dict with an error message, or None if there is no
+        result with this hash.
+    """
+    cached = result_cache.find_one({'_id': key})
+    # aliases chain when the grid changes more than once
+    while cached is not None and cached.get('moved_to') is not None:
+        keep_result(cached)
+        key = cached['moved_to']
+        cached = result_cache.find_one({'_id': key})
+    if cached is None:
+        return None
+    if cached['grid_version'] != get_grid_version():
+        result = get_result(stellar_object_from_dict(cached['inputs']))
+        if result.get('_id') is not None and result['_id'] != key:
+            now = datetime.utcnow()
+            result_cache.replace_one({'_id': key}, {'moved_to': result['_id'], 'created_at': now,
+                                                    'expires_at': now + timedelta(seconds=Config.RESULT_CACHE_TTL)})
+        return result
+    # viewed results are kept
+    keep_result(cached)
+    return cached
+
+
+def get_graph_gzip(result):
+    """Returns the plotly figure JSON of a cached result, gzip compressed as it is stored."""
+    return bytes(result['graph_json'])
@@ -0,0 +1,77 @@
+# MEMOIZATION FOR THE PEGASUS GRID QUERIES
+import math
+import hashlib
+import inspect
+import functools
+from euv_spectra_app.extensions import cache
+from euv_spectra_app.helpers_grid import get_grid_version
+
+# stored in place of None, so a cached None can be told apart from a miss
+_NONE = ('__memoized_none__',)
+
+
+def round_significant(value, digits):
+    """Rounds a number to significant digits (fluxes span many orders of magnitude, so decimals do not fit)."""
+    if value == 0 or not math.isfinite(value):
+        return value
+    return round(value, digits - 1 - int(math.floor(math.log10(abs(value)))))
+
+
+def memoize_query(decimals=None, significant=None, collections=()):
+    """Memoizes a grid query helper in the shared cache (extensions.cache).
+
+    The arguments are canonicalized before they are used as the key and passed to the query,
+    so inputs that only differ below the grid's precision share one entry:
+
+    Args:
+        decimals: Dict of argument name to the number of decimals to round it to.
+        significant: Dict of argument name to the number of significant digits to round it to.
+        collections: Names of arguments that are grid collection names, which are lowercased
+            (so the M0 and m0 subtypes share an entry).
+
+    The grid version is part of every key, so entries of an old grid are never used after the
+    grid changes (they are evicted by the cache's size bound and timeout). Cursors returned by
+    the query are read into lists, so they can be cached. The cache pickles values, so every
+    call gets its own copy of the result to modify. The unmemoized function is available as
+    __wrapped__.
+    """
+    decimals = decimals or {}
+    significant = significant or {}
+
+    def decorator(func):
+        signature = inspect.signature(func)
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            bound = signature.bind(*args, **kwargs)
+            bound.apply_defaults()
+            arguments = bound.arguments
+            for name, value in arguments.items():
+                if value is None:
+                    continue
+                if name in decimals:
+                    arguments[name] = round(float(value), decimals[name])
+                elif name in significant:
+                    arguments[name] = round_significant(float(value), significant[name])
+                elif name in collections:
+                    arguments[name] = str(value).strip().lower()
+            key_source = f'{func.__module__}.{func.__qualname__}:{get_grid_version()}:{sorted(arguments.items())!r}'
+            key = 'memo:' + hashlib.sha1(key_source.encode()).hexdigest()
+            try:
+                cached = cache.get(key)
+            except Exception as e:
+                print(f'Memoization cache read error: {e}')
+                cached = None
+            if cached is not None:
+                return None if cached == _NONE else cached
+            result = func(*bound.args, **bound.kwargs)
+            if result is not None and not isinstance(result, (dict, list, tuple, str, int, float)):
+                # a pymongo cursor
+                result = list(result)
+            try:
+                cache.set(key, _NONE if result is None else result)
+            except Exception as e:
+                print(f'Memoization cache write error: {e}')
+            return result
+        return wrapper
+    return decorator
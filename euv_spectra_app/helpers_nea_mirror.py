@@ -0,0 +1,200 @@
+import re
+import math
+import time
+from pymongo import ReplaceOne
+from euv_spectra_app.config import Config
+from euv_spectra_app.extensions import nea_pscomppars, mirror_state
+from euv_spectra_app.helpers_circuit_breaker import nea_breaker
+from euv_spectra_app.helpers_catalogs import to_plain_value, search_nasa_exoplanet_archive, get_nea_host_names, get_nea_client
+
+# The pscomppars columns the mirror keeps. pl_name is the row key (one row per planet) and
+# rowupdate is used to only pull rows that changed since the last refresh.
+NEA_MIRROR_COLUMNS = ['pl_name', 'hostname', 'ra', 'dec', 'st_teff', 'st_logg', 'st_mass', 'st_rad',
+                      'sy_dist', 'sy_jmag', 'st_spectype', 'disc_refname', 'rowupdate']
+NEA_MIRROR_STATE_ID = 'nea_pscomppars'
+
+_indexes_created = False
+
+
+def ensure_nea_mirror_indexes():
+    """Creates the host name and sky position indexes of the mirror."""
+    global _indexes_created
+    if not _indexes_created:
+        nea_pscomppars.create_index('hostname_key')
+        nea_pscomppars.create_index('hostname')
+        nea_pscomppars.create_index([('location', '2dsphere')])
+        _indexes_created = True
+
+
+def hostname_key(hostname):
+    """Normalizes a host name the same way user input is matched: no spaces, upper case."""
+    return hostname.upper().replace(' ', '')
+
+
+def sky_location(ra, dec):
+    """Returns a GeoJSON point for a sky position so MongoDB's spherical index can be used for cone searches.
+
+    RA is wrapped from 0 to 360 degrees into the -180 to 180 longitude range, which keeps
+    angular distances on the sphere the same.
+    """
+    return {'type': 'Point', 'coordinates': [((ra + 180) % 360) - 180, dec]}
+
+
+def mirror_row_to_nea_dict(row):
+    """Converts a mirror document into the same dict returned by a live NASA Exoplanet Archive search."""
+    return {
+        'teff': row['st_teff'],
+        'logg': row['st_logg'],
+        'mass': row['st_mass'],
+        'rad': row['st_rad'],
+        'dist': row['sy_dist'],
+        'jmag': row['sy_jmag'],
+        'spectype': row['st_spectype'],
+        'disc_refname': row['disc_refname'],
+    }
+
+
+"""——————————————————————————————MIRROR REFRESH——————————————————————————————"""
+
+def get_nea_mirror_state():
+    """Returns the sync state of the mirror (None if it has never been loaded)."""
+    return mirror_state.find_one({'_id': NEA_MIRROR_STATE_ID})
+
+
+def fetch_pscomppars_rows(since=None):
+    """Queries the NASA Exoplanet Archive for the mirrored pscomppars columns.
+
+    Args:
+        since: Only return rows updated on or after this date (YYYY-MM-DD). All rows if None.
+    """
+    criteria = {'table': 'pscomppars', 'select': ', '.join(NEA_MIRROR_COLUMNS)}
+    if since is not None:
+        criteria['where'] = f"rowupdate >= '{since}'"
+    data = nea_breaker.call(get_nea_client().query_criteria, **criteria)
+    return [{column: to_plain_value(row[column]) for column in NEA_MIRROR_COLUMNS} for row in data]
+
+
+def refresh_nea_mirror(full=False):
+    """Bulk loads or incrementally refreshes the local pscomppars mirror.
+
+    An incremental refresh only pulls rows whose rowupdate is on or after the latest
+    rowupdate already mirrored. A full refresh pulls every row and removes rows that are
+    no longer in the archive (for example retracted planets). A full refresh is also run
+    if the mirror has never been loaded or the last full refresh is older than
+    NEA_MIRROR_FULL_REFRESH_DAYS.
+
+    Returns:
+        The number of rows written.
+    """
+    ensure_nea_mirror_indexes()
+    state = get_nea_mirror_state()
+    if state is None or time.time() - state.get('last_full_sync', 0) > Config.NEA_MIRROR_FULL_REFRESH_DAYS * 86400:
+        full = True
+    sync_started = time.time()
+    rows = fetch_pscomppars_rows(None if full else state.get('last_rowupdate'))
+    operations = []
+    last_rowupdate = None if full else state.get('last_rowupdate')
+    for row in rows:
+        if row['pl_name'] is None or row['hostname'] is None:
+            continue
+        row['_id'] = row.pop('pl_name')
+        row['hostname_key'] = hostname_key(row['hostname'])
+        if row['ra'] is not None and row['dec'] is not None:
+            row['location'] = sky_location(row['ra'], row['dec'])
+        row['synced_at'] = sync_started
+        operations.append(ReplaceOne({'_id': row['_id']}, row, upsert=True))
+        if row['rowupdate'] is not None and (last_rowupdate is None or str(row['rowupdate']) > last_rowupdate):
+            last_rowupdate = str(row['rowupdate'])
+    if operations:
+        nea_pscomppars.bulk_write(operations, ordered=False)
+    state_update = {'last_sync': sync_started, 'last_rowupdate': last_rowupdate}
+    if full:
+        nea_pscomppars.delete_many({'synced_at': {'$lt': sync_started}})
+        state_update['last_full_sync'] = sync_started
+    state_update['count'] = nea_pscomppars.estimated_document_count()
+    mirror_state.update_one({'_id': NEA_MIRROR_STATE_ID}, {'$set': state_update}, upsert=True)
+    print(f'NEA mirror {"full" if full else "incremental"} refresh wrote {len(operations)} rows')
+    return len(operations)
+
+
+"""——————————————————————————————MIRROR LOOKUPS——————————————————————————————"""
+
+def nea_mirror_is_loaded():
+    """Checks if the mirror has been loaded at least once."""
+    state = get_nea_mirror_state()
+    return state is not None and state.get('count', 0) > 0
+
+
+def find_nea_host_by_name(star_name):
+    """Finds a host star in the mirror by name.
+
+    An exact match on the normalized host name is tried first. Otherwise the first host name
+    (alphabetically) starting with the star name is returned (see host_prefix_filter).
+
+    Returns:
+        A mirror document, or None if there is no match.
+    """
+    row = nea_pscomppars.find_one({'hostname_key': hostname_key(star_name)}, sort=[('hostname', 1)])
+    if row is None:
+        row = nea_pscomppars.find_one(host_prefix_filter(star_name), sort=[('hostname', 1)])
+    return row
+
+
+def host_prefix_filter(star_name):
+    """Returns the query of the mirror rows whose host name starts with a star name.
+
+    The prefix is matched on the normalized host name, so it ignores case and spacing like
+    the exact match, and the anchored regex is answered from the hostname_key index.
+    """
+    return {'hostname_key': {'$regex': '^' + re.escape(hostname_key(star_name))}}
+
+
+def find_nea_host_by_position(ra, dec, radius=1.0):
+    """Finds the closest host star in the mirror within a radius (degrees) of a sky position.
+
+    Returns:
+        A mirror document, or None if there is no host star within the radius.
+    """
+    return closest_host(list(nea_pscomppars.find(cone_filter(ra, dec, radius))), ra, dec)
+
+
+def cone_filter(ra, dec, radius):
+    """Returns the query of the mirror rows within a radius (degrees) of a sky position."""
+    return {'location': {'$geoWithin': {'$centerSphere': [sky_location(ra, dec)['coordinates'], math.radians(radius)]}}}
+
+
+def closest_host(rows, ra, dec):
+    """Returns the mirror row closest to a sky position, or None if there are no rows."""
+    if not rows:
+        return None
+    ra_rad, dec_rad = math.radians(ra), math.radians(dec)
+
+    def separation(row):
+        # angular distance on the sphere (haversine)
+        d_ra = math.radians(row['ra']) - ra_rad
+        d_dec = math.radians(row['dec']) - dec_rad
+        return math.sin(d_dec / 2) ** 2 + math.cos(dec_rad) * math.cos(math.radians(row['dec'])) * math.sin(d_ra / 2) ** 2
+    return min(rows, key=separation)
+
+
+def lookup_nasa_exoplanet_archive(star_name=None, coords=None):
+    """Returns NASA Exoplanet Archive stellar parameters by name or position, from the mirror if possible.
+
+    Falls back to the live archive (through the shared catalog cache) if the mirror has not
+    been loaded or has no match.
+    """
+    if nea_mirror_is_loaded():
+        if star_name:
+            row = find_nea_host_by_name(star_name)
+        else:
+            row = find_nea_host_by_position(float(coords[0]), float(coords[1]))
+        if row is not None:
+            return mirror_row_to_nea_dict(row)
+    return search_nasa_exoplanet_archive(star_name, coords)
+
+
+def lookup_nea_host_names():
+    """Returns the names of all exoplanet host stars, from the mirror if it has been loaded."""
+    if nea_mirror_is_loaded():
+        return nea_pscomppars.distinct('hostname')
+    return get_nea_host_names()
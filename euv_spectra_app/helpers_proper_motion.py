@@ -0,0 +1,190 @@
+# FOR PROPER MOTION CORRECTION
+import threading
+import numpy as np
+from euv_spectra_app.startup import lazy_import
+
+u = lazy_import('astropy.units')
+astropy_time = lazy_import('astropy.time')
+astropy_coordinates = lazy_import('astropy.coordinates')
+
+# J2000, the epoch of the SIMBAD coordinates (MJD)
+J2000_MJD = 51544.0
+
+
+def to_float_array(values):
+    """Converts a sequence of numbers (None for missing values) into a float array with NaN for missing values."""
+    return np.array([np.nan if value is None else value for value in values], dtype=float)
+
+
+def parse_sexagesimal(ra, dec):
+    """Parses sexagesimal coordinates (hh mm ss, dd mm ss) into degrees, with NaN for missing or malformed ones.
+
+    The coordinates are parsed in one SkyCoord call. If it fails, they are parsed one by one
+    so a single malformed pair does not fail the whole batch.
+
+    Returns:
+        tuple: Two float arrays with the right ascensions and declinations (degrees).
+    """
+    ra_degrees = np.full(len(ra), np.nan)
+    dec_degrees = np.full(len(dec), np.nan)
+    rows = [i for i, (row_ra, row_dec) in enumerate(zip(ra, dec)) if isinstance(row_ra, str) and row_ra.strip()
+            and isinstance(row_dec, str) and row_dec.strip()]
+    if not rows:
+        return (ra_degrees, dec_degrees)
+    try:
+        coords = astropy_coordinates.SkyCoord([ra[i] for i in rows], [dec[i] for i in rows], unit=(u.hourangle, u.deg))
+        ra_degrees[rows] = coords.ra.degree
+        dec_degrees[rows] = coords.dec.degree
+    except ValueError:
+        for i in rows:
+            try:
+                coord = astropy_coordinates.SkyCoord(ra[i], dec[i], unit=(u.hourangle, u.deg))
+            except ValueError as e:
+                print(f'Proper motion correction: skipping malformed coordinates {ra[i]} {dec[i]}: {e}')
+                continue
+            ra_degrees[i] = coord.ra.degree
+            dec_degrees[i] = coord.dec.degree
+    return (ra_degrees, dec_degrees)
+
+
+def correct_pm_batch(ra, dec, pm_ra, pm_dec, plx, rad_vel, galex_time, sexagesimal=False):
+    """Corrects the coordinates of many targets for proper motion at once.
+
+    All targets are put into one array valued SkyCoord and moved to their GALEX observation
+    time with a single apply_space_motion call, which is much faster than one SkyCoord per target.
+
+    Args:
+        ra: The right ascensions at J2000 (degrees, or sexagesimal strings if sexagesimal is True).
+        dec: The declinations at J2000 (degrees, or sexagesimal strings if sexagesimal is True).
+        pm_ra: The proper motions in RA * cos(dec) (mas/yr).
+        pm_dec: The proper motions in DEC (mas/yr).
+        plx: The parallaxes (mas).
+        rad_vel: The radial velocities (km/s). Missing radial velocities are taken as 0.
+        galex_time: The GALEX observation times (MJD) to move the coordinates to.
+        sexagesimal: If the coordinates are sexagesimal strings (hh mm ss, dd mm ss) like SIMBAD returns.
+
+    Returns:
+        tuple: Two float arrays with the corrected right ascensions and declinations (degrees).
+            Targets with missing or invalid data (including missing or malformed coordinates) are NaN.
+    """
+    n_targets = len(ra)
+    pm_ra, pm_dec, plx = to_float_array(pm_ra), to_float_array(pm_dec), to_float_array(plx)
+    galex_time = to_float_array(galex_time)
+    rad_vel = np.nan_to_num(to_float_array(rad_vel), nan=0.0)
+    if sexagesimal:
+        ra, dec = parse_sexagesimal(list(ra), list(dec))
+    else:
+        ra, dec = to_float_array(ra), to_float_array(dec)
+    # zero parallaxes have no distance to move the target over
+    valid = (np.isfinite(ra) & np.isfinite(dec) & np.isfinite(pm_ra) & np.isfinite(pm_dec)
+             & np.isfinite(plx) & (plx != 0) & np.isfinite(galex_time))
+    corrected_ra = np.full(n_targets, np.nan)
+    corrected_dec = np.full(n_targets, np.nan)
+    if not valid.any():
+        return (corrected_ra, corrected_dec)
+    # Time between J2000 and each GALEX observation, in Julian years
+    td_year = (astropy_time.Time(galex_time[valid], format='mjd') - astropy_time.Time(J2000_MJD, format='mjd')).sec / 60 / 60 / 24 / 365.25
+    skycoord_obj = astropy_coordinates.SkyCoord(ra=ra[valid] * u.deg, dec=dec[valid] * u.deg,
+                            distance=astropy_coordinates.Distance(parallax=plx[valid] * u.mas, allow_negative=True),
+                            pm_ra_cosdec=pm_ra[valid] * u.mas / u.yr, pm_dec=pm_dec[valid] * u.mas / u.yr,
+                            radial_velocity=rad_vel[valid] * u.km / u.s)
+    skycoord_obj = skycoord_obj.apply_space_motion(dt=td_year * u.yr)
+    corrected_ra[valid] = skycoord_obj.ra.degree
+    corrected_dec[valid] = skycoord_obj.dec.degree
+    return (corrected_ra, corrected_dec)
+
+
+class _Correction():
+    """One target waiting in a ProperMotionBatcher."""
+    def __init__(self, row):
+        self.row = row
+        self.event = threading.Event()
+        self.done = False
+        self.result = None
+        self.error = None
+
+
+class ProperMotionBatcher():
+    """Runs the proper motion corrections of concurrent searches together, in one correct_pm_batch call.
+
+    Batch resolution searches many targets at once on the job pool, and each search corrects
+    its own coordinates. While one thread runs a batch, the corrections of the other threads
+    queue up, and are run as the next batch by one of them. A lone search runs right away,
+    so it waits on no one.
+
+    The rows are sexagesimal SIMBAD coordinates (see correct_pm_batch).
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._pending = []
+        self._running = False
+
+    def correct(self, ra, dec, pm_ra, pm_dec, plx, rad_vel, galex_time):
+        """Corrects the coordinates of one target, batched with the targets queued at the same time.
+
+        Returns:
+            tuple: The corrected right ascension and declination (degrees), NaN if data is missing.
+        """
+        correction = _Correction((ra, dec, pm_ra, pm_dec, plx, rad_vel, galex_time))
+        with self._lock:
+            self._pending.append(correction)
+            lead = not self._running
+            self._running = True
+        while not correction.done:
+            if not lead:
+                correction.event.wait()
+                correction.event.clear()
+            if not correction.done:
+                # first in the queue while no batch runs, run the queue
+                self.run_pending()
+            lead = False
+        if correction.error is not None:
+            raise correction.error
+        return correction.result
+
+    def run_pending(self):
+        """Runs the queued corrections as one batch, then hands the queue to the next waiting thread."""
+        with self._lock:
+            batch, self._pending = self._pending, []
+        try:
+            results = self.run_batch([correction.row for correction in batch])
+        except Exception as e:
+            results = [e] * len(batch)
+        for correction, result in zip(batch, results):
+            if isinstance(result, Exception):
+                correction.error = result
+            else:
+                correction.result = result
+        with self._lock:
+            if self._pending:
+                # corrections queued while this batch ran, the first of them runs the next batch
+                self._pending[0].event.set()
+            else:
+                self._running = False
+        for correction in batch:
+            correction.done = True
+            correction.event.set()
+
+    @staticmethod
+    def run_batch(rows):
+        """Returns the (ra, dec) of each row, or the exception its correction raised.
+
+        If the batch fails, its rows are run one by one, so a bad row only fails its own search.
+        """
+        try:
+            corrected_ra, corrected_dec = correct_pm_batch(*zip(*rows), sexagesimal=True)
+            return list(zip(corrected_ra.tolist(), corrected_dec.tolist()))
+        except Exception as e:
+            if len(rows) == 1:
+                return [e]
+        results = []
+        for row in rows:
+            try:
+                corrected_ra, corrected_dec = correct_pm_batch(*zip(row), sexagesimal=True)
+                results.append((float(corrected_ra[0]), float(corrected_dec[0])))
+            except Exception as e:
+                results.append(e)
+        return results
+
+
+pm_batcher = ProperMotionBatcher()
@@ -0,0 +1,279 @@
+import time
+import random
+import threading
+import collections
+import concurrent.futures
+from datetime import datetime, timedelta
+import numpy as np
+import requests
+from euv_spectra_app.config import Config
+from euv_spectra_app.extensions import remote_call_timings
+from euv_spectra_app.helpers_steps import db_step, call_step, sleep_step, run_steps
+
+# Exceptions that are worth retrying: the service is down, unreachable, answered with a 5xx, or timed out.
+# 4xx answers are raised as RemoteQueryError instead (see RemoteCallPolicy._timed), so they are not in here.
+# (concurrent.futures.TimeoutError is only an alias of TimeoutError from Python 3.11)
+RETRYABLE_FAILURES = (requests.exceptions.RequestException, ConnectionError, TimeoutError, concurrent.futures.TimeoutError)
+
+# Pool the attempts run on, so an attempt that hangs past its deadline can be left behind. Sized so
+# every service can have its max_in_flight attempts running without queueing behind another service.
+attempt_executor = concurrent.futures.ThreadPoolExecutor(
+    max_workers=sum(policy['max_in_flight'] for policy in Config.REMOTE_CALL_POLICY.values()), thread_name_prefix='remote')
+
+
+class RemoteQueryError(Exception):
+    """Raised when a service rejected a query with a 4xx answer. The query itself is wrong, so it is not retried."""
+
+
+class RemoteCallSaturatedError(TimeoutError):
+    """Raised when a service already has its max_in_flight attempts running in this worker.
+
+    Attempts only pile up when the service stops answering (attempts past their deadline keep
+    their thread until they return), so this counts as a timeout of the service.
+    """
+
+
+def is_client_error(error):
+    """Checks if an exception is an HTTP 4xx answer (raise_for_status of requests or httpx)."""
+    response = getattr(error, 'response', None)
+    status_code = getattr(response, 'status_code', None)
+    return status_code is not None and 400 <= status_code < 500
+
+_indexes_created = False
+
+
+def ensure_remote_call_indexes():
+    """Creates the TTL index that removes old attempt timings."""
+    global _indexes_created
+    if not _indexes_created:
+        remote_call_timings.create_index('expires_at', expireAfterSeconds=0)
+        remote_call_timings.create_index([('service', 1), ('started_at', -1)])
+        _indexes_created = True
+
+
+def configure_client_timeout(client, service):
+    """Sets the connect and read timeouts of a service's policy on an astroquery client.
+
+    astroquery passes its TIMEOUT attribute to requests, which accepts a (connect, read) tuple.
+    """
+    policy = Config.REMOTE_CALL_POLICY[service]
+    client.TIMEOUT = (policy['connect_timeout'], policy['read_timeout'])
+    return client
+
+
+class RemoteCallPolicy():
+    """Timeouts, retries and hedging for the calls to one remote catalog service.
+
+    Each attempt runs on a pool thread with a hard deadline of the connect plus read timeout,
+    so a hung TAP query can not stall a search (pyvo based queries do not use the astroquery
+    TIMEOUT). Failed attempts of idempotent queries are retried with jittered exponential
+    backoff. If hedging is on, a second attempt is started when the first one is slower than
+    the recent p95 latency, and whichever answers first is used. At most max_in_flight attempts
+    of the service run at once in a worker. Every attempt is timed and stored in the
+    remote_call_timings collection to tune the policy with.
+    """
+    def __init__(self, service):
+        self.service = service
+        settings = Config.REMOTE_CALL_POLICY[service]
+        self.deadline = settings['connect_timeout'] + settings['read_timeout']
+        self.retries = settings['retries']
+        self.backoff_base = settings['backoff_base']
+        self.backoff_max = settings['backoff_max']
+        self.hedge = settings['hedge']
+        self.max_in_flight = settings['max_in_flight']
+        self.in_flight = threading.BoundedSemaphore(self.max_in_flight)
+        # recent successful attempt durations, for the hedge delay
+        self.latencies = collections.deque(maxlen=200)
+        self._latency_lock = threading.Lock()
+
+    def hedge_delay(self):
+        """Returns how long to wait before starting a hedged attempt: the recent p95 latency."""
+        with self._latency_lock:
+            latencies = list(self.latencies)
+        if len(latencies) < Config.REMOTE_CALL_HEDGE_MIN_SAMPLES:
+            return Config.REMOTE_CALL_HEDGE_DEFAULT_DELAY
+        return float(np.percentile(latencies, 95))
+
+    def backoff(self, attempt):
+        """Returns the sleep before a retry, with full jitter: random between 0 and the exponential backoff."""
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * (2 ** attempt)))
+
+    def attempt_document(self, attempt, hedged, started_at, duration, outcome, error=None):
+        """Returns the timing document of one attempt (and keeps successful durations for the hedge delay)."""
+        if outcome == 'ok':
+            with self._latency_lock:
+                self.latencies.append(duration)
+        return {
+            'service': self.service,
+            'attempt': attempt,
+            'hedged': hedged,
+            'started_at': started_at,
+            'duration': duration,
+            'outcome': outcome,
+            'error': str(error) if error is not None else None,
+            'expires_at': datetime.utcnow() + timedelta(seconds=Config.REMOTE_CALL_TIMINGS_TTL)}
+
+    def record_attempt_steps(self, attempt, hedged, started_at, duration, outcome, error=None):
+        """Steps (see helpers_steps) that store the timing of one attempt."""
+        doc = self.attempt_document(attempt, hedged, started_at, duration, outcome, error)
+        try:
+            yield call_step(ensure_remote_call_indexes)
+            yield db_step('remote_call_timings', 'insert_one', doc)
+        except Exception as e:
+            # timings are only for tuning, never fail a search because of them
+            print(f'Remote call timing error: {e}')
+
+    def record_attempt(self, attempt, hedged, started_at, duration, outcome, error=None):
+        """Stores the timing of one attempt."""
+        run_steps(self.record_attempt_steps(attempt, hedged, started_at, duration, outcome, error))
+
+    def timed_steps(self, attempt, hedged, func):
+        """Steps that run one attempt (func, with no arguments) and store its timing and outcome.
+
+        Every attempt stores its timing once, when it returns. An attempt that returns after the
+        deadline (it was abandoned by run_attempt) is stored as a timeout, so its duration is
+        kept out of the latencies the hedge delay is taken from.
+
+        Raises:
+            RemoteQueryError: If the service answered with a 4xx.
+            Any other exception raised by func.
+        """
+        started_at = time.time()
+        try:
+            result = yield call_step(func)
+        except Exception as e:
+            duration = time.time() - started_at
+            if is_client_error(e):
+                # the service answered, the query itself is wrong
+                yield from self.record_attempt_steps(attempt, hedged, started_at, duration, 'ok', e)
+                raise RemoteQueryError(f'{self.service} rejected the query: {e}') from e
+            # otherwise the service answered if the error is about the query itself
+            outcome = 'error' if isinstance(e, RETRYABLE_FAILURES) else 'ok'
+            if duration > self.deadline:
+                outcome = 'timeout'
+            yield from self.record_attempt_steps(attempt, hedged, started_at, duration, outcome, e)
+            raise
+        duration = time.time() - started_at
+        yield from self.record_attempt_steps(attempt, hedged, started_at, duration, 'timeout' if duration > self.deadline else 'ok')
+        return result
+
+    def _timed(self, attempt, hedged, func, args, kwargs):
+        try:
+            return run_steps(self.timed_steps(attempt, hedged, lambda: func(*args, **kwargs)))
+        finally:
+            # the slot is held until the attempt returns, even if it was abandoned
+            self.in_flight.release()
+
+    def submit_attempt(self, attempt, hedged, func, args, kwargs):
+        """Starts an attempt on the pool, or returns None if the service has max_in_flight attempts running."""
+        if not self.in_flight.acquire(blocking=False):
+            return None
+        try:
+            return attempt_executor.submit(self._timed, attempt, hedged, func, args, kwargs)
+        except Exception:
+            self.in_flight.release()
+            raise
+
+    def run_attempt(self, attempt, func, args, kwargs):
+        """Runs one attempt with a hard deadline, hedged with a second attempt if it is slow.
+
+        The hedged attempt is skipped if the service has max_in_flight attempts running.
+
+        Raises:
+            RemoteCallSaturatedError: If the service has max_in_flight attempts running.
+            TimeoutError: If no attempt answered before the deadline.
+            Any exception raised by func.
+        """
+        started = time.time()
+        future = self.submit_attempt(attempt, False, func, args, kwargs)
+        if future is None:
+            raise RemoteCallSaturatedError(f'{self.service} has {self.max_in_flight} calls in flight, not starting another.')
+        futures = [future]
+        if self.hedge:
+            done, _ = concurrent.futures.wait(futures, timeout=min(self.hedge_delay(), self.deadline))
+            if not done:
+                hedged_future = self.submit_attempt(attempt, True, func, args, kwargs)
+                if hedged_future is not None:
+                    futures.append(hedged_future)
+        error = None
+        pending = set(futures)
+        while pending:
+            remaining = self.deadline - (time.time() - started)
+            done, pending = concurrent.futures.wait(pending, timeout=max(remaining, 0), return_when=concurrent.futures.FIRST_COMPLETED)
+            if not done:
+                break
+            for future in done:
+                if future.exception() is None:
+                    return future.result()
+                error = future.exception()
+                if not isinstance(error, RETRYABLE_FAILURES):
+                    raise error
+        if error is not None and not pending:
+            raise error
+        # the abandoned attempts store their timing as timeouts when they return
+        raise TimeoutError(f'{self.service} did not answer within {self.deadline} seconds.')
+
+    def call_steps(self, run_attempt, idempotent=True):
+        """Steps that run the attempts of a call, retrying retryable failures after a backoff.
+
+        Args:
+            run_attempt: A function of the attempt number that runs one attempt (see run_attempt).
+            idempotent: If the query can safely be repeated. Only idempotent queries are
+                retried (every catalog query is a read, so this is the default).
+        """
+        retries = self.retries if idempotent else 0
+        for attempt in range(retries + 1):
+            try:
+                return (yield call_step(lambda attempt=attempt: run_attempt(attempt)))
+            except RETRYABLE_FAILURES as e:
+                if attempt == retries:
+                    raise
+                delay = self.backoff(attempt)
+                print(f'{self.service} attempt {attempt + 1} failed ({e}), retrying in {delay:.2f}s')
+                yield sleep_step(delay)
+
+    def call(self, func, *args, idempotent=True, **kwargs):
+        """Calls a function that queries the service under this policy.
+
+        Args:
+            func: The function that queries the service.
+            idempotent: If the query can safely be repeated (see call_steps).
+
+        Raises:
+            The last retryable failure if every attempt failed, or any other exception from func.
+        """
+        return run_steps(self.call_steps(lambda attempt: self.run_attempt(attempt, func, args, kwargs), idempotent))
+
+
+remote_policies = {service: RemoteCallPolicy(service) for service in Config.REMOTE_CALL_POLICY}
+
+
+def remote_call(service, func, *args, **kwargs):
+    """Calls a function that queries a remote catalog service under that service's policy."""
+    return remote_policies[service].call(func, *args, **kwargs)
+
+
+def get_remote_call_stats(days=7):
+    """Summarizes the recorded attempt timings per service, to tune the timeouts and hedging with.
+
+    Returns:
+        A dict of service to attempt count, error and timeout rates, hedged attempt count, and
+        p50, p95 and p99 durations (seconds) of the successful attempts.
+    """
+    since = time.time() - days * 86400
+    stats = {}
+    for service in remote_policies:
+        rows = list(remote_call_timings.find({'service': service, 'started_at': {'$gte': since}},
+                                             {'duration': 1, 'outcome': 1, 'hedged': 1}))
+        if not rows:
+            continue
+        durations = [row['duration'] for row in rows if row['outcome'] == 'ok']
+        stats[service] = {
+            'attempts': len(rows),
+            'error_rate': sum(row['outcome'] == 'error' for row in rows) / len(rows),
+            'timeout_rate': sum(row['outcome'] == 'timeout' for row in rows) / len(rows),
+            'hedged': sum(bool(row.get('hedged')) for row in rows),
+        }
+        for quantile in (50, 95, 99):
+            stats[service][f'p{quantile}'] = float(np.percentile(durations, quantile)) if durations else None
+    return stats
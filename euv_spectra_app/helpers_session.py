@@ -0,0 +1,118 @@
+# FOR STORING THE STELLAR OBJECT IN THE SESSION
+import msgpack
+import numpy as np
+import numpy.ma as ma
+from flask import session
+from euv_spectra_app.models import StellarObject, ProperMotionData, GalexFluxes
+from euv_spectra_app.helpers import from_json, remove_objs_from_obj_dict
+
+# Bump when a field is added, removed, or reordered below. Sessions written with another
+# version are dropped (like a timed out session) instead of being decoded into the wrong fields.
+SESSION_SCHEMA_VERSION = 1
+SESSION_KEY = 'stellar_object'
+
+# The fields that are stored, in the order they are packed. Anything not listed is not stored,
+# e.g. the fluxes' copy of the stellar object, which is rebuilt from the stellar object on load.
+STELLAR_OBJECT_FIELDS = (
+    'star_name', 'position', 'coords', 'teff', 'logg', 'mass', 'dist', 'rad', 'pm_corrected_coords',
+    'stellar_subtype', 'modal_error_msgs', 'modal_page_error_msg', 'model_subtype', 'model_collection')
+PROPER_MOTION_FIELDS = ('pm_ra', 'pm_dec', 'plx', 'rad_vel')
+GALEX_FLUXES_FIELDS = (
+    'fuv', 'nuv', 'fuv_saturated', 'nuv_saturated', 'fuv_upper_limit', 'nuv_upper_limit', 'fuv_err', 'nuv_err',
+    'fuv_is_saturated', 'nuv_is_saturated', 'fuv_is_upper_limit', 'nuv_is_upper_limit',
+    'processed_fuv', 'processed_nuv', 'processed_fuv_saturated', 'processed_nuv_saturated',
+    'processed_fuv_upper_limit', 'processed_nuv_upper_limit', 'processed_fuv_err', 'processed_nuv_err')
+# msgpack has no tuple type, these are turned back into tuples on load
+TUPLE_FIELDS = ('coords', 'pm_corrected_coords')
+
+# marks a field missing from a job result dict, so it keeps its default on load
+_UNSET = object()
+
+
+def to_plain(value):
+    """Turns numpy scalars and masked values from the catalogs into plain python values msgpack can pack."""
+    if value is ma.masked:
+        return None
+    if isinstance(value, np.generic):
+        return value.item()
+    raise TypeError(f'Object of type {type(value)} can not be stored in the session')
+
+
+def pack_fields(obj, fields):
+    return [getattr(obj, field) for field in fields]
+
+
+def unpack_fields(obj, fields, values):
+    for field, value in zip(fields, values):
+        if value is _UNSET:
+            continue
+        if field in TUPLE_FIELDS and isinstance(value, list):
+            value = tuple(value)
+        setattr(obj, field, value)
+    return obj
+
+
+def link_fluxes(stellar_object):
+    """Gives the fluxes object its copy of the stellar object's attributes (used for teff, dist, etc.)."""
+    if stellar_object.fluxes is not None:
+        stellar_object.fluxes.stellar_obj = remove_objs_from_obj_dict(stellar_object.to_dict())
+    return stellar_object
+
+
+def encode_stellar_object(stellar_object):
+    """Packs a stellar object into a compact msgpack payload.
+
+    The payload is [schema version, stellar object fields, proper motion fields or None,
+    flux fields or None], each a list of values in the order of the field tuples above, so
+    no field names are stored.
+    """
+    pm_data = stellar_object.pm_data
+    fluxes = stellar_object.fluxes
+    return msgpack.packb([
+        SESSION_SCHEMA_VERSION,
+        pack_fields(stellar_object, STELLAR_OBJECT_FIELDS),
+        pack_fields(pm_data, PROPER_MOTION_FIELDS) if pm_data is not None else None,
+        pack_fields(fluxes, GALEX_FLUXES_FIELDS) if fluxes is not None else None,
+    ], default=to_plain, use_bin_type=True)
+
+
+def decode_stellar_object(payload):
+    """Unpacks a payload from encode_stellar_object back into a stellar object.
+
+    Returns:
+        The stellar object, or an empty stellar object if there is no payload (the session
+        timed out) or it was written with another schema version.
+    """
+    if payload is None:
+        return StellarObject()
+    if isinstance(payload, str):
+        # a session from before the msgpack format, stored as a JSON string
+        return link_fluxes(from_json(payload))
+    version, stellar_values, pm_values, flux_values = msgpack.unpackb(payload, raw=False)
+    if version != SESSION_SCHEMA_VERSION:
+        print(f'Dropping session stellar object with schema version {version}')
+        return StellarObject()
+    stellar_object = unpack_fields(StellarObject(), STELLAR_OBJECT_FIELDS, stellar_values)
+    stellar_object.pm_data = unpack_fields(ProperMotionData(), PROPER_MOTION_FIELDS, pm_values) if pm_values is not None else None
+    stellar_object.fluxes = unpack_fields(GalexFluxes(), GALEX_FLUXES_FIELDS, flux_values) if flux_values is not None else None
+    return link_fluxes(stellar_object)
+
+
+def stellar_object_from_dict(data):
+    """Builds a stellar object from the JSON serializable dict of a search job result."""
+    stellar_object = unpack_fields(StellarObject(), STELLAR_OBJECT_FIELDS, [data.get(field, _UNSET) for field in STELLAR_OBJECT_FIELDS])
+    if data.get('pm_data') is not None:
+        stellar_object.pm_data = ProperMotionData(**{field: data['pm_data'].get(field) for field in PROPER_MOTION_FIELDS})
+    if data.get('fluxes') is not None:
+        stellar_object.fluxes = unpack_fields(GalexFluxes(), GALEX_FLUXES_FIELDS, [data['fluxes'].get(field, _UNSET) for field in GALEX_FLUXES_FIELDS])
+    return link_fluxes(stellar_object)
+
+
+def store_stellar_object(stellar_object):
+    """Stores the stellar object in the session (the one copy the pages share)."""
+    session[SESSION_KEY] = encode_stellar_object(stellar_object)
+
+
+def load_stellar_object():
+    """Returns the stellar object stored in the session, or an empty stellar object if there is none."""
+    return decode_stellar_object(session.get(SESSION_KEY))
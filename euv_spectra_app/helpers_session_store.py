@@ -0,0 +1,112 @@
+# SERVER SIDE SESSIONS IN MONGO
+import hashlib
+import secrets
+from datetime import datetime
+from flask.json.tag import TaggedJSONSerializer
+from flask.sessions import SessionInterface, SessionMixin
+from itsdangerous import Signer, BadSignature
+from werkzeug.datastructures import CallbackDict
+from euv_spectra_app.extensions import sessions
+
+_indexes_created = False
+
+
+def ensure_session_indexes():
+    """Creates the TTL index that removes expired sessions."""
+    global _indexes_created
+    if not _indexes_created:
+        sessions.create_index('expires_at', expireAfterSeconds=0)
+        _indexes_created = True
+
+
+class MongoSession(CallbackDict, SessionMixin):
+    """A session whose data lives in the sessions collection, the cookie only holds its signed id."""
+    def __init__(self, initial=None, sid=None, new=False, digest=None, expires_at=None):
+        def on_update(self):
+            self.modified = True
+        super().__init__(initial, on_update)
+        self.sid = sid
+        self.new = new
+        self.modified = False
+        # hash of the data as loaded, so a request that sets the same values again does not write
+        self.digest = digest
+        self.expires_at = expires_at
+
+
+class MongoSessionInterface(SessionInterface):
+    """Stores sessions in a Mongo collection with a TTL index, shared by every worker and container.
+
+    The session is only written when its data changed, or when it is past half of its lifetime
+    so its expiry is pushed back (and the cookie with it). Other requests do not touch the
+    store after reading it. Expired sessions are removed by the TTL index.
+    """
+    salt = 'mongo-session'
+    # the tagged JSON serializer keeps the types Flask stores in sessions (bytes, tuples, Markup, ...)
+    serializer = TaggedJSONSerializer()
+
+    def get_signer(self, app):
+        return Signer(app.secret_key, salt=self.salt)
+
+    def serialize(self, data):
+        return self.serializer.dumps(dict(data))
+
+    def open_session(self, app, request):
+        cookie = request.cookies.get(self.get_cookie_name(app))
+        if cookie:
+            try:
+                sid = self.get_signer(app).unsign(cookie).decode()
+            except BadSignature:
+                sid = None
+            if sid:
+                try:
+                    row = sessions.find_one({'_id': sid})
+                except Exception as e:
+                    print(f'Session load error: {e}')
+                    row = None
+                if row is not None and row['expires_at'] > datetime.utcnow():
+                    data = self.serializer.loads(row['data'])
+                    return MongoSession(data, sid=sid, digest=row['digest'], expires_at=row['expires_at'])
+        return MongoSession(sid=secrets.token_urlsafe(32), new=True)
+
+    def save_session(self, app, session, response):
+        name = self.get_cookie_name(app)
+        domain = self.get_cookie_domain(app)
+        path = self.get_cookie_path(app)
+        if not session:
+            if not session.new:
+                # the session was emptied, remove it from the store and the browser
+                try:
+                    sessions.delete_one({'_id': session.sid})
+                except Exception as e:
+                    # the browser forgets it anyway, and the TTL index removes it
+                    print(f'Session delete error: {e}')
+                response.delete_cookie(name, domain=domain, path=path)
+            return
+        payload = self.serialize(session)
+        digest = hashlib.sha1(payload.encode()).hexdigest()
+        now = datetime.utcnow()
+        lifetime = app.permanent_session_lifetime
+        changed = session.new or digest != session.digest
+        renew = session.expires_at is None or session.expires_at - now < lifetime / 2
+        if not changed and not renew:
+            return
+        expires_at = now + lifetime
+        try:
+            ensure_session_indexes()
+            if changed:
+                sessions.replace_one({'_id': session.sid}, {'data': payload, 'digest': digest, 'expires_at': expires_at}, upsert=True)
+            else:
+                sessions.update_one({'_id': session.sid}, {'$set': {'expires_at': expires_at}})
+        except Exception as e:
+            # the response is still sent, with the cookie as it was (the changes of this request are lost)
+            print(f'Session save error: {e}')
+            return
+        response.set_cookie(
+            name,
+            self.get_signer(app).sign(session.sid.encode()).decode(),
+            expires=self.get_expiration_time(app, session),
+            httponly=self.get_cookie_httponly(app),
+            domain=domain,
+            path=path,
+            secure=self.get_cookie_secure(app),
+            samesite=self.get_cookie_samesite(app))
@@ -0,0 +1,111 @@
+import copy
+import threading
+from euv_spectra_app.config import Config
+from euv_spectra_app.helpers_locks import acquire_lock, release_lock, get_lock_holder, wait_for_unlock
+from euv_spectra_app.helpers_jobs import new_job_id, create_job, get_job, get_job_results, record_job_result
+
+
+def search_key(star_name=None, position=None):
+    """Normalizes a search term so identical searches share a key (spacing and case do not matter)."""
+    if star_name:
+        return 'name:' + ''.join(str(star_name).split()).upper()
+    return 'position:' + ' '.join(str(position).split()).lower()
+
+
+class _Call():
+    """One in-progress execution that other threads can wait on."""
+    def __init__(self):
+        self.event = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight():
+    """Makes concurrent identical calls share one execution.
+
+    Within a worker, threads calling with a key that is already running wait for that
+    execution and get (a copy of) its result. Across workers, a shared lock in the locks
+    collection marks the key as running, held with the id of a job the result is recorded
+    on. A worker that finds the lock held waits for it to be released and reads the result
+    of that job. If the holder failed, or is still running after max_wait (the longest
+    remote call deadline by default), it runs the call itself, so a burst of identical
+    searches holds each waiting thread for at most that long.
+
+    The results of func are stored in the job_results collection, so they have to be
+    plain dicts (like to_json returns).
+    """
+    def __init__(self, name, lease_seconds=None, max_wait=None):
+        self.name = name
+        self.lease_seconds = lease_seconds or Config.SINGLE_FLIGHT_LEASE
+        self.max_wait = max_wait or Config.SINGLE_FLIGHT_MAX_WAIT
+        self._lock = threading.Lock()
+        self._calls = {}
+
+    def do(self, key, func):
+        """Runs func for a key, or waits on the execution already running for that key.
+
+        Returns:
+            A deep copy of the result of func, so callers sharing an execution can each modify it.
+
+        Raises:
+            Any exception raised by func (also for the threads that waited on it).
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = _Call()
+                self._calls[key] = call
+        if not leader:
+            call.event.wait()
+            if call.error is not None:
+                raise call.error
+            return copy.deepcopy(call.result)
+        try:
+            call.result = self.run_shared(key, func)
+            return copy.deepcopy(call.result)
+        except Exception as e:
+            call.error = e
+            raise
+        finally:
+            call.event.set()
+            with self._lock:
+                del self._calls[key]
+
+    def run_shared(self, key, func):
+        """Runs func for a key while holding the shared lock, or reads the result of the worker holding it."""
+        lock_name = f'{self.name}:{key}'
+        job_id = new_job_id()
+        if acquire_lock(lock_name, self.lease_seconds, token=job_id) is None:
+            # another worker is running this call, wait for it and read its result
+            holder_job_id = get_lock_holder(lock_name)
+            if wait_for_unlock(lock_name, self.max_wait):
+                result = self.get_shared_result(holder_job_id)
+                if result is not None:
+                    return result
+            return func()
+        try:
+            create_job(self.name, 1, params={'key': key}, job_id=job_id)
+            try:
+                result = func()
+            except Exception as e:
+                # the waiting workers run the call themselves
+                record_job_result(job_id, 0, {'key': key}, {'error': str(e)}, failed=True)
+                raise
+            record_job_result(job_id, 0, {'key': key}, result)
+            return result
+        finally:
+            release_lock(lock_name, job_id)
+
+    def get_shared_result(self, job_id):
+        """Returns the result another worker recorded on its job, or None if it did not finish it."""
+        if job_id is None:
+            return None
+        job = get_job(job_id)
+        if job is None or job['status'] != 'done' or job['failed']:
+            return None
+        rows = get_job_results(job_id, 0, 1)
+        return rows[0]['result'] if rows else None
+
+
+stellar_search_flight = SingleFlight('stellar_search')
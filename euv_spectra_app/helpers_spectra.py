@@ -0,0 +1,128 @@
+# FOR FINDING AND READING THE MODEL SPECTRA (FITS FILES)
+import os
+import json
+import time
+import threading
+from collections import OrderedDict
+from euv_spectra_app.config import Config
+from euv_spectra_app.helpers_compression import precompress
+from euv_spectra_app.startup import lazy_import
+
+fits = lazy_import('astropy.io.fits')
+
+
+def get_fits_folder():
+    """Returns the absolute path of the folder the model FITS files are stored in."""
+    # relative to the package, like current_app.root_path in the routes
+    return os.path.join(os.path.dirname(os.path.abspath(__file__)), Config.FITS_FOLDER)
+
+
+class SpectraStore():
+    """In-process manifest of the model FITS files and cache of their decoded spectra.
+
+    The manifest maps each FITS filename to its path, so finding a file does not walk the
+    FITS folder on every request. It is rebuilt at most every SPECTRA_MANIFEST_CHECK_SECONDS,
+    or right away when a filename is not in it (a file added since the last walk).
+
+    Decoded spectra (wavelength and flux arrays) are kept for the SPECTRA_CACHE_SIZE most
+    recently used files, keyed by path and modification time so a replaced file is read again.
+    Their JSON response bodies are kept the same way, compressed once when first asked for.
+    """
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.checked_at = 0
+        self.manifest = {}
+        self.spectra = OrderedDict()
+        self.payloads = OrderedDict()
+
+    def get_cached(self, cache, key):
+        """Returns a value of one of the LRU caches (spectra or payloads), or None."""
+        with self.lock:
+            if key in cache:
+                cache.move_to_end(key)
+                return cache[key]
+        return None
+
+    def set_cached(self, cache, key, value):
+        """Adds a value to one of the LRU caches, dropping the least recently used past SPECTRA_CACHE_SIZE."""
+        with self.lock:
+            cache[key] = value
+            while len(cache) > Config.SPECTRA_CACHE_SIZE:
+                cache.popitem(last=False)
+
+    def refresh(self, force=False):
+        """Rebuilds the manifest if it was last built more than SPECTRA_MANIFEST_CHECK_SECONDS ago."""
+        if not force and time.time() - self.checked_at < Config.SPECTRA_MANIFEST_CHECK_SECONDS:
+            return
+        with self.lock:
+            if not force and time.time() - self.checked_at < Config.SPECTRA_MANIFEST_CHECK_SECONDS:
+                return
+            manifest = {}
+            for root, subfolders, filenames in os.walk(get_fits_folder()):
+                for filename in filenames:
+                    if filename.endswith('.fits'):
+                        manifest[filename] = os.path.join(root, filename)
+            # replaced as a whole so lookups never see a half built manifest
+            self.manifest = manifest
+            self.checked_at = time.time()
+
+    def get_path(self, filename):
+        """Returns the path of a FITS file by its filename, or None if there is no such file."""
+        self.refresh()
+        if filename not in self.manifest:
+            self.refresh(force=True)
+        return self.manifest.get(filename)
+
+    def get_spectrum(self, filepath):
+        """Returns the wavelength and flux arrays of a model FITS file.
+
+        Args:
+            filepath: The path of the FITS file.
+
+        Returns:
+            A tuple of the wavelength and flux numpy arrays.
+        """
+        key = (filepath, os.path.getmtime(filepath))
+        spectrum = self.get_cached(self.spectra, key)
+        if spectrum is not None:
+            return spectrum
+        with fits.open(filepath) as hst:
+            data = hst[1].data
+            spectrum = (data['WAVELENGTH'][0].copy(), data['FLUX'][0].copy())
+        self.set_cached(self.spectra, key, spectrum)
+        return spectrum
+
+    def get_spectrum_by_name(self, filename):
+        """Returns the wavelength and flux arrays of a model FITS file by its filename, or None if there is no such file."""
+        filepath = self.get_path(filename)
+        if filepath is None:
+            return None
+        return self.get_spectrum(filepath)
+
+    def get_spectrum_data(self, filename):
+        """Returns the spectrum of a model FITS file for a JSON response, or None if there is no such file."""
+        spectrum = self.get_spectrum_by_name(filename)
+        if spectrum is None:
+            return None
+        return {'wavelength_data': spectrum[0].tolist(), 'flux_data': spectrum[1].tolist()}
+
+    def get_payload(self, filename):
+        """Returns the JSON response body of a model FITS file, precompressed, or None if there is no such file.
+
+        Returns:
+            A dict of encoding to compressed bytes (see helpers_compression.precompress).
+        """
+        filepath = self.get_path(filename)
+        if filepath is None:
+            return None
+        key = (filepath, os.path.getmtime(filepath))
+        payload = self.get_cached(self.payloads, key)
+        if payload is not None:
+            return payload
+        wavelength, flux = self.get_spectrum(filepath)
+        payload = precompress(json.dumps({'wavelength_data': wavelength.tolist(), 'flux_data': flux.tolist()}).encode())
+        self.set_cached(self.payloads, key, payload)
+        return payload
+
+
+spectra = SpectraStore()
@@ -0,0 +1,57 @@
+# STEPS SHARED BY THE SYNC AND ASYNC MODES (CIRCUIT BREAKERS, REMOTE CALL RETRIES, CATALOG CACHE)
+import time
+
+'''
+The circuit breaker, remote call policy, and catalog cache logic is written once, as generators
+that yield the I/O they need instead of doing it:
+
+    db_step(collection, method, *args, **kwargs)   a Mongo collection method call
+    call_step(func)                                a call of func() (awaited if it returns an awaitable)
+    sleep_step(seconds)                            a sleep
+
+The value of a step (or the exception it raised) is sent back into the generator, so the
+logic handles answers and errors with plain try/except. run_steps runs the steps with the sync
+Mongo client, helpers_async.run_steps_async awaits them with the async one, so both modes make
+the same state transitions and return the same answers.
+'''
+
+
+def db_step(collection, method, *args, **kwargs):
+    return ('db', collection, method, args, kwargs)
+
+
+def call_step(func):
+    return ('call', func)
+
+
+def sleep_step(seconds):
+    return ('sleep', seconds)
+
+
+def drive(steps, run_step):
+    """Runs a generator of steps, running each step with run_step, and returns the generator's return value."""
+    value, error = None, None
+    while True:
+        try:
+            step = steps.throw(error) if error is not None else steps.send(value)
+        except StopIteration as stop:
+            return stop.value
+        value, error = None, None
+        try:
+            value = run_step(step)
+        except Exception as e:
+            error = e
+
+
+def run_steps(steps):
+    """Runs a generator of steps with the sync Mongo client and returns its return value."""
+    from euv_spectra_app.extensions import db
+
+    def run_step(step):
+        if step[0] == 'db':
+            _, collection, method, args, kwargs = step
+            return getattr(db[collection], method)(*args, **kwargs)
+        if step[0] == 'call':
+            return step[1]()
+        time.sleep(step[1])
+    return drive(steps, run_step)
@@ -0,0 +1,31 @@
+# STREAMING (NDJSON) API RESPONSES
+import json
+from flask import Response, request, stream_with_context
+
+NDJSON_MIMETYPE = 'application/x-ndjson'
+
+
+def wants_ndjson():
+    """Returns if the client asked for a streamed response (Accept: application/x-ndjson)."""
+    return request.accept_mimetypes.best_match(['application/json', NDJSON_MIMETYPE]) == NDJSON_MIMETYPE
+
+
+def ndjson_response(records, headers=None):
+    """Streams records as newline delimited JSON.
+
+    Args:
+        records: An iterable (usually a generator) of JSON serializable records. Each record is
+            encoded and sent as soon as it is produced, so the client can start on the first
+            records while the rest are still being read, and only one record is held at a time.
+        headers: Extra response headers.
+
+    Returns:
+        The streamed response.
+    """
+    def generate():
+        for record in records:
+            yield json.dumps(record, default=str) + '\n'
+    response = Response(stream_with_context(generate()), mimetype=NDJSON_MIMETYPE, headers=headers)
+    # proxies (e.g. nginx) would otherwise buffer the stream until it ends
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
@@ -0,0 +1,198 @@
+# WORKER WARM-UP AND READINESS
+import time
+import threading
+import pymongo
+from contextlib import contextmanager
+from euv_spectra_app.config import Config
+from euv_spectra_app.extensions import db, cache, model_parameter_grid, photosphere_models, result_cache
+
+
+class WarmupState():
+    """The progress of the warm-up, reported by /healthz/ready.
+
+    With gunicorn --preload the warm-up runs once in the master and the workers fork with
+    its state, so they are ready from the start. Otherwise each worker warms up on its own.
+    The status is 'pending' until the warm-up starts, 'running' while it runs, and 'ready'
+    once every step has run. A step that fails is recorded in errors and the warm-up goes on,
+    the cost is only that the first request that needs it pays for it.
+    """
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.status = 'pending'
+        self.started_at = None
+        self.finished_at = None
+        # step name -> seconds, in the order the steps ran
+        self.steps = {}
+        # step name -> error message
+        self.errors = {}
+
+    @contextmanager
+    def step(self, name):
+        """Times a warm-up step and records its error instead of raising it."""
+        started = time.perf_counter()
+        try:
+            yield
+        except Exception as e:
+            print(f'Warm-up step "{name}" failed: {e}')
+            self.errors[name] = str(e)
+        finally:
+            self.steps[name] = time.perf_counter() - started
+
+    def to_dict(self):
+        duration = None
+        if self.started_at is not None:
+            duration = (self.finished_at or time.time()) - self.started_at
+        return {
+            'status': self.status,
+            'seconds': round(duration, 3) if duration is not None else None,
+            'steps': {name: round(seconds * 1000, 1) for name, seconds in self.steps.items()},
+            'errors': dict(self.errors),
+        }
+
+
+warmup_state = WarmupState()
+
+
+def load_collection(collection):
+    """Reads every document of a collection, so it is in Mongo's cache, and returns how many there are."""
+    return sum(1 for _ in collection.find({}, batch_size=1000))
+
+
+def get_most_requested_spectra(limit, collection=None):
+    """Returns the filenames of the model spectra matched most often by recently viewed results.
+
+    Viewing a cached result pushes its expiry back, so the results with the latest expiry are
+    the ones viewed most recently.
+
+    Args:
+        limit: The number of filenames to return.
+        collection: The result_cache collection to read (the shared client's by default).
+    """
+    pipeline = [
+        {'$sort': {'expires_at': -1}},
+        {'$limit': Config.WARMUP_RECENT_RESULTS},
+        {'$unwind': '$matching_models'},
+        {'$group': {'_id': '$matching_models.fits_filename', 'count': {'$sum': 1}}},
+        {'$match': {'_id': {'$ne': None}}},
+        {'$sort': {'count': -1}},
+        {'$limit': limit},
+    ]
+    return [row['_id'] for row in (collection if collection is not None else result_cache).aggregate(pipeline)]
+
+
+def run_warmup(database=None):
+    """Loads everything the first requests would otherwise pay for, one timed step at a time.
+
+    Steps: the heavy modules (astropy, astroquery, plotly, scipy), the Mongo connection pool,
+    the grid version, the subtype, photosphere, and *_grid collections, the GALEX epoch table and
+    source index, the FITS manifest, the test spectra and the most requested spectra (decoded and
+    compressed), and the cache backend.
+
+    Args:
+        database: The database to warm up from (the shared client's by default, a temporary
+            client's when warming up in the gunicorn master).
+    """
+    from euv_spectra_app.startup import load_lazy_modules
+    from euv_spectra_app.helpers_grid import grid_version
+    from euv_spectra_app.helpers_galex_epochs import galex_epochs
+    from euv_spectra_app.helpers_galex_store import galex_index
+    from euv_spectra_app.helpers_spectra import spectra
+    from euv_spectra_app.helpers_matching import TEST_FILEPATH_NAMES
+    state = warmup_state
+    if database is None:
+        database = db
+    with state.lock:
+        if state.status != 'pending':
+            return
+        state.status = 'running'
+        state.started_at = time.time()
+    with state.step('import heavy modules'):
+        load_lazy_modules()
+    with state.step('connect to mongo'):
+        database.command('ping')
+    with state.step('grid version'):
+        grid_version.refresh(force=True, database=database)
+    with state.step('subtype table'):
+        load_collection(database.get_collection(model_parameter_grid.name))
+    with state.step('photosphere table'):
+        load_collection(database.get_collection(photosphere_models.name))
+    with state.step('grid collections'):
+        for name in sorted(grid_version.collections):
+            if name != 'photosphere_models':
+                load_collection(database.get_collection(name))
+    with state.step('GALEX epoch table'):
+        galex_epochs.refresh(force=True, collection=database.mast_galex_times)
+    with state.step('GALEX source index'):
+        galex_index.refresh(database=database)
+    with state.step('FITS manifest'):
+        spectra.refresh(force=True)
+    with state.step('test spectra'):
+        # the results pages fall back to these for models without a FITS file yet
+        for filename in TEST_FILEPATH_NAMES:
+            spectra.get_payload(filename)
+    with state.step('most requested spectra'):
+        for filename in get_most_requested_spectra(Config.WARMUP_SPECTRA_COUNT, database.get_collection(result_cache.name)):
+            spectra.get_payload(filename)
+    with state.step('cache backend'):
+        check_cache()
+    with state.lock:
+        state.status = 'ready'
+        state.finished_at = time.time()
+    print(f'Warm-up finished in {state.finished_at - state.started_at:.1f} s'
+          + (f' ({len(state.errors)} steps failed)' if state.errors else ''))
+
+
+def start_warmup():
+    """Runs the warm-up in a background thread of this worker, so it can answer health checks meanwhile.
+
+    Nothing is started if the worker was forked from a master that already warmed up.
+    """
+    if not Config.WARMUP_ENABLED:
+        with warmup_state.lock:
+            warmup_state.status = 'ready'
+        return
+    if warmup_state.status != 'pending':
+        return
+    threading.Thread(target=run_warmup, name='warmup', daemon=True).start()
+
+
+def check_cache():
+    """Writes and reads back a value in the cache backend, raising if the round trip fails."""
+    key = f'healthz:{threading.get_ident()}'
+    cache.set(key, 1, timeout=60)
+    if cache.get(key) != 1:
+        raise RuntimeError('cache read back a different value')
+
+
+def check_dependency(check):
+    """Runs a dependency check and returns if it passed, its latency, and its error if it failed."""
+    started = time.perf_counter()
+    try:
+        check()
+        error = None
+    except Exception as e:
+        error = str(e)
+    result = {'ok': error is None, 'latency_ms': round((time.perf_counter() - started) * 1000, 1)}
+    if error is not None:
+        result['error'] = error
+    return result
+
+
+def ping_mongo():
+    """Pings the Mongo server, failing after HEALTH_CHECK_TIMEOUT instead of the client's server selection timeout."""
+    with pymongo.timeout(Config.HEALTH_CHECK_TIMEOUT):
+        db.command('ping')
+
+
+def get_readiness():
+    """Returns if this worker is ready for traffic, with its warm-up status and dependency latencies.
+
+    A worker is ready once the warm-up finished (in the gunicorn master or in the worker) and Mongo and the cache backend answer.
+    """
+    dependencies = {
+        'mongo': check_dependency(ping_mongo),
+        'cache': check_dependency(check_cache),
+    }
+    warmup = warmup_state.to_dict()
+    ready = warmup['status'] == 'ready' and all(dependency['ok'] for dependency in dependencies.values())
+    return {'ready': ready, 'warmup': warmup, 'dependencies': dependencies}
@@ -1,16 +1,19 @@
-import json
-import plotly
 import os
 import zipfile
 import io
-import itertools
 from flask import Blueprint, request, render_template, redirect, url_for, session, flash, current_app, jsonify, send_file, send_from_directory
 from flask_mail import Message
-from datetime import timedelta
+from werkzeug.utils import secure_filename
 from euv_spectra_app.extensions import *
 from euv_spectra_app.main.forms import ManualForm, StarNameForm, PositionForm, ModalForm, ContactForm
-from euv_spectra_app.models import StellarObject, PegasusGrid
-from euv_spectra_app.helpers import insert_data_into_form, to_json, from_json, create_plotly_graph, remove_objs_from_obj_dict
+from euv_spectra_app.models import StellarObject
+from euv_spectra_app.helpers import insert_data_into_form, remove_objs_from_obj_dict
+from euv_spectra_app.helpers_session import store_stellar_object, load_stellar_object, stellar_object_from_dict
+from euv_spectra_app.helpers_matching import get_result, load_result, get_graph_gzip, TEST_FILEPATH_NAMES
+from euv_spectra_app.helpers_batch import start_search_job
+from euv_spectra_app.helpers_http_cache import make_etag, is_not_modified, not_modified, apply_cache_headers, file_last_modified
+from euv_spectra_app.helpers_jobs import get_job, get_job_results
+from euv_spectra_app.helpers_compression import precompressed_response
 main = Blueprint("main", __name__)
 
 @main.context_processor
@@ -21,9 +24,10 @@ def inject_form():
 @main.before_request
 def make_session_permanent():
     """Initialize session."""
-    session.permanent = True
-    app.permanent_session_lifetime = timedelta(minutes=60)
-    if not session.get('modal_show'):
+    # only set when missing, so requests that change nothing do not write the session
+    if not session.permanent:
+        session.permanent = True
+    if 'modal_show' not in session:
         session['modal_show'] = False
 
 
@@ -42,26 +46,24 @@ def homepage():
     modal_form = ModalForm()
 
     if request.method == 'POST':
+        # Search the catalogs in a background job so this worker is not blocked while the catalogs
+        # answer. The page polls the job and shows the modal when it is done.
+        job_id = None
         if position_form.validate_on_submit():
             # Home position form
             print('position form validated!')
-            stellar_object.position = position_form.coords.data
-            stellar_object.get_stellar_parameters()
+            job_id = start_search_job(position=position_form.coords.data)
         elif name_form.validate_on_submit():
             # Home name form
             print(f'name form validated!')
-            stellar_object.star_name = name_form.star_name.data
-            stellar_object.get_stellar_parameters()
-
-        if hasattr(stellar_object, 'modal_page_error_msg'):
-            # check if there were any errors returned from searching databases
-            return redirect(url_for('main.error', msg=stellar_object.modal_page_error_msg))
-        for msg in stellar_object.modal_error_msgs:
-            flash(msg, 'warning')
-        insert_data_into_form(stellar_object, modal_form)
+            job_id = start_search_job(star_name=name_form.star_name.data)
+        if job_id is not None:
+            session['search_job_id'] = job_id
+            return redirect(url_for('main.search_result', job_id=job_id))
 
-        # store the object as a json variable for persistence
-        session['stellar_object'] = json.dumps(to_json(stellar_object))
+        insert_data_into_form(stellar_object, modal_form)
+        # store the object in the session for persistence
+        store_stellar_object(stellar_object)
         session['modal_show'] = True
         return render_template('home.html', manual_form=manual_form, name_form=name_form, position_form=position_form, modal_form=modal_form, stellar_obj=stellar_object)
 
@@ -69,18 +71,70 @@ def homepage():
     return render_template('home.html', manual_form=manual_form, name_form=name_form, position_form=position_form, extend_form=extend_form)
 
 
+@main.route('/search-jobs/<job_id>')
+def search_job_status(job_id):
+    """Returns the progress of a search job as JSON, polled by the home page."""
+    if session.get('search_job_id') != job_id:
+        return jsonify({'error': 'No search found.'}), 404
+    job = get_job(job_id)
+    if job is None:
+        return jsonify({'error': 'No search found.'}), 404
+    return jsonify({'status': job['status'], 'step': job.get('step'),
+                    'result_url': url_for('main.search_result', job_id=job_id)})
+
+
+@main.route('/search-result/<job_id>')
+def search_result(job_id):
+    """Shows the modal for a finished search job, or the loading screen while it is still running."""
+    manual_form = ManualForm()
+    name_form = StarNameForm()
+    position_form = PositionForm()
+    modal_form = ModalForm()
+    job = get_job(job_id) if session.get('search_job_id') == job_id else None
+    if job is None:
+        flash('Your search expired or could not be found. Please search again.', 'warning')
+        return redirect(url_for('main.homepage'))
+    if job['status'] == 'failed':
+        return redirect(url_for('main.error', msg=job.get('error')))
+    if job['status'] != 'done':
+        # still searching, the page polls the job and comes back here when it is done
+        session['modal_show'] = False
+        return render_template('home.html', manual_form=manual_form, name_form=name_form, position_form=position_form, search_job_id=job_id)
+
+    result = get_job_results(job_id, 0, 1)[0]['result']
+    if result.get('modal_page_error_msg'):
+        # check if there were any errors returned from searching databases
+        return redirect(url_for('main.error', msg=result['modal_page_error_msg']))
+    stellar_object = stellar_object_from_dict(result)
+    for msg in stellar_object.modal_error_msgs:
+        flash(msg, 'warning')
+    insert_data_into_form(stellar_object, modal_form)
+
+    # store the object in the session for persistence
+    store_stellar_object(stellar_object)
+    session['modal_show'] = True
+    return render_template('home.html', manual_form=manual_form, name_form=name_form, position_form=position_form, modal_form=modal_form, stellar_obj=stellar_object)
+
+
 @main.route('/modal-submit', methods=['GET', 'POST'])
 def submit_modal_form():
-    """Submit route for modal form."""
+    """Submit route for modal form.
+
+    Args:
+        result: Optional permalink hash of the results page the form was submitted from. The
+            edits then start from the stellar object of those results instead of the session's.
+    """
     manual_form = ManualForm()
     name_form = StarNameForm()
     position_form = PositionForm()
     modal_form = ModalForm()
 
-    # Retrieve the JSON formatted string from the session
-    target_json = session.get('stellar_object')
-    # Deserialize the JSON formatted string back into an object
-    stellar_object = from_json(target_json)
+    # Retrieve the stellar object from the results page or the session
+    result = load_result(request.args['result']) if request.args.get('result') else None
+    if result is not None and not result.get('error'):
+        stellar_object = stellar_object_from_dict(result['stellar_object'])
+    else:
+        stellar_object = load_stellar_object()
     # Populate the modal form with data from object
     insert_data_into_form(stellar_object, modal_form)
     modal_form.populate_obj(request.form)
@@ -105,7 +159,7 @@ def submit_modal_form():
                                 setattr(stellar_object.fluxes, unmanual_field, float(field.data))
                         else:
                             setattr(stellar_object, unmanual_field, float(field.data))
-            session['stellar_object'] = json.dumps(to_json(stellar_object))
+            store_stellar_object(stellar_object)
             return redirect(url_for('main.return_results'))
     return render_template('home.html', manual_form=manual_form, name_form=name_form, position_form=position_form, modal_form=modal_form, stellar_obj=stellar_object)
 
@@ -215,16 +269,16 @@ def submit_manual_form():
             stellar_object.teff, stellar_object.logg, stellar_object.mass)
         # remove any objects within the stellar object and assign it to fluxes
         stellar_object.fluxes.stellar_obj = remove_objs_from_obj_dict(
-            stellar_object.__dict__.copy())
+            stellar_object.to_dict())
         # run the check null, saturated, and upper limits fluxes
         stellar_object.fluxes.check_null_fluxes()
         stellar_object.fluxes.check_saturated_fluxes()
         stellar_object.fluxes.check_upper_limit_fluxes()
         print('FINAL')
-        print(vars(stellar_object))
-        print(vars(stellar_object.fluxes))
-        # store stellar object is session as json
-        session['stellar_object'] = json.dumps(to_json(stellar_object))
+        print(stellar_object.to_dict())
+        print(stellar_object.fluxes.to_dict())
+        # store stellar object in session
+        store_stellar_object(stellar_object)
         return redirect(url_for('main.return_results'))
     else:
         flash('Whoops, something went wrong. Please check your inputs and try again!', 'danger')
@@ -236,314 +290,94 @@ def submit_manual_form():
 
 @main.route('/results', methods=['GET', 'POST'])
 def return_results():
-    """Submit route for results."""
-    modal_form = ModalForm()
-    name_form = StarNameForm()
-    position_form = PositionForm()
+    """Submit route for results.
 
-    # For populating modal form with stellar object data if user wants to edit parameters
-    # Retrieve the JSON formatted string from the session
-    target_json = session.get('stellar_object')
-    # Deserialize the JSON formatted string back into an object
-    stellar_object = from_json(target_json)
-    print('STELLAR OBJ RETURN', vars(stellar_object),
-          vars(stellar_object.fluxes))
-    # Populate the modal form with data from object
-    insert_data_into_form(stellar_object, modal_form)
+    Looks up (or computes and caches) the results of the stellar object in the session and
+    redirects to their permalink.
+    """
+    # Retrieve the stellar object from the session
+    stellar_object = load_stellar_object()
+    print('STELLAR OBJ RETURN', stellar_object.to_dict(),
+          stellar_object.fluxes.to_dict())
 
     # STEP 1: Check if all stellar intrinstic parameters are available to start querying pegasus
     if stellar_object.has_all_stellar_parameters():
         print('HAS ALL STELLAR PARAMETERS, CONTINUING')
-        '''———————————FOR TESTING PURPOSES (Test file)——————————'''
-        # original test filename is M0.Teff=3850.logg=4.78.TRgrad=9.cmtop=6.cmin=4.fits
-        test_filepaths = [
-            os.path.abspath(f"euv_spectra_app/fits_files/test/original_test.fits"),
-            os.path.abspath(f"euv_spectra_app/fits_files/test/new_test.fits"),
-            os.path.abspath(f"euv_spectra_app/fits_files/test/new_test_0.fits"),
-            os.path.abspath(f"euv_spectra_app/fits_files/test/new_test_1.fits"),
-            os.path.abspath(f"euv_spectra_app/fits_files/test/new_test_2.fits"),
-            os.path.abspath(f"euv_spectra_app/fits_files/test/new_test_3.fits"),
-            os.path.abspath(f"euv_spectra_app/fits_files/test/new_test_4.fits"),
-            os.path.abspath(f"euv_spectra_app/fits_files/test/new_test_5.fits"),
-            os.path.abspath(f"euv_spectra_app/fits_files/test/new_test_6.fits"),
-            os.path.abspath(f"euv_spectra_app/fits_files/test/new_test_7.fits")
-        ]
-        test_filepath_names = [
-            "original_test.fits", "new_test.fits", "new_test_0.fits", "new_test_1.fits",
-            "new_test_2.fits", "new_test_3.fits", "new_test_4.fits", "new_test_5.fits",
-            "new_test_6.fits", "new_test_7.fits"
-        ]
-        """———————————END TEST FILE DATA——————————"""
-        # STEP 2: Prepare GALEX fluxes for searching the grid
-        stellar_object.fluxes.convert_scale_photosphere_subtract_fluxes()
-
-        # STEP 3: Create new PegasusGrid object and insert the stellar object with corrected fluxes
-        pegasus = PegasusGrid(stellar_object)
-
-        # STEP 4: Search the model_parameter_grid collection to find closest matching stellar subtype
-        subtype = pegasus.query_pegasus_subtype()
-        stellar_object.model_subtype = subtype['model']
-        print('SUBTYPE', stellar_object.model_subtype)
-
-        # STEP 5: Check if model subtype data exists in database
-        model_collection = f'{stellar_object.model_subtype.lower()}_grid'
-        if model_collection not in db.list_collection_names():
-            error_msg = f'The grid for model subtype {stellar_object.model_subtype} is currently unavailable. \
-                          Currently available subtypes: M0, M3, M4, M6. \nPlease contact us with your stellar \
-                          parameters and returned subtype if you think this is incorrect.'
-            return redirect(url_for('main.error', msg=error_msg))
-
-        # STEP 6: Instantiate the following objects
-        plot_data = {}  # Dict to hold all data to plot
-        using_test_data = False # Bool to determine if we are using test data
-        model_index = 0  # Instantiating model index
-        return_models = [] # Instantiating list to hold all returned models
-
-        # STEP 7: Add the GALEX fluxes to plot data
-        for flux in ['fuv', 'nuv']:
-            key = f'galex_{flux}'
-            plot_data[key] = {'name': f'GALEX Processed {flux.upper()}'}
-            if flux == 'fuv':
-                plot_data[key]['wavelength'] = 1542
-            elif flux == 'nuv':
-                plot_data[key]['wavelength'] = 2315
-            err = getattr(stellar_object.fluxes, f'{flux}_err')
-            if getattr(stellar_object.fluxes, f'{flux}_is_saturated'):
-                plot_data[key]['name'] += '<br>(Saturated)'
-                plot_data[key]['flux_density'] = getattr(stellar_object.fluxes, f'processed_{flux}_saturated')
-                plot_data[key]['flag'] = 'saturated'
-            elif getattr(stellar_object.fluxes, f'{flux}_is_upper_limit'):
-                plot_data[key]['name'] += '<br>(Upper Limit)'
-                plot_data[key]['flux_density'] = getattr(stellar_object.fluxes, f'processed_{flux}_upper_limit')
-                plot_data[key]['flag'] = 'upper_limit'
-            else:
-                plot_data[key]['flux_density'] = getattr(stellar_object.fluxes, f'processed_{flux}')
-                if err is not None:
-                    plot_data[key]['flux_density_err'] = err
-
-        # STEP 8: Get all possible searchable values of FUV and NUV from the GalexFluxes object
-        fuv_dict = {} # Dict to hold all FUV values
-        nuv_dict = {} # Dict to hold all NUV values
-        for key, val in vars(stellar_object.fluxes).items():
-            if 'processed' in key: # Only use processed fluxes
-                flux = None
-                # Get which flux (FUV or NUV) if it is a value and is not an error value
-                if 'fuv' in key and 'err' not in key:
-                    flux = 'fuv'
-                elif 'nuv' in key and 'err' not in key:
-                    flux = 'nuv'
-                if flux is not None:
-                    # If the key is a valid flux value, assign the data to the corresponding dict
-                    flux_dict = locals().get(f'{flux}_dict') # Get the dictionary dynamically
-                    flux_dict[key] = {'value': val} # Add the value of the flux
-                    flux_dict[key]['error'] = None # Set the error as None by default
-                    # Add flags and error if it exists
-                    if key == f'processed_{flux}' and hasattr(stellar_object.fluxes, f'processed_{flux}_err'):
-                        # If there is an error, this means it is a normal flux. Add flag and error
-                        flux_dict[key]['error'] = getattr(stellar_object.fluxes, f'processed_{flux}_err')
-                        flux_dict[key]['flag'] = 'normal'
-                    elif 'saturated' in key:
-                        # If it is saturated, add flag
-                        flux_dict[key]['flag'] = 'saturated'
-                    elif 'upper_limit' in key:
-                        # If it is upper limit, add flag
-                        flux_dict[key]['flag'] = 'upper_limit'
-                    else:
-                        # If it is none of these, means it is normal flux w/o error (detection only)
-                        flux_dict[key]['flag'] = 'detection_only'
-
-        # STEP 9: Get all possible combinations of fuv-nuv pairs. These are the pairs of fluxes that will be 
-        # used for PEGASUS grid searches.
-        key_pairs = list(itertools.product(list(fuv_dict), list(nuv_dict)))
-        # STEP 10: Iterate over each pair and run PEGASUS grid search on each pair
-        for fuv_key, nuv_key in key_pairs:
-            # STEP 10.1: Retrieve the fuv and nuv values using the keys from the dictionaries
-            fuv_value = fuv_dict[fuv_key]
-            nuv_value = nuv_dict[nuv_key]
-            print(f'SEARCHING USING FUV: {fuv_value}, NUV:{nuv_value}')
-            # STEP 10.2: Call the search_db function with the fuv and nuv values
-            models = pegasus.query_model_collection(fuv_value, nuv_value)
-            # STEP 10.3: Do additional processing on the returned models depending on the flag
-            # SATURATED/UPPER LIMIT WORK FLOW:
-                # If one val is saturated/upper limit and one val is normal and no models are returned,
-                # will need to increase error bars of normal flux by 3 sigma, then by 5 sigma
-                # If both fluxes are an upper limit or saturated value, just return the model with the 
-                # lowest chi-squared value (which will be the first model because they are already sorted)
-            if (fuv_value['flag'] == 'saturated' or fuv_value['flag'] == 'upper_limit') and nuv_value['flag'] == 'normal':
-                # For saturated/upper limit FUV flux and a normal NUV flux
-                # _ results found within upper and lower limits of the GALEX NUV flux and upper limits of GALEX FUV (upper limit)
-                if len(models) > 0:
-                    flash(f'{len(models)} results found within the upper and lower limits of your submitted UV fluxes.', 'success')
-                if len(models) == 0:
-                    print(f'NO MODELS FOUND IN FIRST SAT SEARCH, GROWING BARS BY 3')
-                    # grow nuv error bars by three
-                    nuv_copy = nuv_value.copy()
-                    nuv_copy['error'] = nuv_copy['error'] * 3
-                    models = pegasus.query_model_collection(
-                        fuv_value, nuv_copy)
-                    if len(models) > 0:
-                        flash(f'{len(models)} results found within 3 σ of the GALEX NUV flux.', 'success')
-                if len(models) == 0:
-                    print(f'NO MODELS FOUND IN FIRST SAT SEARCH, GROWING BARS BY 5')
-                    # grow nuv error bars by five
-                    nuv_copy = nuv_value.copy()
-                    nuv_copy['error'] = nuv_copy['error'] * 5
-                    models = pegasus.query_model_collection(
-                        fuv_value, nuv_copy)
-                    if len(models) > 0:
-                        flash(f'{len(models)} results found within 5 σ of the GALEX NUV flux.', 'success')
-                if len(models) == 0:
-                    # if there are still no models, flash error
-                    flash('No models found within 5 σ of the GALEX NUV flux measurements.', 'danger')
-            elif (nuv_value['flag'] == 'saturated' or nuv_value['flag'] == 'upper_limit') and fuv_value['flag'] == 'normal':
-                # For saturated/upper limit NUV flux and a normal FUV flux
-                if len(models) > 0:
-                    flash(f'{len(models)} results found within the upper and lower limits of your submitted UV fluxes.', 'success')
-                if len(models) == 0:
-                    # grow fuv error bars by three
-                    print(f'NO MODELS FOUND IN FIRST UPPER LIM SEARCH, GROWING BARS BY 3')
-                    fuv_copy = fuv_value.copy()
-                    fuv_copy['error'] = fuv_copy['error'] * 3
-                    models = pegasus.query_model_collection(
-                        fuv_copy, nuv_value)
-                    if len(models) > 0:
-                        flash(f'{len(models)} results found within 3 σ of the GALEX FUV flux.', 'success')
-                if len(models) == 0:
-                    # grow fuv error bars by three
-                    print(f'NO MODELS FOUND IN FIRST UPPER LIM SEARCH, GROWING BARS BY 5')
-                    fuv_copy = fuv_value.copy()
-                    fuv_copy['error'] = fuv_copy['error'] * 5
-                    models = pegasus.query_model_collection(
-                        fuv_copy, nuv_value)
-                    if len(models) > 0:
-                        flash(f'{len(models)} results found within 5 σ of the GALEX FUV flux.', 'success')
-                if len(models) == 0:
-                    # if there are still no models, flash error
-                    flash('No models found within 5 σ of the GALEX FUV flux measurements.', 'danger')
-            elif (fuv_value['flag'] == 'saturated' or nuv_value['flag'] == 'saturated') and (fuv_value['flag'] == 'upper_limit' or nuv_value['flag'] == 'upper_limit'):
-                # return first model (lowest chi-squared value)
-                if len(models) > 0:
-                    flash(f'{len(models)} results found within upper and lower limits of GALEX UV fluxes. Returning model with lowest chi-squared value.', 'success')
-                    models = [models[0]]
-                else:
-                    flash('No results found within GALEX UV fluxes.', 'danger')
-            elif (fuv_value['flag'] == 'saturated' and nuv_value['flag'] == 'saturated'):
-                if len(models) > 0:
-                    flash(f'{len(models)} results found within GALEX UV fluxes. Returning model with lowest chi-squared value.', 'success')
-                    models = [models[0]]
-                else:
-                    flash('No results found within GALEX UV fluxes.', 'danger')
-            elif (fuv_value['flag'] == 'upper_limit' and nuv_value['flag'] == 'upper_limit'):
-                if len(models) > 0:
-                    flash(f'{len(models)} results found within GALEX UV fluxes. Returning model with lowest chi-squared value.', 'success')
-                    models = [models[0]]
-                else:
-                    flash('No results found within GALEX UV fluxes.', 'danger')
-            # DETECTION ONLY WORKFLOW
-                # The models will be sorted by the diff_flux field, so the first model will have the closest 
-                # value to the given detection. Just return the first model.
-            if fuv_value['flag'] == 'detection_only' or nuv_value['flag'] == 'detection_only':
-                if len(models) > 0: # Check if there are returned models first
-                    models = [models[0]]
-                    flash('Returning closest match to GALEX UV fluxes.', 'warning')
-                else:
-                    flash('No results found within GALEX UV fluxes.', 'danger')
-            # NORMAL WORKFLOW
-                # If no models are found within the error bars of the given fluxes,
-                # search for models weighted on the FUV. If no models are returned 
-                # weighted on FUV, just return models with lowest chi squared value.
-            if fuv_value['flag'] == 'normal' and nuv_value['flag'] == 'normal':
-                if len(models) == 0:
-                    # Do chi squared test between all models within selected subgrid and corrected observation
-                    models_with_chi_squared = pegasus.query_pegasus_chi_square()
-                    # If there are no models found within limits, return models ONLY with FUV < NUV, return with chi squared values
-                    models_weighted = pegasus.query_pegasus_weighted_fuv()
-                    if len(models_weighted) > 0:
-                        # If there are weighted results, use those
-                        flash('No results found within upper and lower limits of UV fluxes. Returning document with nearest chi squared value weighted towards the FUV.', 'warning')
-                        models = [models_weighted[0]]
-                    else:
-                        # If no weighted results, just use model with lowest chi squared
-                        flash('No results found within upper and lower limits of UV fluxes. No model found with a close FUV match. Returning model with lowest chi-square value.', 'warning')
-                        models = [models_with_chi_squared[0]]
-                else:
-                    flash(f'{len(models)} results found within the upper and lower limits of your submitted UV fluxes.', 'success')
-            # STEP 11: After getting models for this search, we need to add each model to the plot data and 
-            # add any flags the models may have.
-            # Flags include:
-                # If there are saturated fluxes and this is a saturated search, add saturated option A flag
-                # If there are upper limit fluxes and this is a upper limit search, add upper limit option A flag
-                # If there are saturated fluxes and this is a normal search, add saturated option B flag
-                # If there are upper limit fluxes and this is a normal search, add upper limit option B flag
-                # If there are both saturated and upper limit fluxes, add saturated and upper limit option A flag
-            # STEP 11.1: Append all models to the return models list for return table
-            return_models += models
-            # STEP 11.2: Iterate over each model returned and add data and flag (if applicable)
-            for doc in models:
-                # for each matching model that comes back, get the filepath so we can check if it exists later
-                filepath = os.path.abspath(
-                    f"euv_spectra_app/fits_files/{stellar_object.model_subtype}/{doc['fits_filename']}")
-                key = f'model_{model_index}'
-                plot_data[key] = {'index': model_index, # Add index for num tracking on return page
-                                  'nuv': doc['nuv'], # Add NUV flux
-                                  'fuv': doc['fuv'], # Add FUV flux
-                                  'euv': doc['euv']} # Add EUV flux
-                model_index += 1 # After adding the model, increment the index
-                # Check if the model's filepath exists, if not use a test file
-                if os.path.exists(filepath):
-                    # if the filepath exists, add to plot data
-                    plot_data[key]['filepath'] = filepath
-                else:
-                    # else if the filepath doesn't exist, add a test file
-                    '''——————FOR TESTING PURPOSES (if FITS file is not yet available)—————'''
-                    plot_data[key]['filepath'] = test_filepaths[model_index-1]
-                    # set using test data to True so test flash message will be sent to return template
-                    using_test_data = True
-                # Now add the flag if there is one.
-                if (stellar_object.fluxes.fuv_is_saturated or stellar_object.fluxes.nuv_is_saturated) and (stellar_object.fluxes.fuv_is_upper_limit or stellar_object.fluxes.nuv_is_upper_limit):
-                    # If there are both saturated and upper limit fluxes, add saturated and upper limit option A flag
-                    plot_data[key]['flag'] = 'Saturated and Upper Limit<br> Search Option A<sup>[5]</sup>'
-                elif (stellar_object.fluxes.fuv_is_saturated or stellar_object.fluxes.nuv_is_saturated):
-                    # If there are saturated fluxes and this is a saturated search, add saturated option A flag
-                    if (fuv_value['flag'] == 'saturated' or nuv_value['flag'] == 'saturated'):
-                        plot_data[key]['flag'] = 'Saturated Search<br> Option A<sup>[5]</sup>'
-                    # If there are saturated fluxes and this is a normal search, add saturated option B flag
-                    if (fuv_value['flag'] == 'normal' and nuv_value['flag'] == 'normal'):
-                        plot_data[key]['flag'] = 'Saturated Search<br> Option B<sup>[5]</sup>'
-                elif (stellar_object.fluxes.fuv_is_upper_limit or stellar_object.fluxes.nuv_is_upper_limit):
-                    # If there are upper limit fluxes and this is a upper limit search, add upper limit option A flag
-                    if (fuv_value['flag'] == 'upper_limit' or nuv_value['flag'] == 'upper_limit'):
-                        plot_data[key]['flag'] = 'Upper Limit Search<br> Option A<sup>[5]</sup>'
-                    # If there are upper limit fluxes and this is a normal search, add upper limit option B flag
-                    if (fuv_value['flag'] == 'normal' and nuv_value['flag'] == 'normal'):
-                        plot_data[key]['flag'] = 'Upper Limit Search<br> Option B<sup>[5]</sup>'
-        # STEP 12: Generate plot using the compiled data
-        plotly_fig = create_plotly_graph(plot_data)
-        graphJSON = json.dumps(
-            plotly_fig, cls=plotly.utils.PlotlyJSONEncoder)
-        # STEP 13: If using test data, add flash so user knows that test data is being used
-        if using_test_data == True:
-            flash('EUV data not available yet, using test data for viewing purposes. Please contact us for more information.', 'danger')
-        session['stellar_target'] = json.dumps(to_json(stellar_object))
-        return render_template('result.html', modal_form=modal_form, name_form=name_form, position_form=position_form, graphJSON=graphJSON, stellar_obj=stellar_object, matching_models=return_models, test_filepaths=test_filepath_names)
+        # STEP 2: Get the results from the result cache, or search the grid and cache them
+        result = get_result(stellar_object)
+        if result.get('error'):
+            return redirect(url_for('main.error', msg=result['error']))
+        return redirect(url_for('main.result_permalink', result_hash=result['_id']))
     else:
         flash('Missing required stellar parameters. Submit the required data to view this page.', 'danger')
         return redirect(url_for('main.homepage'))
 
 
+@main.route('/results/<result_hash>')
+def result_permalink(result_hash):
+    """Shows cached results by their hash. The link can be shared, it does not depend on the session."""
+    modal_form = ModalForm()
+    name_form = StarNameForm()
+    position_form = PositionForm()
+
+    result = load_result(result_hash)
+    if result is None:
+        flash('These results could not be found. They may have expired, please search again.', 'warning')
+        return redirect(url_for('main.homepage'))
+    if result.get('error'):
+        return redirect(url_for('main.error', msg=result['error']))
+    if result['_id'] != result_hash:
+        # the grid changed and the results were recomputed under a new hash
+        return redirect(url_for('main.result_permalink', result_hash=result['_id']))
+
+    stellar_object = stellar_object_from_dict(result['stellar_object'])
+    # Populate the modal form with data from object, so the parameters can be edited. The
+    # viewer's session is left alone, the edits start from these results (see submit_modal_form)
+    # and the download URLs carry the model subtype.
+    insert_data_into_form(stellar_object, modal_form)
+    for message, category in result['messages']:
+        flash(message, category)
+    return render_template('result.html', modal_form=modal_form, name_form=name_form, position_form=position_form, figure_url=url_for('main.result_figure', result_hash=result_hash), modal_action=url_for('main.submit_modal_form', result=result_hash), stellar_obj=stellar_object, matching_models=result['matching_models'], test_filepaths=TEST_FILEPATH_NAMES)
+
+
+@main.route('/results/<result_hash>/figure.json')
+def result_figure(result_hash):
+    """Returns the plotly figure of cached results, loaded by the results page.
+
+    The figure is stored gzip compressed when the results are cached and is sent as stored,
+    and since the hash covers the inputs and the grid version it can be cached for good.
+    """
+    if is_not_modified(result_hash):
+        return not_modified('result', result_hash, weak=True)
+    result = load_result(result_hash)
+    if result is None or result.get('error') or result['_id'] != result_hash:
+        return jsonify('These results could not be found. They may have expired, please search again.'), 404
+    response = precompressed_response({'gzip': get_graph_gzip(result)}, 'application/json')
+    # weak, the same figure is sent compressed or not
+    return apply_cache_headers(response, 'result', result_hash, weak=True)
+
+
+def get_downloads_folder(filename):
+    """Returns the folder of a FITS file and the HTTP cache policy of downloading it.
+
+    The subtype folder comes from the subtype argument if given (the URL then fully
+    identifies the file, so it can be cached publicly), else from the stellar object in
+    the session.
+    """
+    subtype = request.args.get('subtype')
+    if 'test' in filename:
+        return os.path.join(current_app.root_path, app.config['FITS_FOLDER'], 'test'), 'spectra'
+    if subtype:
+        return os.path.join(current_app.root_path, app.config['FITS_FOLDER'], secure_filename(subtype)), 'spectra'
+    # Retrieve the stellar object from the session
+    stellar_target = load_stellar_object()
+    return os.path.join(current_app.root_path, app.config['FITS_FOLDER'], stellar_target.model_subtype), 'private'
+
+
 @main.route('/check-directory/<filename>')
 def check_directory(filename):
     """Checks if a FITS file exists."""
-    if 'test' in filename:
-        downloads = os.path.join(
-            current_app.root_path, app.config['FITS_FOLDER'], 'test')
-    else:
-        # Retrieve the JSON formatted string from the session
-        target_json = session.get('stellar_target')
-        # Deserialize the JSON formatted string back into an object
-        stellar_target = from_json(target_json)
-        downloads = os.path.join(
-            current_app.root_path, app.config['FITS_FOLDER'], stellar_target.model_subtype)
+    downloads, _ = get_downloads_folder(filename)
     if os.path.exists(os.path.join(downloads, filename)):
         return jsonify({'exists': True})
     else:
@@ -552,33 +386,39 @@ def check_directory(filename):
 
 @main.route('/download/<filename>/<model>', methods=['GET', 'POST'])
 def download(filename, model):
-    """Downloading FITS file on button click."""
-    if 'test' in filename:
-        downloads = os.path.join(
-            current_app.root_path, app.config['FITS_FOLDER'], 'test')
-    else:
-        # Retrieve the JSON formatted string from the session
-        target_json = session.get('stellar_target')
-        # Deserialize the JSON formatted string back into an object
-        stellar_target = from_json(target_json)
-        downloads = os.path.join(
-            current_app.root_path, app.config['FITS_FOLDER'], stellar_target.model_subtype)
+    """Downloading FITS file on button click.
+
+    The zip is cached by browsers and proxies, and revalidated with an ETag of the FITS and
+    README files' paths, sizes, and modification times, so a repeat download is a 304.
+    """
+    downloads, policy = get_downloads_folder(filename)
     file_path = os.path.join(downloads, filename)
+    readme_path = os.path.join(
+        current_app.root_path, app.config['FITS_FOLDER'], 'README.md')
+    etag = None
+    last_modified = None
     if not os.path.exists(file_path):
         flash('File is not available to download because it does not exist yet!', 'danger')
+    elif request.method == 'GET':
+        stats = [os.stat(file_path), os.stat(readme_path)]
+        etag = make_etag(file_path, model, [(stat.st_size, stat.st_mtime) for stat in stats])
+        last_modified = file_last_modified(*(stat.st_mtime for stat in stats))
+        if is_not_modified(etag, last_modified):
+            return not_modified(policy, etag, last_modified)
     # Create the zip file in memory
     memory_file = io.BytesIO()
     with zipfile.ZipFile(memory_file, 'w') as zipf:
         # Add the requested file to the zip
         zipf.write(file_path, filename)
         # Add the README file to the zip
-        readme_path = os.path.join(
-            current_app.root_path, app.config['FITS_FOLDER'], 'README.md')
         zipf.write(readme_path, 'README.txt')
     # Set the file pointer to the beginning of the file
     memory_file.seek(0)
     # Create a Flask response with the zip file
-    return send_file(memory_file, mimetype='application/zip', as_attachment=True, download_name=f'{model}.zip')
+    response = send_file(memory_file, mimetype='application/zip', as_attachment=True, download_name=f'{model}.zip')
+    if etag is not None:
+        apply_cache_headers(response, policy, etag, last_modified)
+    return response
 
 
 @main.route('/about', methods=['GET'])
@@ -1,32 +1,36 @@
 # FOR ASTROQUERY/GALEX DATA
 import numpy.ma as ma
 import math
-import requests
-from astropy.time import Time
-import astropy.units as u
-from astroquery.exceptions import ResolverError
-from astropy.coordinates import SkyCoord, Distance
-from astroquery.mast import Catalogs
-from astroquery.ipac.nexsci.nasa_exoplanet_archive import NasaExoplanetArchive
-from astroquery.simbad import Simbad
-from euv_spectra_app.extensions import db
 from euv_spectra_app.helpers_dbqueries import get_matching_subtype, get_matching_photosphere, search_db, get_models_with_chi_squared, get_models_with_weighted_fuv, get_flux_ratios
-
-customSimbad = Simbad()
-customSimbad.remove_votable_fields('coordinates')
-customSimbad.add_votable_fields(
-    'ra', 'dec', 'pmra', 'pmdec', 'plx', 'rv_value', 'typed_id')
+from euv_spectra_app.helpers_circuit_breaker import CircuitOpenError, SERVICE_FAILURES
+from euv_spectra_app.helpers_catalogs import search_simbad
+from euv_spectra_app.helpers_galex_store import lookup_galex
+from euv_spectra_app.helpers_proper_motion import pm_batcher
+from euv_spectra_app.helpers_galex_epochs import galex_epochs
+from euv_spectra_app.helpers_fluxes import mag_to_ujy
+from euv_spectra_app.helpers_nea_mirror import lookup_nea_host_names, lookup_nasa_exoplanet_archive
+from euv_spectra_app.startup import lazy_import
+
+u = lazy_import('astropy.units')
+astropy_coordinates = lazy_import('astropy.coordinates')
+astroquery_exceptions = lazy_import('astroquery.exceptions')
 
 """——————————————————————————————PROPER MOTION OBJECT——————————————————————————————"""   
 
 class ProperMotionData():
     """Represents proper motion data of a stellar object."""
+    __slots__ = ('pm_ra', 'pm_dec', 'plx', 'rad_vel')
+
     def __init__(self, pm_ra=None, pm_dec=None, plx=None, rad_vel=None):
         self.pm_ra = pm_ra
         self.pm_dec = pm_dec
         self.plx = plx
         self.rad_vel = rad_vel
 
+    def to_dict(self):
+        """Returns the attributes as a dict (the object has no __dict__)."""
+        return {field: getattr(self, field) for field in self.__slots__}
+
     def correct_pm(self, star_name, coords):
         """Corrects the given coordinates for proper motion using the GALEX observation time.
 
@@ -38,21 +42,15 @@ class ProperMotionData():
             tuple: A tuple containing two floats representing the corrected right ascension and declination coordinates.
 
         Raises:
-            TypeError: If the target star name is not found in the GALEX obs time collection (cannot get t_min)
-            KeyError: If the target star name is not found in the GALEX obs time collection
             ValueError: If the star name is not a valid string to search with
             Exception: If an error occurs during coordinate correction or any other error occurs during galex search.
         """
         try:
-            # STEP 1: Find a GALEX observation time from custom compiled dataset
-            galex_time = db.mast_galex_times.find_one(
-                {'target': star_name})['t_min']
-        except TypeError as te:
-            print(f'Galex obs time in depth error: {te}')
-            return(f'GALEX Error: Did not find matches in GALEX observations for {star_name if star_name else coords}. Unable to correct for proper motion.')
-        except KeyError as ke:
-            print(f'GALEX Error: GALEX obs time in depth error: {ke}')
-            return(f'GALEX Error: Did not find matches in GALEX observations for {star_name if star_name else coords}. Unable to correct for proper motion.')
+            # STEP 1: Find the earliest GALEX observation time from the in-memory GALEX epoch table
+            galex_time = galex_epochs.get_epoch(star_name)
+            if galex_time is None:
+                print(f'Galex obs time in depth error: no GALEX visits for {star_name}')
+                return(f'GALEX Error: Did not find matches in GALEX observations for {star_name if star_name else coords}. Unable to correct for proper motion.')
         except ValueError as ve:
             print(f'Galex obs time in depth error: {ve}')
             return(f'GALEX Error: Unable to search GALEX observations for {star_name if star_name else coords}. Unable to correct for proper motion.')
@@ -61,33 +59,31 @@ class ProperMotionData():
             return(f'GALEX Error: No GALEX observations found for {star_name if star_name else coords}. Unable to correct for proper motion.')
         else:
             try:
-                # STEP 2: If observation time is found, start coordinate correction by initializing variables
-                coordinates = coords[0] + ' ' + coords[1]
-                skycoord_obj = ''
-                # STEP 3: Calculate time difference between observation time and Jan 1st, 2000 (J2000)
-                t3 = Time(galex_time, format='mjd') - \
-                    Time(51544.0, format='mjd')
-                # STEP 4: Convert time (which will return in seconds) into years
-                td_year = t3.sec / 60 / 60 / 24 / 365.25
-                # STEP 5: Check to see if radial velocity is given then create SkyCoord object with all data
-                if self.rad_vel:
-                    skycoord_obj = SkyCoord(coordinates, unit=(u.hourangle, u.deg), distance=Distance(parallax=self.plx*u.mas, allow_negative=True),
-                                            pm_ra_cosdec=self.pm_ra*u.mas/u.yr, pm_dec=self.pm_dec*u.mas/u.yr, radial_velocity=self.rad_vel*u.km/u.s)
-                else:
-                    skycoord_obj = SkyCoord(coordinates, unit=(u.hourangle, u.deg), distance=Distance(
-                        parallax=self.plx*u.mas, allow_negative=True), pm_ra_cosdec=self.pm_ra*u.mas/u.yr, pm_dec=self.pm_dec*u.mas/u.yr)
-                # STEP 6: Use apply_space_motion function to calculate new coordinates
-                skycoord_obj = skycoord_obj.apply_space_motion(
-                    dt=td_year * u.yr)
-                # STEP 7: Add new coordinates to return data dict
-                return (skycoord_obj.ra.degree, skycoord_obj.dec.degree)
+                # STEP 2: Correct the coordinates with the batch correction, together with the
+                # searches correcting at the same time (e.g. the targets of a batch resolution)
+                corrected_ra, corrected_dec = pm_batcher.correct(
+                    coords[0], coords[1], self.pm_ra, self.pm_dec, self.plx, self.rad_vel, galex_time)
+                # STEP 3: Targets with missing proper motion data come back as NaN
+                if math.isnan(corrected_ra) or math.isnan(corrected_dec):
+                    return ('Unknown error during proper motion correction: missing proper motion or parallax data')
+                return (float(corrected_ra), float(corrected_dec))
             except Exception as e:
                 return (f'Unknown error during proper motion correction: {e}')
 
 """——————————————————————————————GALEX FLUXES OBJECT——————————————————————————————"""   
 
 class GalexFluxes():
-    """Represents GALEX flux values."""
+    """Represents GALEX flux values.
+
+    Every attribute is a declared slot, including the processed (converted, scaled, and
+    photosphere subtracted) variant of each flux and error, which stays None until
+    convert_scale_photosphere_subtract_fluxes runs.
+    """
+    FLUX_FIELDS = ('fuv', 'nuv', 'fuv_saturated', 'nuv_saturated', 'fuv_upper_limit', 'nuv_upper_limit')
+    ERROR_FIELDS = ('fuv_err', 'nuv_err')
+    FLAG_FIELDS = ('fuv_is_saturated', 'nuv_is_saturated', 'fuv_is_upper_limit', 'nuv_is_upper_limit')
+    PROCESSED_FIELDS = tuple(f'processed_{field}' for field in FLUX_FIELDS + ERROR_FIELDS)
+    __slots__ = FLUX_FIELDS + ERROR_FIELDS + FLAG_FIELDS + PROCESSED_FIELDS + ('stellar_obj',)
 
     def __init__(self, fuv=None, nuv=None, fuv_saturated=None, nuv_saturated=None, fuv_upper_limit=None, nuv_upper_limit=None, fuv_err=None, nuv_err=None, fuv_is_saturated=None, nuv_is_saturated=None, fuv_is_upper_limit=None, nuv_is_upper_limit=None, stellar_obj=None):
         self.fuv = fuv # GALEX FUV value (float)
@@ -103,6 +99,12 @@ class GalexFluxes():
         self.fuv_is_upper_limit = fuv_is_upper_limit # Boolean indicating if GALEX FUV is upper limit (bool)
         self.nuv_is_upper_limit = nuv_is_upper_limit # Boolean indicating if GALEX NUV is upper limit (bool)
         self.stellar_obj = stellar_obj # The stellar object associated with the GALEX fluxes
+        for field in self.PROCESSED_FIELDS:
+            setattr(self, field, None) # Processed flux or error, set by convert_scale_photosphere_subtract_fluxes (float)
+
+    def to_dict(self):
+        """Returns the attributes as a dict (the object has no __dict__)."""
+        return {field: getattr(self, field) for field in self.__slots__}
 
     def has_attr_val(self, attr):
         if hasattr(self, attr) and getattr(self, attr) is not None:
@@ -411,19 +413,8 @@ class GalexFluxes():
             return ('Can only run predictions on M stars at the moment.')
 
     def convert_mag_to_ujy(self, num, flux_type):
-        if flux_type == 'fuv':
-            # mag(AB) → erg/s/cm^2/A
-            # FUV = ( ( (10^(mag-18.82))/-2.5 ) * (1.4*10^-15) )
-            mag_to_flux = ((pow(10, ((num-18.82)/-2.5))) * (1.4e-15))
-            # erg/s/cm^2/A → uJY
-            flux_to_uJy = (((mag_to_flux * pow(1542.3, 2)) / (3e-5)) * (pow(10, 6)))
-        elif flux_type == 'nuv':
-            # mag(AB) → erg/s/cm^2/A
-            # NUV = ( ( (10^(mag-20.08))/-2.5 ) * (2.06*10^-16) )
-            mag_to_flux = ((pow(10, ((num-20.08)/-2.5))) * (2.06e-16))
-            # erg/s/cm^2/A → uJY
-            flux_to_uJy = (((mag_to_flux * pow(2274.4, 2)) / (3e-5)) * (pow(10, 6)))
-        return flux_to_uJy
+        """Converts a GALEX AB magnitude to microjanskies (see helpers_fluxes.mag_to_ujy, which also takes arrays)."""
+        return float(mag_to_ujy(num, flux_type))
 
     def convert_ujy_to_flux_density(self, num, wv):
         """Converts microjanskies to ergs/s/cm2/A."""
@@ -448,7 +439,7 @@ class GalexFluxes():
         """Subtracts the photospheric contributed flux from GALEX flux."""
         return chosen_flux - photo_flux
     
-    def convert_scale_photosphere_subtract_single_flux(self, flux, flux_type):
+    def convert_scale_photosphere_subtract_single_flux(self, flux, flux_type, photosphere_data=None):
         """Runs all calculations to process a GALEX flux to prepare for searching PEGASUS grid.
 
         Will run three processes on the given GALEX flux: 
@@ -460,6 +451,7 @@ class GalexFluxes():
         Args:
             flux: The value of the given flux.
             flux_type: The type of the given flux. Will be either fuv or nuv.
+            photosphere_data: The matching photosphere model, if it was already looked up.
         
         Returns:
             The final processed flux.
@@ -467,7 +459,8 @@ class GalexFluxes():
         """
         wv = None
         photo_flux = None
-        photosphere_data = self.get_photosphere_model()
+        if photosphere_data is None:
+            photosphere_data = self.get_photosphere_model()
         if flux_type == 'fuv':
             wv = 1542.3
             photo_flux = photosphere_data['fuv']
@@ -484,38 +477,49 @@ class GalexFluxes():
     def convert_scale_photosphere_subtract_fluxes(self):
         """Runs all processing needed to search PEGASUS grid for each valid GALEX flux.
 
-        Iterates through each attribute in the object and if it is valid flux, will run processes:
+        Iterates through each flux in FLUX_FIELDS (then each error in ERROR_FIELDS) and if it is set, will run processes:
             1. Converts the flux from microjanskies to ergs/s/cm2/A.
             2. Scales the flux to the stellar surface.
             3. Finds a matching photosphere model with the given stellar parameters and subtracts 
                 photospheric flux contribution.
+
+        The photosphere model is looked up once and used for every flux and error.
+
+        Returns:
+            The matching photosphere model.
         """
-        for key, val in dict(vars(self)).items():
-            processed_flux_name = f'processed_{key}'
-            if ('fuv' in key or 'nuv' in key) and 'err' not in key and 'is' not in key and val is not None:
-                if 'fuv' in key:
-                    processed_flux = self.convert_scale_photosphere_subtract_single_flux(val, 'fuv')
-                elif 'nuv' in key:
-                    processed_flux = self.convert_scale_photosphere_subtract_single_flux(val, 'nuv')
-                setattr(self, processed_flux_name, processed_flux)
-            elif (key == 'fuv_err' or key == 'nuv_err') and val is not None:
+        photosphere_data = self.get_photosphere_model()
+        for key in self.FLUX_FIELDS:
+            val = getattr(self, key)
+            # processed again from the raw flux on every run, and cleared if the raw flux was removed
+            processed_flux = None
+            if val is not None:
+                processed_flux = self.convert_scale_photosphere_subtract_single_flux(val, key[:3], photosphere_data)
+            setattr(self, f'processed_{key}', processed_flux)
+        for key in self.ERROR_FIELDS:
+            val = getattr(self, key)
+            avg_err = None
+            if val is not None:
                 # get the attribute value with the name of which flux
                 which_flux = key[:3]
                 flux = getattr(self, which_flux)
                 processed_flux = getattr(self, f'processed_{which_flux}')
                 upper_lim = flux + val
                 lower_lim = flux - val
-                photosub_upper_lim = self.convert_scale_photosphere_subtract_single_flux(upper_lim, which_flux)
-                photosub_lower_lim = self.convert_scale_photosphere_subtract_single_flux(lower_lim, which_flux)
+                photosub_upper_lim = self.convert_scale_photosphere_subtract_single_flux(upper_lim, which_flux, photosphere_data)
+                photosub_lower_lim = self.convert_scale_photosphere_subtract_single_flux(lower_lim, which_flux, photosphere_data)
                 new_upper_err = photosub_upper_lim - processed_flux
                 new_lower_err = processed_flux - photosub_lower_lim
                 avg_err = (new_upper_err + new_lower_err) / 2
-                setattr(self, processed_flux_name, avg_err)
+            setattr(self, f'processed_{key}', avg_err)
+        return photosphere_data
 
 """——————————————————————————————STELLAR OBJECT——————————————————————————————"""
 
 class StellarObject():
     """Represents a stellar object."""
+    __slots__ = ('star_name', 'position', 'coords', 'teff', 'logg', 'mass', 'dist', 'rad', 'pm_data', 'pm_corrected_coords',
+                 'fluxes', 'stellar_subtype', 'j_band', 'modal_error_msgs', 'modal_page_error_msg', 'model_subtype', 'model_collection')
 
     def __init__(self, star_name=None, position=None, coords=None, teff=None, logg=None, mass=None, dist=None, rad=None, pm_data=None, pm_corrected_coords=None, fluxes=None, stellar_subtype=None):
         self.star_name = star_name
@@ -530,10 +534,18 @@ class StellarObject():
         self.pm_corrected_coords = pm_corrected_coords
         self.fluxes = fluxes
         self.stellar_subtype = stellar_subtype
+        self.j_band = None # 2MASS J band magnitude from the NASA Exoplanet Archive, returned by the parameter search API (float)
         self.modal_error_msgs = []
+        self.modal_page_error_msg = None # Error that stops the search, shown on the error page (str)
+        self.model_subtype = None # Matched PEGASUS model subtype, set on the results page (str)
+        self.model_collection = None # Grid collection of the model subtype, set by PegasusGrid (str)
         if self.fluxes is None:
             self.fluxes = GalexFluxes()
 
+    def to_dict(self):
+        """Returns the attributes as a dict (the object has no __dict__). Nested objects are not converted."""
+        return {field: getattr(self, field) for field in self.__slots__}
+
     def has_all_stellar_parameters(self):
         # Checks to see that all stellar intrinstic parameters exist.
         if self.teff is not None and self.logg is not None and self.mass is not None and self.dist is not None and self.rad is not None:
@@ -541,7 +553,7 @@ class StellarObject():
         else:
             return False
 
-    def get_stellar_parameters(self):
+    def get_stellar_parameters(self, progress=None):
         """Searches Astroquery databases for stellar data.
 
         Searches SIMBAD, the NASA Exoplanet Archive, and MAST GALEX databases for 
@@ -561,8 +573,10 @@ class StellarObject():
         on the user's front end.)
 
         Args:
-            star_name OR position: The search term the user submitted in the search bar input.
-            search_format: The format the search input is in, either name or position.
+            progress: Optional function called with the name of each catalog search step
+                as it starts ('coordinates', 'host_names', 'simbad', 'proper_motion',
+                'nasa_exoplanet_archive', 'stellar_subtype', 'galex'). Used to report the
+                progress of background search jobs.
 
         Side Effects:
             If every function runs without errors, will assign teff, logg, mass, dist, rad, 
@@ -576,9 +590,12 @@ class StellarObject():
             No errors are raised but if an error is detected from within a catalog search, the 
             function returns the error as a string and is sent to the front end error page to be displayed.
         """
+        if progress is None:
+            progress = lambda step: None
         # STEP 1: Check for search type (position or name)
         if self.position:
             # STEP Pos1: Change coordinates to ra and dec
+            progress('coordinates')
             converted_coords = self.convert_coords(self.position)
             if converted_coords is not None:
                 # will stop function if coords were not converted into usable format
@@ -587,42 +604,26 @@ class StellarObject():
         elif self.star_name:
             # STEP Name1: Check if name is in the mast target database 
             # (used to check for case & spacing errors in user input)
-            data = NasaExoplanetArchive.query_criteria(
-                table="pscomppars", select="DISTINCT hostname")
-            host_stars = data['hostname']
-            for name in host_stars:
-                # take away all spaces and make every letter upper case
-                if self.star_name.upper().replace(' ', '') == name.upper().replace(' ', ''):
-                    # if there is a match, assign the input star name to the correct format from NEA
-                    self.star_name = name
-                    break
+            progress('host_names')
+            try:
+                host_stars = lookup_nea_host_names()
+            except (CircuitOpenError,) + SERVICE_FAILURES as e:
+                # NEA is unavailable, continue with the name as the user typed it
+                print(f'In depth NEA host name error: {e}')
+                host_stars = []
+            self.match_host_name(host_stars)
             # STEP Name2: Get coordinate and proper motion info from Simbad
+            progress('simbad')
             simbad_data = self.query_simbad(self.star_name)
             if simbad_data is not None:
                 # will stop function if no coords found in SIMBAD
                 self.modal_error_msgs.append(simbad_data)
             # STEP Name3: Put PM and Coord info into proper motion correction function
-            pm_corrected_coords = None
-            if self.pm_data is not None:
-                pm_corrected_coords = self.pm_data.correct_pm(
-                    self.star_name, self.coords)
-            # if the returned data is a tuple, this means it returned an RA and DEC, assign values as coords
-            if isinstance(pm_corrected_coords, tuple):
-                self.pm_corrected_coords = pm_corrected_coords
-            # else, if the return data is not tuple and is string this means exception/error was thrown 
-            # and error message is returned. Append the error message as either a regular or galex modal 
-            # error message.
-            elif isinstance(pm_corrected_coords, str):
-                if 'GALEX' not in pm_corrected_coords:
-                    # if it is a regular error message, this means something went wrong with the coordinates/object 
-                    # and the search needs to break because the same coords/object will not search on the NEA dataset
-                    self.modal_page_error_msg = pm_corrected_coords
-                    return
-                else:
-                    # else if it is just a GALEX error, we can continue onto searching the NASA Exoplanet Archive 
-                    # for stellar intrinsic parameters
-                    self.modal_error_msgs.append(pm_corrected_coords)
+            progress('proper_motion')
+            if not self.correct_proper_motion():
+                return
         # STEP 2: Search NASA Exoplanet Archive with the search term & type
+        progress('nasa_exoplanet_archive')
         nea_data = self.query_nasa_exoplanet_archive(self.star_name, self.coords)
         if nea_data is not None:
             # if the NEA search didn't return anything, then the object either doesn't exist or isn't an exoplanet 
@@ -633,8 +634,10 @@ class StellarObject():
             self.modal_error_msgs.append(nea_data)
             # return
         # STEP 3: Get the stellar subtype. Needed for GALEX flux predictions if a flux is null
+        progress('stellar_subtype')
         self.get_stellar_subtype(self.teff, self.logg, self.mass)
         # STEP 4: Check if coordinate correction happened then search GALEX with corrected/converted coords
+        progress('galex')
         galex_data = self.query_galex(self.star_name, self.position, self.pm_corrected_coords, self.coords)
         if galex_data is not None:
             self.modal_error_msgs.append(galex_data)
@@ -645,7 +648,47 @@ class StellarObject():
             # This means that no data was returned, redirect to error page with link to manual form
             self.modal_page_error_msg = 'Nothing found for your target in the NExSci database or the MAST GALEX database.'
             return
-        
+
+    # The steps below are shared with the async search (helpers_async), which looks the data up
+    # itself and hands it (or the error) to the same methods.
+
+    def match_host_name(self, host_stars):
+        """Replaces the star name with its NEA host name spelling, if it matches one ignoring case and spaces."""
+        for name in host_stars:
+            # take away all spaces and make every letter upper case
+            if self.star_name.upper().replace(' ', '') == name.upper().replace(' ', ''):
+                # if there is a match, assign the input star name to the correct format from NEA
+                self.star_name = name
+                break
+
+    def correct_proper_motion(self):
+        """Corrects the SIMBAD coordinates for proper motion to the GALEX observation time.
+
+        Returns:
+            False if the search has to stop (modal_page_error_msg is set), else True.
+        """
+        pm_corrected_coords = None
+        if self.pm_data is not None:
+            pm_corrected_coords = self.pm_data.correct_pm(
+                self.star_name, self.coords)
+        # if the returned data is a tuple, this means it returned an RA and DEC, assign values as coords
+        if isinstance(pm_corrected_coords, tuple):
+            self.pm_corrected_coords = pm_corrected_coords
+        # else, if the return data is not tuple and is string this means exception/error was thrown 
+        # and error message is returned. Append the error message as either a regular or galex modal 
+        # error message.
+        elif isinstance(pm_corrected_coords, str):
+            if 'GALEX' not in pm_corrected_coords:
+                # if it is a regular error message, this means something went wrong with the coordinates/object 
+                # and the search needs to break because the same coords/object will not search on the NEA dataset
+                self.modal_page_error_msg = pm_corrected_coords
+                return False
+            else:
+                # else if it is just a GALEX error, we can continue onto searching the NASA Exoplanet Archive 
+                # for stellar intrinsic parameters
+                self.modal_error_msgs.append(pm_corrected_coords)
+        return True
+
     def convert_coords(self, position):
         """Converts the position attribute to equatorial coordinates (coords attribute) using the SkyCoord class from the astropy.coordinates module.
         Args:
@@ -660,7 +703,7 @@ class StellarObject():
             Exception: If an unknown error occurs during the coordinate conversion process.
         """
         try:
-            c = SkyCoord(position, unit=(u.hourangle, u.deg))
+            c = astropy_coordinates.SkyCoord(position, unit=(u.hourangle, u.deg))
             self.coords = (c.ra.degree, c.dec.degree)
             return
         except ValueError as ve:
@@ -680,32 +723,44 @@ class StellarObject():
 
         Raises:
             Request Exception: If SIMBAD is down, will throw flash error on modal telling user SIMBAD is down.
+            CircuitOpenError: If recent SIMBAD calls failed, fails fast with the same SIMBAD is down message.
             Exception: If an error occurs during the SIMBAD search, or if no data is found for the specified star.
         """
         try:
-            # Check if SIMBAD is accessible
-            simbad_response = requests.get("http://simbad.cds.unistra.fr/simbad/")
-            if simbad_response.status_code != 200:
-                return "Error connecting to SIMBAD. Cannot get data to correct for proper motion. Please enter GALEX flux values manually or try again later."
-            
-            result_table = customSimbad.query_object(star_name)
-            if result_table and len(result_table) > 0:
-                data = result_table[0]
-                self.coords = (data['RA'], data['DEC'])
+            # Read through the shared catalog cache, the SIMBAD circuit breaker fails fast if 
+            # recent calls to SIMBAD have failed and there is no cached answer
+            data = search_simbad(star_name)
+        except Exception as e:
+            return self.simbad_error(e)
+        return self.set_simbad_data(star_name, data)
+
+    def set_simbad_data(self, star_name, data):
+        """Sets the coordinates and proper motion data from a SIMBAD answer (None if SIMBAD found nothing).
+
+        Returns:
+            None, or an error message if there is no usable answer.
+        """
+        try:
+            if data is not None:
+                self.coords = (data['ra'], data['dec'])
                 self.pm_data = ProperMotionData(
-                    data['PMRA'], data['PMDEC'], data['PLX_VALUE'])
+                    data['pmra'], data['pmdec'], data['plx'])
                 # check if radial velocity exists
-                if not ma.is_masked(data['RV_VALUE']):
-                    self.pm_data.rad_vel = data['RV_VALUE']
+                if data['rv'] is not None:
+                    self.pm_data.rad_vel = data['rv']
                 return
             else:
                 return (f'No results found in SIMBAD for {star_name}. Please check spelling, spacing, and or capitalization and try again.')
-        except requests.exceptions.RequestException as rqe:
-            print(f'In depth SIMBAD error: {rqe}')
-            return f"Error connecting to SIMBAD. Cannot get data to correct for proper motion. Please enter GALEX flux values manually or try again later."
         except Exception as e:
-            print(f'In depth SIMBAD error: {e}')
-            return (f'Unknown error during SIMBAD search: {e}')
+            return self.simbad_error(e)
+
+    @staticmethod
+    def simbad_error(error):
+        """Returns the error message of a SIMBAD search that failed with an exception."""
+        print(f'In depth SIMBAD error: {error}')
+        if isinstance(error, (CircuitOpenError,) + SERVICE_FAILURES):
+            return "Error connecting to SIMBAD. Cannot get data to correct for proper motion. Please enter GALEX flux values manually or try again later."
+        return (f'Unknown error during SIMBAD search: {error}')
 
     def query_nasa_exoplanet_archive(self, star_name, coords):
         """Searches the NASA Exoplanet Archive for stellar parameters.
@@ -725,42 +780,51 @@ class StellarObject():
         Raises:
             Sends a string error message to the front end custom error page if no results
             are found or if the target is not a M or K type star.
-            Request Exception: If the NASA Exoplanet Archive homepage is down.
+            Request Exception: If the NASA Exoplanet Archive is down.
+            CircuitOpenError: If recent NASA Exoplanet Archive calls failed, fails fast with the archive is down message.
             Exception: If any unknown error occurs during search.
         """
         try:
-            nea_response = requests.get("https://exoplanetarchive.ipac.caltech.edu/")
-            if nea_response.status_code != 200:
-                return "The NASA Exoplanet Archive is currently down. Please enter stellar parameters manually or try again later."
-            
-            if star_name:
-                corrected_star_name = star_name.replace("'", "''")
-                nea_data = NasaExoplanetArchive.query_criteria(
-                    table="pscomppars", 
-                    select="top 5 disc_refname, st_spectype, st_teff, st_logg, st_mass, st_rad, sy_dist, sy_jmag", 
-                    where=f"hostname like '%{corrected_star_name}%'", 
-                    order="hostname")
-            elif coords:
-                nea_data = NasaExoplanetArchive.query_region(table="pscomppars", coordinates=SkyCoord(
-                    ra=coords[0] * u.deg, dec=coords[1] * u.deg), radius=1.0 * u.deg)
-            if len(nea_data) > 0:
-                data = nea_data[0]
-                if 2400 < data['st_teff'].unmasked.value < 5500:
-                    self.teff = data['st_teff'].unmasked.value
-                    self.logg = data['st_logg']
-                    self.mass = data['st_mass'].unmasked.value
-                    self.rad = data['st_rad'].unmasked.value
-                    self.dist = data['sy_dist'].unmasked.value
+            # Look up the local pscomppars mirror by name or position, falls back to the live 
+            # archive (read through the shared catalog cache) if the mirror has no match
+            data = lookup_nasa_exoplanet_archive(star_name, coords)
+        except Exception as e:
+            return self.nasa_exoplanet_archive_error(e)
+        return self.set_nasa_exoplanet_archive_data(star_name, coords, data)
+
+    def set_nasa_exoplanet_archive_data(self, star_name, coords, data):
+        """Sets the stellar parameters from a NASA Exoplanet Archive answer (None if nothing was found).
+
+        Returns:
+            None, or an error message if there is no usable answer (e.g. not an M or K type star).
+        """
+        try:
+            if data is not None:
+                if data['teff'] is not None and 2400 < data['teff'] < 5500:
+                    self.teff = data['teff']
+                    self.logg = data['logg']
+                    self.mass = data['mass']
+                    self.rad = data['rad']
+                    self.dist = data['dist']
+                    self.j_band = data.get('jmag')
                     return
                 else:
                     return (f'{star_name if star_name else coords} is not an M or K type star. Data is currently only available for these spectral sybtypes.')
             else:
                 return (f'Nothing found for {star_name if star_name else coords} in the NExSci database.')
-        except requests.exceptions.RequestException as rqe:
-            print(f'In depth NEA error: {rqe}')
-            return "Error connecting to the NASA Exoplanet Archive. Please enter stellar parameters manually or try again later."
         except Exception as e:
-            return f"Unknown error occured when searching the NASA Exoplanet Archive: {e}"
+            return self.nasa_exoplanet_archive_error(e)
+
+    @staticmethod
+    def nasa_exoplanet_archive_error(error):
+        """Returns the error message of a NASA Exoplanet Archive search that failed with an exception."""
+        if isinstance(error, CircuitOpenError):
+            print(f'In depth NEA error: {error}')
+            return "The NASA Exoplanet Archive is currently down. Please enter stellar parameters manually or try again later."
+        if isinstance(error, SERVICE_FAILURES):
+            print(f'In depth NEA error: {error}')
+            return "Error connecting to the NASA Exoplanet Archive. Please enter stellar parameters manually or try again later."
+        return f"Unknown error occured when searching the NASA Exoplanet Archive: {error}"
 
     def query_galex(self, star_name, position, pm_corrected_coords, coords):
         """Searches the MAST GALEX database by coordinates for flux densities.
@@ -786,38 +850,51 @@ class StellarObject():
         Raises:
             Sends a string error message if no results are found to be displayed on the
             modal form so users can still enter fluxes manually and get other stellar
-            information back.
+            information back. If recent MAST calls failed, fails fast with the MAST 
+            connection error message.
         """
         # STEP 1: Query the MAST catalogs object by GALEX catalog & given ra and dec
         try:
-            # Check if SIMBAD is accessible
-            mast_response = requests.get("https://galex.stsci.edu/GR6/?page=mastform")
-            if mast_response.status_code != 200:
-                return "Error connecting to MAST. Please enter GALEX flux values manually or try again later."
-            
+            # (answered from the local GALEX store if this sky region was already queried)
             galex_data = None
-            if star_name and pm_corrected_coords:
-                # if the original query was by star name and the proper motion corrected coords exist
-                galex_data = Catalogs.query_object(
-                    f'{pm_corrected_coords[0]} {pm_corrected_coords[1]}', catalog="GALEX")
-            elif position and coords:
-                # elif the original query was by position and the coords exist
-                galex_data = Catalogs.query_object(
-                    f'{coords[0]} {coords[1]}', catalog="GALEX")
+            query_coords = self.get_galex_query_coords(star_name, position, pm_corrected_coords, coords)
+            if query_coords is not None:
+                galex_data = lookup_galex(query_coords[0], query_coords[1])
+        except Exception as e:
+            return self.galex_error(e, position, pm_corrected_coords, coords)
+        return self.set_galex_data(star_name, position, pm_corrected_coords, coords, galex_data)
+
+    @staticmethod
+    def get_galex_query_coords(star_name, position, pm_corrected_coords, coords):
+        """Returns the coordinates to search GALEX at, or None if the search can not run."""
+        if star_name and pm_corrected_coords:
+            # if the original query was by star name and the proper motion corrected coords exist
+            return pm_corrected_coords
+        elif position and coords:
+            # elif the original query was by position and the coords exist
+            return coords
+        return None
+
+    def set_galex_data(self, star_name, position, pm_corrected_coords, coords, galex_data):
+        """Sets the GALEX fluxes from a GALEX search (see lookup_galex, None if the search could not run).
+
+        Returns:
+            None, or an error message if there is no usable GALEX source.
+        """
+        try:
             # STEP 2: If there are results returned and results within 0.167 arcmins, then start processing the data.
             if galex_data is not None:
-                if len(galex_data) > 0:
-                    # Set minimum distance between target coordinates and actual coordinates of object.
-                    MIN_DIST = galex_data['distance_arcmin'] < 0.167
-                    if len(galex_data[MIN_DIST]) > 0:
-                        filtered_data = galex_data[MIN_DIST][0]
+                if galex_data['n_sources'] > 0:
+                    # The closest source within 0.167 arcmins of the target coordinates (None if there is none)
+                    if galex_data['match'] is not None:
+                        filtered_data = galex_data['match']
                         # create new fluxes object to store data in if there isn't one yet
                         if self.fluxes is None:
                             self.fluxes = GalexFluxes()
                         # STEP 3: Assign the edited stellar object to the flux object
                         # delete any objects within stellar object and assign this to the flux object's stellar object
                         # this is done so the flux object can access attributes from the stellar object such as teff, logg, and mass
-                        fluxes_stell_obj = self.__dict__.copy()
+                        fluxes_stell_obj = self.to_dict()
                         del fluxes_stell_obj['fluxes']
                         del fluxes_stell_obj['pm_data']
                         self.fluxes.stellar_obj = fluxes_stell_obj
@@ -827,10 +904,10 @@ class StellarObject():
                         self.fluxes.fuv_err = filtered_data['fuv_fluxerr']
                         self.fluxes.nuv_err = filtered_data['nuv_fluxerr']
                         # STEP 5: Check for saturated fluxes
-                        if not ma.is_masked(filtered_data['fuv_flux_aper_7']) and filtered_data['fuv_flux_aper_7'] > 34:
+                        if filtered_data['fuv_flux_aper_7'] is not None and filtered_data['fuv_flux_aper_7'] > 34:
                             self.fluxes.fuv_is_saturated = True
                             self.fluxes.fuv_saturated = filtered_data['fuv_flux']
-                        if not ma.is_masked(filtered_data['nuv_flux_aper_7']) and filtered_data['nuv_flux_aper_7'] > 108:
+                        if filtered_data['nuv_flux_aper_7'] is not None and filtered_data['nuv_flux_aper_7'] > 108:
                             self.fluxes.nuv_is_saturated = True
                             self.fluxes.nuv_saturated = filtered_data['nuv_flux']
                         # STEP 6: Check if there are any masked values (these will be null values)
@@ -851,18 +928,18 @@ class StellarObject():
                 # No results found because proper info was not given for example, will happen if 
                 # proper motion correction did not occur and is therefore not given
                 return (f'GALEX Error: Missing data to query GALEX {"because coordinates were not corrected for proper motion" if star_name else f"for {coords}"}. Please enter flux values manually or approximate flux values using the proxy table under question 3 on the FAQ page.')
-        except requests.exceptions.RequestException as rqe:
-            print(f'Galex search in depth error: {rqe}')
-            return f"Error connecting to MAST. Please enter GALEX flux values manually or try again later."
-        except ResolverError as re:
-            print(f'Galex search in depth error: {re}')
-            return (f'GALEX Error: Could not search GALEX catalog with object {coords if position else pm_corrected_coords}. Please enter flux values manually or approximate flux values using the proxy table under question 3 on the FAQ page.')
-        except ValueError as ve:
-            print(f'Galex search in depth error: {ve}')
-            return (f'GALEX Error: Could not search GALEX catalog with object {coords if position else pm_corrected_coords}. Please enter flux values manually or approximate flux values using the proxy table under question 3 on the FAQ page.')
         except Exception as e:
-            print(f'Galex search in depth error: {e}')
-            return (f'GALEX Error: Unknown error during GALEX search: {e}')
+            return self.galex_error(e, position, pm_corrected_coords, coords)
+
+    @staticmethod
+    def galex_error(error, position, pm_corrected_coords, coords):
+        """Returns the error message of a GALEX search that failed with an exception."""
+        print(f'Galex search in depth error: {error}')
+        if isinstance(error, (CircuitOpenError,) + SERVICE_FAILURES):
+            return "Error connecting to MAST. Please enter GALEX flux values manually or try again later."
+        if isinstance(error, ValueError) or isinstance(error, astroquery_exceptions.ResolverError):
+            return (f'GALEX Error: Could not search GALEX catalog with object {coords if position else pm_corrected_coords}. Please enter flux values manually or approximate flux values using the proxy table under question 3 on the FAQ page.')
+        return (f'GALEX Error: Unknown error during GALEX search: {error}')
     
     def get_stellar_subtype(self, teff, logg, mass):
         """Assigns the matching PEGASUS grid stellar subtype to object.
@@ -0,0 +1,71 @@
+# worker startup helpers: lazy imports and the startup time breakdown
+import time
+import importlib
+import threading
+from contextlib import contextmanager
+
+# name -> seconds, in the order the steps and imports happened
+STARTUP_TIMES = {}
+_lazy_modules = []
+_import_lock = threading.RLock()
+
+
+@contextmanager
+def startup_step(name):
+    """Times a step of app startup for the startup report."""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        STARTUP_TIMES[name] = STARTUP_TIMES.get(name, 0) + time.perf_counter() - started
+
+
+class LazyModule():
+    """Stands in for a heavy module (astropy, astroquery, plotly, scipy) until it is first used.
+
+    The module is imported on the first attribute access, so workers that never need it
+    (and the app import itself) do not pay for it. The import time is added to the startup
+    report under "import <module name>".
+    """
+    def __init__(self, name):
+        self._name = name
+        self._module = None
+
+    def _load(self):
+        if self._module is None:
+            with _import_lock:
+                if self._module is None:
+                    with startup_step(f'import {self._name}'):
+                        self._module = importlib.import_module(self._name)
+        return self._module
+
+    def __getattr__(self, attr):
+        return getattr(self._load(), attr)
+
+    def __repr__(self):
+        return f'<lazy module {self._name} ({"loaded" if self._module is not None else "not loaded"})>'
+
+
+def lazy_import(name):
+    """Returns a module that is only imported when it is first used."""
+    module = LazyModule(name)
+    _lazy_modules.append(module)
+    return module
+
+
+def load_lazy_modules():
+    """Imports every lazy module now, e.g. in the gunicorn master so the workers share them."""
+    for module in _lazy_modules:
+        module._load()
+
+
+def startup_report():
+    """Returns the startup time breakdown as a list of (step, seconds), slowest first."""
+    return sorted(STARTUP_TIMES.items(), key=lambda item: item[1], reverse=True)
+
+
+def print_startup_report():
+    """Prints the startup time breakdown."""
+    print('Startup time breakdown:')
+    for name, seconds in startup_report():
+        print(f'  {seconds * 1000:9.1f} ms  {name}')
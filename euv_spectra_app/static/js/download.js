@@ -1,12 +1,14 @@
-function checkDirectory(filename, model){
-    fetch(`/check-directory/${filename}`)
+function checkDirectory(filename, model, subtype){
+    // the subtype in the URL lets browsers and proxies cache the download
+    const query = subtype ? `?subtype=${encodeURIComponent(subtype)}` : ''
+    fetch(`/check-directory/${filename}${query}`)
         .then(response => response.json())
         .then(data => {
             if (data.exists) {
                 // Do something if the directory exists
                 console.log(`${filename} exists`)
                 console.log(filename)
-                window.location = `/download/${filename}/${model}`
+                window.location = `/download/${filename}/${model}${query}`
             } else {
                 // Do something if the directory does not exist
                 console.log(`${filename} does not exist`)
@@ -0,0 +1,36 @@
+// polls a background search job and shows the modal when it is done
+const searchJob = document.getElementById("search-job");
+const overlayProgress = document.getElementById("overlay-text");
+
+const searchSteps = {
+    "coordinates": "Converting coordinates...",
+    "host_names": "Checking the NASA Exoplanet Archive host names...",
+    "simbad": "Searching SIMBAD...",
+    "proper_motion": "Correcting coordinates for proper motion...",
+    "nasa_exoplanet_archive": "Searching the NASA Exoplanet Archive...",
+    "stellar_subtype": "Finding the matching stellar subtype...",
+    "galex": "Searching MAST GALEX..."
+};
+
+function pollSearchJob() {
+    fetch(searchJob.dataset.statusUrl)
+        .then(response => response.json())
+        .then(job => {
+            if (job.error) {
+                window.location.href = "/";
+            } else if (job.status == "done" || job.status == "failed") {
+                window.location.href = job.result_url;
+            } else {
+                if (job.step && searchSteps[job.step]) {
+                    overlayProgress.innerHTML = searchSteps[job.step];
+                }
+                setTimeout(pollSearchJob, 1000);
+            }
+        })
+        .catch(() => setTimeout(pollSearchJob, 3000));
+}
+
+if (searchJob) {
+    displayLoading("search");
+    pollSearchJob();
+}
@@ -0,0 +1,105 @@
+# scheduled jobs and flask cli commands
+import time
+import click
+from datetime import datetime
+from apscheduler.schedulers.background import BackgroundScheduler
+from euv_spectra_app.config import Config
+from euv_spectra_app.helpers_locks import acquire_lock, release_lock
+from euv_spectra_app.helpers_nea_mirror import refresh_nea_mirror, get_nea_mirror_state
+from euv_spectra_app.helpers_galex_store import import_galex_catalog
+from euv_spectra_app.startup import load_lazy_modules, print_startup_report
+from euv_spectra_app.helpers_remote import get_remote_call_stats
+
+scheduler = BackgroundScheduler(daemon=True)
+
+
+def refresh_nea_mirror_job():
+    """Scheduled job that refreshes the NEA mirror.
+
+    Every worker schedules this job, the shared lock makes sure only one of them runs it and
+    the last sync time makes sure it only runs once per refresh interval.
+    """
+    interval = Config.NEA_MIRROR_REFRESH_HOURS * 3600
+    state = get_nea_mirror_state()
+    if state is not None and time.time() - state.get('last_sync', 0) < interval:
+        return
+    token = acquire_lock('nea_mirror_refresh', lease_seconds=3600)
+    if token is None:
+        return
+    try:
+        refresh_nea_mirror()
+    except Exception as e:
+        print(f'NEA mirror refresh error: {e}')
+    finally:
+        release_lock('nea_mirror_refresh', token)
+
+
+def start_scheduler():
+    """Starts the background scheduler for this worker."""
+    if scheduler.running:
+        return
+    # check at startup and then every hour, the job itself skips the refresh until the interval has passed
+    scheduler.add_job(refresh_nea_mirror_job, 'interval', hours=1, next_run_time=datetime.now())
+    scheduler.start()
+
+
+def register_tasks(app, start_jobs=True):
+    """Registers the cli commands and starts the scheduled jobs for the app.
+
+    Args:
+        app: The Flask app.
+        start_jobs: If the scheduler is started now. When the app is preloaded in the gunicorn
+            master this is False, and each worker starts its scheduler after the fork.
+    """
+    @app.cli.command('refresh-nea-mirror')
+    @click.option('--full', is_flag=True, help='Reload every row instead of only rows updated since the last refresh.')
+    def refresh_nea_mirror_command(full):
+        """Bulk loads or refreshes the local NASA Exoplanet Archive mirror."""
+        count = refresh_nea_mirror(full=full)
+        click.echo(f'Wrote {count} pscomppars rows to the NEA mirror.')
+
+    @app.cli.command('import-galex-slice')
+    @click.argument('path', type=click.Path(exists=True, dir_okay=False))
+    @click.option('--ra', type=float, required=True, help='RA (degrees) of the center of the cone the slice covers.')
+    @click.option('--dec', type=float, required=True, help='DEC (degrees) of the center of the cone the slice covers.')
+    @click.option('--radius', type=float, required=True, help='Radius (degrees) of the cone the slice covers.')
+    def import_galex_slice_command(path, ra, dec, radius):
+        """Bulk imports a downloaded slice of the GALEX catalog into the local GALEX store."""
+        count = import_galex_catalog(path, ra, dec, radius)
+        click.echo(f'Wrote {count} GALEX sources to the local GALEX store.')
+
+    @app.cli.command('remote-call-stats')
+    @click.option('--days', type=int, default=7, help='How many days of recorded attempts to summarize.')
+    def remote_call_stats_command(days):
+        """Prints latency percentiles and failure rates of the remote catalog calls, to tune their policies."""
+        for service, stats in get_remote_call_stats(days).items():
+            percentiles = ', '.join(f'{name} {stats[name]:.2f}s' for name in ('p50', 'p95', 'p99') if stats[name] is not None)
+            click.echo(f'{service}: {stats["attempts"]} attempts, {stats["error_rate"]:.1%} errors, '
+                       f'{stats["timeout_rate"]:.1%} timeouts, {stats["hedged"]} hedged, {percentiles}')
+
+    @app.cli.command('check-async-parity')
+    @click.option('--name', 'names', multiple=True, help='A star name to search (repeatable).')
+    @click.option('--position', 'positions', multiple=True, help='A position to search (repeatable).')
+    def check_async_parity_command(names, positions):
+        """Searches targets with the sync and the async catalog search routes and prints where their JSON differs."""
+        import asyncio
+        from euv_spectra_app.api.async_routes import compare_with_sync_routes
+        searches = [('get_parameters_by_name', name) for name in names] + [('get_parameters_by_position', position) for position in positions]
+        if not searches:
+            raise click.UsageError('Give at least one --name or --position to search.')
+        results = asyncio.run(compare_with_sync_routes(app, searches))
+        for (route, term), differences in results.items():
+            click.echo(f'{route} {term}: {"same JSON" if not differences else f"{len(differences)} differences"}')
+            for path, sync_value, async_value in differences:
+                click.echo(f'  {path}: sync {sync_value!r}, async {async_value!r}')
+        if any(results.values()):
+            raise SystemExit(1)
+
+    @app.cli.command('startup-report')
+    def startup_report_command():
+        """Prints how long each part of app startup takes, including the lazily imported modules."""
+        load_lazy_modules()
+        print_startup_report()
+
+    if start_jobs and Config.SCHEDULER_ENABLED:
+        start_scheduler()
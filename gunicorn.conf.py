@@ -0,0 +1,14 @@
+# gunicorn settings, used with: gunicorn -c gunicorn.conf.py "euv_spectra_app:create_app(preload=True)"
+import os
+
+bind = f"0.0.0.0:{os.getenv('FLASK_RUN_PORT', '5002')}"
+workers = int(os.getenv('GUNICORN_WORKERS', 4))
+# load the app and its lookup tables once in the master, the workers share them copy-on-write
+preload_app = True
+
+
+def post_fork(server, worker):
+    # threads and database connections do not survive the fork, start them in each worker
+    from euv_spectra_app import init_worker
+    from euv_spectra_app.extensions import app
+    init_worker(app)